@@ -1,72 +1,43 @@
 import streamlit as st
 import anthropic
-import pymongo
-import base64
-from typing import Any, Dict
+from typing import Optional
+import hashlib
 import json
-from datetime import datetime
-from sentence_transformers import SentenceTransformer
-from bson import ObjectId
+import time
+from bson import json_util
+from documents import build_document
+from embedding_codec import RESCORE_FIELD, embedding_options
+from extraction_cache import ExtractionCache
+from fx_rates import DEFAULT_BASE_CURRENCY, FxRateTable, load_fx_table
+from invoice_extraction import (
+    EXTRACTION_SCHEMA_VERSION,
+    extract_metadata_with_claude,
+)
+from invoice_templates import TEMPLATE_COLLECTION, TemplateExtractor
 from merchant_classifier import MultilingualMerchantClassifier
+from merchant_keys import normalize_key_literals
+from model_registry import DEFAULT_MODEL_NAME, get_model
+from mongo_pool import create_client
+from pdf_preprocess import preprocess_pdf
+from query_cache import SemanticQueryCache
+from query_plans import docs_examined, input_docs_estimate, winning_plan_stages
+from query_results import RESULTS_PAGE_SIZES, display_document, fetch_results_page
+from query_metrics import QueryMetricsRecorder
+from rollups import ROLLUP_COLLECTION, update_spend_rollups
 
 
 # Tool definitions for Claude structured outputs
-INVOICE_EXTRACTION_TOOL = {
-    "name": "extract_invoice_metadata",
-    "description": "Extract structured metadata from an invoice or receipt document",
-    "input_schema": {
-        "type": "object",
-        "properties": {
-            "merchant_name": {
-                "type": "string",
-                "description": "The business or merchant name"
-            },
-            "date": {
-                "type": "string",
-                "description": "The transaction or document date in ISO 8601 format (YYYY-MM-DD)"
-            },
-            "total_amount": {
-                "type": "number",
-                "description": "The total amount of the transaction"
-            },
-            "currency": {
-                "type": "string",
-                "description": "The currency code (e.g., USD, SGD, EUR)"
-            },
-            "category": {
-                "type": "string",
-                "enum": ["receipt", "invoice", "statement", "bill", "other"],
-                "description": "The type of document"
-            },
-            "payment_method": {
-                "type": "string",
-                "description": "The payment method if mentioned (e.g., credit_card, cash, debit)"
-            },
-            "items": {
-                "type": "array",
-                "description": "Array of items/services mentioned with prices",
-                "items": {
-                    "type": "object",
-                    "properties": {
-                        "description": {"type": "string"},
-                        "quantity": {"type": "number"},
-                        "unit_price": {"type": "number"},
-                        "total": {"type": "number"}
-                    },
-                    "required": ["description"]
-                }
-            }
-        },
-        "required": ["merchant_name", "total_amount", "currency"]
-    }
-}
-
 MONGODB_PIPELINE_TOOL = {
     "name": "generate_mongodb_pipeline",
     "description": "Generate a MongoDB aggregation pipeline from a natural language query",
     "input_schema": {
         "type": "object",
         "properties": {
+            "collection": {
+                "type": "string",
+                "enum": ["documents", ROLLUP_COLLECTION],
+                "description": "Collection to run the pipeline on (defaults to documents)"
+            },
             "pipeline": {
                 "type": "array",
                 "description": "MongoDB aggregation pipeline stages",
@@ -112,23 +83,155 @@ BLOCKED_PIPELINE_STAGES = {
 }
 
 # Security: Collections that can be accessed via $lookup
-ALLOWED_COLLECTIONS = {"documents", "merchants"}
+ALLOWED_COLLECTIONS = {"documents", "merchants", ROLLUP_COLLECTION}
+
+# Security: Collections a generated pipeline may run against
+QUERYABLE_COLLECTIONS = {"documents", ROLLUP_COLLECTION}
+
+
+class PipelineCostError(PipelineValidationError):
+    """Raised when a pipeline's explain plan exceeds the configured cost budget."""
+    pass
 
 
-def validate_pipeline(pipeline: list) -> None:
+class PipelineBudget:
+    """
+    Cost budget for the explain-based pre-flight in validate_pipeline.
+
+    - max_collscan_docs: reject a collection scan over more documents than this
+    - max_docs_examined: reject plans that examine more documents (only checked
+      with use_execution_stats, which runs the pipeline under max_time_ms)
+    - max_lookups / max_lookup_fanout: cap $lookup stages and the estimated
+      number of foreign lookups (input documents x $lookup stages); without
+      use_execution_stats every document in the collection counts as input
+    - max_time_ms: server-side time limit for explain and for execution
+
+    Only the winning plan is judged (see query_plans.py). A pipeline over
+    budget raises PipelineCostError; result size needs no cap here since
+    results are always fetched one page at a time.
+    """
+
+    def __init__(
+        self,
+        max_collscan_docs: int = 50000,
+        max_docs_examined: int = 100000,
+        max_lookups: int = 2,
+        max_lookup_fanout: int = 50000,
+        max_time_ms: int = 10000,
+        use_execution_stats: bool = False
+    ):
+        self.max_collscan_docs = max_collscan_docs
+        self.max_docs_examined = max_docs_examined
+        self.max_lookups = max_lookups
+        self.max_lookup_fanout = max_lookup_fanout
+        self.max_time_ms = max_time_ms
+        self.use_execution_stats = use_execution_stats
+
+
+def explain_pipeline_cost(
+    db,
+    pipeline: list,
+    budget: PipelineBudget,
+    collection: str = "documents"
+) -> dict:
+    """Run explain on the pipeline against collection and summarize its cost."""
+    verbosity = "executionStats" if budget.use_execution_stats else "queryPlanner"
+    explain = db.command(
+        "explain",
+        {"aggregate": collection, "pipeline": pipeline, "cursor": {}},
+        verbosity=verbosity,
+        maxTimeMS=budget.max_time_ms
+    )
+
+    stages = winning_plan_stages(explain)
+    examined = docs_examined(explain)
+
+    collection_docs = db[collection].estimated_document_count()
+    lookups = sum(1 for stage in pipeline for name in stage if name == "$lookup")
+    input_docs = input_docs_estimate(explain, collection_docs)
+
+    return {
+        "collscan": "COLLSCAN" in stages,
+        "collection_docs": collection_docs,
+        "docs_examined": examined,
+        "lookups": lookups,
+        "lookup_fanout": input_docs * lookups,
+    }
+
+
+def check_pipeline_cost(
+    db,
+    pipeline: list,
+    budget: PipelineBudget,
+    collection: str = "documents"
+) -> list:
+    """
+    Pre-flight a pipeline with explain and enforce the budget.
+
+    Returns the pipeline unchanged, or raises PipelineCostError.
+    """
+    cost = explain_pipeline_cost(db, pipeline, budget, collection)
+
+    problems = []
+    if cost["collscan"] and cost["collection_docs"] > budget.max_collscan_docs:
+        problems.append(
+            f"collection scan over {cost['collection_docs']} documents "
+            f"(budget {budget.max_collscan_docs})"
+        )
+    if cost["docs_examined"] is not None and cost["docs_examined"] > budget.max_docs_examined:
+        problems.append(
+            f"{cost['docs_examined']} documents examined (budget {budget.max_docs_examined})"
+        )
+    if cost["lookups"] > budget.max_lookups:
+        problems.append(f"{cost['lookups']} $lookup stages (budget {budget.max_lookups})")
+    if cost["lookup_fanout"] > budget.max_lookup_fanout:
+        problems.append(
+            f"~{cost['lookup_fanout']} $lookup probes (budget {budget.max_lookup_fanout})"
+        )
+
+    if not problems:
+        return pipeline
+
+    raise PipelineCostError(f"Pipeline exceeds cost budget: {'; '.join(problems)}")
+
+
+def validate_pipeline(
+    pipeline: list,
+    db=None,
+    budget: PipelineBudget = None,
+    collection: str = "documents"
+) -> list:
     """
     Validate a MongoDB aggregation pipeline for security.
 
     Raises PipelineValidationError if the pipeline contains:
     - Disallowed stages (e.g., $out, $merge that can write data)
     - $lookup to collections not in the allowlist
+    - A target collection other than documents or the spend rollups
+
+    merchant_keys literals in $match stages are normalized the way the
+    stored keys are (see merchant_keys.py). If db and budget are given, also
+    runs an explain-based cost pre-flight (see check_pipeline_cost).
 
     Args:
         pipeline: List of pipeline stages to validate
+        db: Database to explain the pipeline against (optional)
+        budget: Cost budget for the pre-flight (optional)
+        collection: Collection the pipeline will run against
+
+    Returns:
+        The pipeline to execute
 
     Raises:
         PipelineValidationError: If pipeline contains dangerous operations
+        PipelineCostError: If the pipeline exceeds the cost budget
     """
+    if collection not in QUERYABLE_COLLECTIONS:
+        raise PipelineValidationError(
+            f"Collection '{collection}' cannot be queried. "
+            f"Allowed collections: {QUERYABLE_COLLECTIONS}"
+        )
+
     if not isinstance(pipeline, list):
         raise PipelineValidationError("Pipeline must be a list of stages")
 
@@ -159,90 +262,107 @@ def validate_pipeline(pipeline: list) -> None:
                             f"Allowed collections: {ALLOWED_COLLECTIONS}"
                         )
 
-def init_connections():
-    """Initialize connections to MongoDB and Claude."""
-    # Initialize MongoDB connection
-    client = pymongo.MongoClient(st.secrets["mongodb_uri"])
-    db = client[st.secrets["database_name"]]
-
-    # Initialize Claude client
-    claude = anthropic.Client(api_key=st.secrets["anthropic_api_key"])
+    pipeline = normalize_key_literals(pipeline)
+    if db is not None and budget is not None:
+        return check_pipeline_cost(db, pipeline, budget, collection)
+    return pipeline
 
-    # Initialize merchant classifier
-    merchant_classifier = MultilingualMerchantClassifier(
-        st.secrets["mongodb_uri"],
-        st.secrets["database_name"]
-    )
+def decode_pipeline(pipeline: list) -> list:
+    """Turn extended-JSON literals in a generated pipeline ({"$date": ...}, {"$oid": ...}) into BSON values."""
+    return json_util.loads(json.dumps(pipeline))
 
-    return db, claude, merchant_classifier
+@st.cache_resource(show_spinner="Loading embedding model...")
+def load_embedding_model(model_name: str, backend: str, file_name: str = None):
+    """
+    Warm the process-wide embedding model once per Streamlit server process.
 
-def extract_metadata_with_claude(
-    claude: anthropic.Client,
-    pdf_bytes: bytes
-) -> Dict[str, Any]:
+    The classifier picks up the same instance from model_registry, so reruns
+    never reload the model.
     """
-    Extract metadata from PDF using Claude's vision capability and structured outputs.
+    return get_model(model_name, backend=backend, file_name=file_name)
+
+@st.cache_resource
+def get_query_metrics() -> QueryMetricsRecorder:
+    """Process-wide recorder of NL query latency and prompt cache usage."""
+    return QueryMetricsRecorder()
 
-    Uses PDF vision to preserve document layout (tables, formatting) and tool use
-    for guaranteed valid JSON output matching the schema.
+@st.cache_resource
+def get_query_cache(database_name: str, prompt_version: str, _db, _merchant_classifier) -> SemanticQueryCache:
     """
-    # Encode PDF as base64 for vision API
-    pdf_base64 = base64.standard_b64encode(pdf_bytes).decode("utf-8")
+    Process-wide semantic cache of validated pipelines, sharing the classifier's model.
 
-    message = claude.messages.create(
-        model="claude-sonnet-4-5-20250929",
-        max_tokens=1024,
-        tools=[INVOICE_EXTRACTION_TOOL],
-        tool_choice={"type": "tool", "name": "extract_invoice_metadata"},
-        messages=[
-            {
-                "role": "user",
-                "content": [
-                    {
-                        "type": "document",
-                        "source": {
-                            "type": "base64",
-                            "media_type": "application/pdf",
-                            "data": pdf_base64
-                        }
-                    },
-                    {
-                        "type": "text",
-                        "text": "Extract all invoice/receipt metadata from this document. Include merchant name, date, amounts, items, and payment details."
-                    }
-                ]
-            }
-        ]
+    One cache per prompt_version (see pipeline_prompt_version), so pipelines
+    generated under another prompt or tool schema are never reused.
+    """
+    return SemanticQueryCache(
+        _db.query_cache,
+        _merchant_classifier.encode,
+        _merchant_classifier.model.get_sentence_embedding_dimension(),
+        prompt_version=prompt_version,
+        merchants=_db.merchants
     )
 
-    # With tool_choice forcing the tool, the response is guaranteed to be
-    # valid JSON matching our schema - no parsing/cleanup needed
-    for block in message.content:
-        if block.type == "tool_use":
-            return block.input
+@st.cache_resource(ttl=300)
+def get_template_extractor(database_name: str, _db) -> TemplateExtractor:
+    """Known merchant layouts for local extraction, reloaded every few minutes."""
+    return TemplateExtractor(_db[TEMPLATE_COLLECTION])
 
-    raise ValueError("Claude did not return tool use response")
+def get_fx_table() -> Optional[FxRateTable]:
+    """
+    Configured daily FX rates for total_amount_base, or None.
 
-def process_natural_language_query(
-    claude: anthropic.Client,
-    query: str
-) -> dict:
+    Not a Streamlit cache: load_fx_table already memoizes per file and
+    reloads when the rate file's mtime changes.
     """
-    Convert natural language query to MongoDB aggregation pipeline using structured outputs.
+    if not st.secrets.get("fx_rates_path"):
+        return None
+    return load_fx_table(st.secrets["fx_rates_path"], st.secrets.get("base_currency", DEFAULT_BASE_CURRENCY))
 
-    Returns a dict with 'pipeline' (list) and optional 'explanation' (str).
+@st.cache_resource(show_spinner="Connecting...")
+def init_connections():
+    """
+    Initialize connections to MongoDB and Claude.
+
+    Cached for the server process, so reruns and sessions share one pooled
+    MongoClient, one Claude client and one classifier.
     """
-    system_prompt = """You are a MongoDB query generator. Convert natural language queries into MongoDB aggregation pipelines.
+    # Initialize MongoDB connection (pool options from the optional [mongodb_pool] table)
+    client, pool_metrics = create_client(st.secrets["mongodb_uri"], st.secrets.get("mongodb_pool"))
+    db = client[st.secrets["database_name"]]
+
+    # Initialize Claude client
+    claude = anthropic.Client(api_key=st.secrets["anthropic_api_key"])
+
+    # Load (or reuse) the shared embedding model
+    model_name = st.secrets.get("embedding_model", DEFAULT_MODEL_NAME)
+    model_backend = st.secrets.get("embedding_model_backend", "torch")
+    model_file_name = st.secrets.get("embedding_model_file")
+    load_embedding_model(model_name, model_backend, model_file_name)
+
+    # Initialize merchant classifier on the same connection pool
+    merchant_classifier = MultilingualMerchantClassifier(
+        db=db,
+        model_name=model_name,
+        model_backend=model_backend,
+        model_file_name=model_file_name,
+        **embedding_options(st.secrets)
+    )
+
+    return db, claude, merchant_classifier, pool_metrics
+
+PIPELINE_SYSTEM_PROMPT = """You are a MongoDB query generator. Convert natural language queries into MongoDB aggregation pipelines.
 
 CRITICAL: When a merchant name is mentioned in the query, use the EXACT merchant name as it appears.
 
-The database has two collections:
+The database has three collections:
 
 documents collection:
 - merchant_id (ObjectId reference to merchants collection)
 - merchant_name (string)
-- total_amount (number)
-- date (string/date)
+- merchant_keys (array of strings, indexed: the merchant's canonical name and all synonyms, casefolded: lowercased, with e.g. "ß" written as "ss")
+- total_amount (number, in the receipt's own currency)
+{fx_document_fields}- date (date, the receipt date as a BSON datetime)
+- date_text (string, the date as printed on the receipt)
 - category (string)
 - currency (string)
 - payment_method (string)
@@ -253,18 +373,91 @@ merchants collection:
 - canonical_name (string, e.g., "Grab Singapore", "M1 Limited")
 - synonyms (array of strings)
 
-For merchant queries, use $lookup with let/expr pattern to match by canonical_name or synonyms.
+merchant_spend_daily collection (pre-aggregated, one row per merchant, day and currency):
+- merchant_id (ObjectId reference to merchants collection)
+- merchant_name (string, the merchant's canonical_name)
+- merchant_keys (array of strings, indexed: same as on documents)
+- date (date, midnight UTC of the receipt date)
+- month (string, "YYYY-MM")
+- currency (string)
+- total_amount (number, sum of total_amount for that merchant/day/currency)
+{fx_rollup_fields}- count (number, how many receipts that sum covers)
+
+Set "collection" to "merchant_spend_daily" for totals, counts and averages of spend
+by merchant, day, month or currency: sum total_amount and count there instead of
+grouping documents. Use "documents" (the default) when the query needs individual
+receipts or fields the rollup lacks (category, payment_method, items).
+
+For merchant queries on either collection, match merchant_keys with the merchant name
+casefolded, e.g. {"$match": {"merchant_keys": "grab singapore"}}. This covers the
+canonical name and every known synonym, so no $lookup into merchants is needed.
 
 Important:
-1. Use EXACT merchant name from the query - do not abbreviate or modify it
+1. Use EXACT merchant name from the query - do not abbreviate or modify it, only casefold it and collapse repeated spaces
 2. Use exact operator syntax: "$eq", "$ne", "$in", etc.
 3. For string comparison use exact match, not regex
-4. The $lookup must use let/expr pattern for merchant matching"""
+4. Put the merchant_keys $match first so it can use the index
+5. Average spend per receipt from the rollup is sum(total_amount) / sum(count)
+6. Write date literals as extended JSON, e.g. {"date": {"$gte": {"$date": "2025-01-01T00:00:00Z"}, "$lt": {"$date": "2025-02-01T00:00:00Z"}}}, and never compare date with strings or convert it with $dateFromString{fx_rules}"""
+
+# Only described to the model when an FX rate file is configured; otherwise
+# total_amount_base is never written and summing it would return 0
+FX_PROMPT_SECTIONS = {
+    "fx_document_fields": (
+        "- total_amount_base (number, total_amount converted to base_currency at the receipt date's FX rate; indexed)\n"
+        "- base_currency (string, e.g. \"SGD\")\n"
+    ),
+    "fx_rollup_fields": "- total_amount_base (number, sum of total_amount_base for that merchant/day/currency)\n",
+    "fx_rules": (
+        "\n7. Totals across currencies, or with no currency named, must $sum total_amount_base "
+        "(not total_amount); group by currency only when the query asks for a breakdown by currency"
+    ),
+}
+
+
+def pipeline_system_prompt(fx_rates: bool = False) -> str:
+    """PIPELINE_SYSTEM_PROMPT with the FX sections filled in only if fx_rates is configured."""
+    prompt = PIPELINE_SYSTEM_PROMPT
+    for name, text in FX_PROMPT_SECTIONS.items():
+        prompt = prompt.replace("{" + name + "}", text if fx_rates else "")
+    return prompt
+
+def pipeline_prompt_version(fx_rates: bool = False) -> str:
+    """Hash of the generator's system prompt and tool schema, for SemanticQueryCache."""
+    payload = json.dumps([pipeline_system_prompt(fx_rates), MONGODB_PIPELINE_TOOL], sort_keys=True)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()[:16]
+
+def process_natural_language_query(
+    claude: anthropic.Client,
+    query: str,
+    metrics: QueryMetricsRecorder = None,
+    fx_rates: bool = False
+) -> dict:
+    """
+    Convert natural language query to MongoDB aggregation pipeline using structured outputs.
+
+    Returns a dict with 'pipeline' (list) and optional 'explanation' (str).
+
+    The tool definition and system prompt are identical on every call, so they
+    are marked as a cacheable prompt prefix (one breakpoint on the system block
+    covers the tools before it). Prefixes shorter than the model's minimum
+    cacheable length are silently not cached. The response is streamed so
+    time-to-first-token and cache read/write token counts can be recorded.
+    Pass fx_rates=True when documents carry total_amount_base.
+    """
+    start = time.perf_counter()
+    ttft_ms = None
 
-    message = claude.messages.create(
+    with claude.messages.stream(
         model="claude-sonnet-4-5-20250929",
         max_tokens=1024,
-        system=system_prompt,
+        system=[
+            {
+                "type": "text",
+                "text": pipeline_system_prompt(fx_rates),
+                "cache_control": {"type": "ephemeral"}
+            }
+        ],
         tools=[MONGODB_PIPELINE_TOOL],
         tool_choice={"type": "tool", "name": "generate_mongodb_pipeline"},
         messages=[
@@ -273,7 +466,14 @@ Important:
                 "content": f"Convert this query to a MongoDB aggregation pipeline: {query}"
             }
         ]
-    )
+    ) as stream:
+        for event in stream:
+            if ttft_ms is None and event.type in ("content_block_start", "content_block_delta"):
+                ttft_ms = (time.perf_counter() - start) * 1000
+        message = stream.get_final_message()
+
+    if metrics is not None:
+        metrics.record(query, message.usage, ttft_ms, (time.perf_counter() - start) * 1000)
 
     # With tool_choice forcing the tool, response is guaranteed valid JSON
     for block in message.content:
@@ -282,11 +482,109 @@ Important:
 
     raise ValueError("Claude did not return tool use response")
 
+@st.cache_data(ttl=60, show_spinner=False)
+def load_debug_contents(database_name: str, doc_limit: int = 5, merchant_limit: int = 10):
+    """Recent documents and merchants for the debug expander, cached until the next save."""
+    db = init_connections()[0]
+    docs = [display_document(doc) for doc in db.documents.find().limit(doc_limit)]
+    merchants = [
+        display_document(merchant)
+        for merchant in db.merchants.find({}, {"merchant_embedding": 0, RESCORE_FIELD: 0}).limit(merchant_limit)
+    ]
+    return docs, merchants
+
+@st.cache_data(ttl=300, show_spinner=False)
+def load_results_page(
+    database_name: str,
+    pipeline_json: str,
+    collection: str,
+    page: int,
+    page_size: int,
+    max_time_ms: int = None
+):
+    """
+    One page of a validated pipeline's results, cached until the next save.
+
+    pipeline_json is the pipeline in extended JSON (see bson.json_util), which
+    keeps datetimes intact and makes the cache key hashable.
+    """
+    db = init_connections()[0]
+    rows, has_next = fetch_results_page(
+        db, json_util.loads(pipeline_json), page, page_size,
+        max_time_ms=max_time_ms,
+        collection=collection
+    )
+    return [display_document(row) for row in rows], has_next
+
+def extract_and_classify(db, claude, merchant_classifier, pdf_bytes: bytes) -> tuple[dict, list]:
+    """Extract an uploaded PDF's metadata and resolve its merchant. Returns (metadata, captions)."""
+    captions = []
+    # Extract metadata using Claude vision + structured outputs
+    with st.spinner("Extracting metadata with Claude Vision..."):
+        # Content-addressed cache: duplicate uploads skip the API call
+        extraction_cache = ExtractionCache(db.extraction_cache)
+        metadata = extraction_cache.get(pdf_bytes, EXTRACTION_SCHEMA_VERSION)
+        if metadata is None:
+            # Known merchant layouts are read from the text layer without an API call
+            metadata = get_template_extractor(st.secrets["database_name"], db).extract(pdf_bytes)
+            if metadata is not None:
+                captions.append(f"⚡ Extracted locally with the {metadata['merchant_name']} template")
+        if metadata is None:
+            # Send only the header/totals pages of long documents
+            report = preprocess_pdf(pdf_bytes)
+            metadata = extract_metadata_with_claude(
+                claude, pdf_bytes, cache=extraction_cache,
+                send_bytes=report["pdf_bytes"], pages=report["pages"], cache_checked=True
+            )
+            if report["mode"] == "trimmed":
+                captions.append(
+                    f"✂️ Sent pages {', '.join(str(i + 1) for i in report['pages'])} "
+                    f"of {report['page_count']} ({report['bytes_saved'] / 1024:.0f} KB, "
+                    f"~{report['est_tokens_saved']} tokens saved)"
+                )
+
+    # Classify merchant (template extractions already know it)
+    if "merchant_id" in metadata:
+        metadata["merchant_synonyms"] = merchant_classifier.get_all_synonyms(
+            metadata["merchant_name"]
+        )
+    elif "merchant_name" in metadata:
+        with st.spinner("Classifying merchant..."):
+            merchant_result = merchant_classifier.classify_merchant(
+                metadata["merchant_name"],
+                claude,
+                languages=["en", "zh", "my"]  # Add more languages as needed
+            )
+
+            # Update metadata with merchant details
+            metadata["merchant_id"] = merchant_result["merchant_id"]
+            metadata["merchant_name"] = merchant_result["canonical_name"]
+            metadata["merchant_synonyms"] = merchant_classifier.get_all_synonyms(
+                merchant_result["canonical_name"]
+            )
+    return metadata, captions
+
+def reset_results_page() -> None:
+    """Start from the first page when the page size changes."""
+    st.session_state["results_page"] = 0
+
+def invalidate_cached_reads() -> None:
+    """Drop cached reads that a new document makes stale."""
+    load_debug_contents.clear()
+    load_results_page.clear()
+
 def main():
     st.title("Receipt Processor")
 
     # Initialize connections
-    db, claude, merchant_classifier = init_connections()
+    db, claude, merchant_classifier, pool_metrics = init_connections()
+
+    pool_stats = pool_metrics.stats()
+    st.sidebar.metric(
+        "MongoDB connections",
+        pool_stats["open"],
+        help=f"{pool_stats['checked_out']} in use, {pool_stats['created']} opened since start"
+    )
 
     # Create tabs
     tab1, tab2 = st.tabs(["PDF Processing", "Query Database"])
@@ -299,37 +597,25 @@ def main():
         if uploaded_file:
             # Get PDF bytes for vision API
             pdf_bytes = uploaded_file.getvalue()
-
-            # Extract metadata using Claude vision + structured outputs
-            with st.spinner("Extracting metadata with Claude Vision..."):
-                metadata = extract_metadata_with_claude(claude, pdf_bytes)
-
-                # Classify merchant
-                if "merchant_name" in metadata:
-                    with st.spinner("Classifying merchant..."):
-                        merchant_result = merchant_classifier.classify_merchant(
-                            metadata["merchant_name"],
-                            claude,
-                            languages=["en", "zh", "my"]  # Add more languages as needed
-                        )
-
-                        # Update metadata with merchant details
-                        metadata["merchant_id"] = merchant_result["merchant_id"]
-                        metadata["merchant_name"] = merchant_result["canonical_name"]
-                        metadata["merchant_synonyms"] = merchant_classifier.get_all_synonyms(
-                            merchant_result["canonical_name"]
-                        )
+            upload_key = hashlib.sha256(pdf_bytes).hexdigest()
+
+            # Extraction and classification (LLM calls, merchant writes) run once
+            # per upload; reruns from other widgets reuse the result
+            processed = st.session_state.get("processed_upload")
+            if processed is None or processed["key"] != upload_key:
+                metadata, captions = extract_and_classify(db, claude, merchant_classifier, pdf_bytes)
+                processed = {"key": upload_key, "metadata": metadata, "captions": captions}
+                st.session_state["processed_upload"] = processed
+            metadata = processed["metadata"]
+            for caption in processed["captions"]:
+                st.caption(caption)
 
             # Display extracted metadata
             st.subheader("Extracted Metadata")
             st.json(metadata)
 
             # Prepare document for MongoDB
-            doc = {
-                **metadata,
-                "processed_date": datetime.utcnow(),
-                "source_filename": uploaded_file.name
-            }
+            doc = build_document(metadata, uploaded_file.name, fx_table=get_fx_table())
 
             # Display MongoDB document
             st.subheader("MongoDB Document")
@@ -339,6 +625,8 @@ def main():
             if st.button("Save to Database"):
                 with st.spinner("Saving to database..."):
                     result = db.documents.insert_one(doc)
+                    update_spend_rollups(db, [doc])
+                    invalidate_cached_reads()
                     st.success(f"Document saved with ID: {result.inserted_id}")
 
     # Query Database Tab
@@ -348,25 +636,20 @@ def main():
         # Debug section
         with st.expander("🔍 Debug: View Database Contents"):
             col1, col2 = st.columns(2)
+            docs, merchants = load_debug_contents(st.secrets["database_name"])
 
             with col1:
                 st.subheader("Documents")
-                docs = list(db.documents.find().limit(5))
                 if docs:
                     for doc in docs:
-                        doc["_id"] = str(doc["_id"])
-                        if "merchant_id" in doc:
-                            doc["merchant_id"] = str(doc["merchant_id"])
                         st.json(doc)
                 else:
                     st.info("No documents found")
 
             with col2:
                 st.subheader("Merchants")
-                merchants = list(db.merchants.find().limit(10))
                 if merchants:
                     for merchant in merchants:
-                        merchant["_id"] = str(merchant["_id"])
                         st.json(merchant)
                 else:
                     st.info("No merchants found")
@@ -374,40 +657,121 @@ def main():
         query = st.text_area("Enter your query in natural language",
                            "How much did I spend on Grab Singapore")
 
+        fx_rates = bool(st.secrets.get("fx_rates_path"))
+        prompt_version = pipeline_prompt_version(fx_rates)
+
         if st.button("Run Query"):
             with st.spinner("Processing query..."):
-                # Convert natural language to MongoDB query using structured outputs
-                query_result = process_natural_language_query(claude, query)
-                pipeline = query_result["pipeline"]
-
-                # Display MongoDB query
-                st.subheader("MongoDB Query")
-                st.code(json.dumps(pipeline, indent=2), language="json")
-
-                # Show explanation if provided
-                if "explanation" in query_result:
-                    st.info(f"**Query explanation:** {query_result['explanation']}")
-
-                # Execute query
-                try:
-                    # Security: Validate pipeline before execution
-                    validate_pipeline(pipeline)
-
-                    results = list(db.documents.aggregate(pipeline))
-
-                    # Display results
-                    st.subheader(f"Results ({len(results)} documents)")
-                    for result in results:
-                        # Convert ObjectId to string for display
-                        result["_id"] = str(result["_id"])
-                        if "merchant_id" in result:
-                            result["merchant_id"] = str(result["merchant_id"])
-                        st.json(result)
-
-                except PipelineValidationError as e:
-                    st.error(f"Security validation failed: {str(e)}")
-                except Exception as e:
-                    st.error(f"Error executing query: {str(e)}")
+                # Reuse a validated pipeline from a near-duplicate earlier query if possible
+                query_cache = get_query_cache(st.secrets["database_name"], prompt_version, db, merchant_classifier)
+                start = time.perf_counter()
+                query_result = query_cache.lookup(query)
+
+                if query_result is not None:
+                    get_query_metrics().record(
+                        query, None, None, (time.perf_counter() - start) * 1000, source="semantic_cache"
+                    )
+                else:
+                    # Convert natural language to MongoDB query using structured outputs
+                    query_result = process_natural_language_query(
+                        claude,
+                        query,
+                        metrics=get_query_metrics(),
+                        fx_rates=fx_rates
+                    )
+
+            # Keep the query in session state so paging through results survives reruns
+            st.session_state["query_text"] = query
+            st.session_state["query_result"] = query_result
+            st.session_state["results_page"] = 0
+
+        query_result = st.session_state.get("query_result")
+        if query_result:
+            pipeline = query_result["pipeline"]
+            collection = query_result.get("collection", "documents")
+
+            if "cached_query" in query_result:
+                st.caption(
+                    f"♻️ Reused the pipeline for \"{query_result['cached_query']}\" "
+                    f"(similarity {query_result['similarity']:.3f})"
+                )
+
+            # Display MongoDB query
+            st.subheader(f"MongoDB Query ({collection})")
+            st.code(json.dumps(pipeline, indent=2), language="json")
+
+            # Show explanation if provided
+            if "explanation" in query_result:
+                st.info(f"**Query explanation:** {query_result['explanation']}")
+
+            # Execute query
+            try:
+                # Security: Validate pipeline (and its explain cost) before execution.
+                # Done once per query; paging reruns reuse the validated pipeline
+                budget = PipelineBudget(**st.secrets.get("pipeline_budget", {}))
+                if "validated_pipeline_json" not in query_result:
+                    validated = validate_pipeline(decode_pipeline(pipeline), db, budget, collection)
+                    query_result["validated_pipeline_json"] = json_util.dumps(validated)
+
+                page = st.session_state.get("results_page", 0)
+                page_size = st.selectbox(
+                    "Rows per page", RESULTS_PAGE_SIZES, index=1,
+                    key="results_page_size", on_change=reset_results_page
+                )
+                rows, has_next = load_results_page(
+                    st.secrets["database_name"],
+                    query_result["validated_pipeline_json"],
+                    collection,
+                    page,
+                    page_size,
+                    budget.max_time_ms
+                )
+
+                # Only pipelines that validated and ran are cached for reuse
+                if "cached_query" not in query_result and not query_result.get("cached"):
+                    get_query_cache(st.secrets["database_name"], prompt_version, db, merchant_classifier).store(
+                        st.session_state["query_text"], query_result
+                    )
+                    query_result["cached"] = True
+
+                # Display results
+                first = page * page_size
+                st.subheader(f"Results {first + 1 if rows else 0}-{first + len(rows)}")
+                if st.radio("View", ["Table", "JSON"], horizontal=True) == "Table":
+                    st.dataframe(rows, use_container_width=True)
+                else:
+                    for row in rows:
+                        st.json(row)
+
+                col1, col2 = st.columns(2)
+                if col1.button("← Previous", disabled=page == 0):
+                    st.session_state["results_page"] = page - 1
+                    st.rerun()
+                if col2.button("Next →", disabled=not has_next):
+                    st.session_state["results_page"] = page + 1
+                    st.rerun()
+
+            except PipelineCostError as e:
+                st.error(f"Query rejected: {str(e)}")
+            except PipelineValidationError as e:
+                st.error(f"Security validation failed: {str(e)}")
+            except Exception as e:
+                st.error(f"Error executing query: {str(e)}")
+
+        # Query performance instrumentation
+        with st.expander("⏱️ Query Performance"):
+            summary = get_query_metrics().summary()
+            if summary["queries"]:
+                col1, col2, col3 = st.columns(3)
+                col1.metric("Queries", summary["queries"])
+                col2.metric(
+                    "Mean time to first token",
+                    f"{summary['mean_ttft_ms']:.0f} ms" if summary["mean_ttft_ms"] is not None else "-"
+                )
+                col3.metric("Cached prompt share", f"{summary['cached_prompt_share']:.0%}")
+                st.dataframe(get_query_metrics().records()[::-1])
+            else:
+                st.info("No queries run yet")
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
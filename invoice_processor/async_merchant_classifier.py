@@ -0,0 +1,287 @@
+from typing import Dict, List, Optional, Union
+from concurrent.futures import ThreadPoolExecutor
+import asyncio
+
+import numpy as np
+from pymongo import AsyncMongoClient, MongoClient, ReturnDocument
+from pymongo.errors import DuplicateKeyError
+
+from embedding_cache import EmbeddingCache
+from embedding_codec import EmbeddingCodec
+from merchant_classifier import (
+    SYNONYM_SIMILARITY,
+    build_verification_request,
+    candidate_name,
+    classification,
+    is_confirmed_synonym,
+    is_known_synonym,
+    is_new_synonym,
+    new_merchant_document,
+    parse_verification_response,
+    synonym_update,
+)
+from merchant_keys import KEYED_COLLECTIONS, merchant_key_update
+from model_registry import get_model
+from synonym_index import SynonymIndex
+from verdict_cache import AsyncVerdictCache
+from vector_backends import AtlasVectorSearchBackend, VectorSearchBackend
+
+
+class AsyncMultilingualMerchantClassifier:
+    """
+    asyncio variant of MultilingualMerchantClassifier.
+
+    Uses pymongo's AsyncMongoClient and an anthropic.AsyncAnthropic client so
+    many classifications can overlap on one event loop. SentenceTransformer
+    encoding is CPU-bound and is offloaded to a small thread pool. Index setup
+    is left to the synchronous classifier.
+    """
+
+    def __init__(
+        self,
+        mongodb_uri: Optional[str] = None,
+        db_name: str = "cathay",
+        model_name: str = "paraphrase-multilingual-mpnet-base-v2",
+        embedding_cache_size: int = 10000,
+        embedding_cache_path: Optional[str] = None,
+        vector_backend: Optional[VectorSearchBackend] = None,
+        vector_search_options: Optional[Dict] = None,
+        encode_workers: int = 2,
+        model_backend: str = "torch",
+        model_file_name: Optional[str] = None,
+        client: Optional[AsyncMongoClient] = None,
+        embedding_format: str = "float",
+        embedding_dimensions: Optional[int] = None,
+        embedding_projection_path: Optional[str] = None,
+        verdict_ttl_seconds: Optional[float] = 30 * 24 * 3600,
+        use_synonym_index: bool = True,
+        synonym_poll_interval: float = 30.0,
+        synonym_index: Optional[SynonymIndex] = None
+    ):
+        """
+        Initialize with an async MongoDB connection and the multilingual model.
+
+        vector_backend defaults to Atlas $vectorSearch through the async client.
+        Any other VectorSearchBackend (e.g. a LocalVectorIndex) is queried in
+        the encode thread pool.
+
+        Pass an existing AsyncMongoClient as client to share its connection
+        pool; close() then leaves it open.
+
+        The embedding_* options must match the synchronous classifier's so
+        both read and write merchant_embedding in the same format.
+
+        LLM synonym verdicts share the synchronous classifier's
+        merchant_verdicts cache for verdict_ttl_seconds (None disables it).
+
+        Exact synonym matches are served from a SynonymIndex, as in the
+        synchronous classifier. The index follows the collection through a
+        synchronous client, so with use_synonym_index one is opened from
+        mongodb_uri; pass a started synonym_index instead (e.g. the synchronous
+        classifier's) when sharing a client. close() leaves a passed index open.
+        """
+        self._owns_client = client is None
+        if client is None:
+            if not mongodb_uri:
+                raise ValueError("Pass mongodb_uri or client")
+            client = AsyncMongoClient(mongodb_uri)
+        self.client = client
+        self.db = self.client[db_name]
+        self.merchants = self.db.merchants
+        self.documents = self.db.documents
+
+        self.synonym_index = synonym_index
+        self._sync_client = None
+        if synonym_index is None and use_synonym_index and mongodb_uri:
+            self._sync_client = MongoClient(mongodb_uri)
+            self.synonym_index = SynonymIndex(
+                self._sync_client[db_name].merchants,
+                poll_interval=synonym_poll_interval
+            ).start()
+
+        self.verdict_cache = None
+        if verdict_ttl_seconds:
+            self.verdict_cache = AsyncVerdictCache(self.db.merchant_verdicts, ttl_seconds=verdict_ttl_seconds)
+
+        self.model = get_model(model_name, backend=model_backend, file_name=model_file_name)
+        self.embedding_cache = EmbeddingCache(
+            model_name,
+            maxsize=embedding_cache_size,
+            path=embedding_cache_path,
+            backend=model_backend,
+            file_name=model_file_name
+        )
+        self._executor = ThreadPoolExecutor(
+            max_workers=encode_workers,
+            thread_name_prefix="merchant-encode"
+        )
+
+        self.embedding_codec = EmbeddingCodec(
+            embedding_format,
+            dimensions=embedding_dimensions,
+            projection=embedding_projection_path
+        )
+
+        # The async Atlas path only borrows build_pipeline and rank from this backend
+        self._atlas = AtlasVectorSearchBackend(
+            self.merchants,
+            codec=self.embedding_codec,
+            **(vector_search_options or {})
+        )
+        self.vector_backend = vector_backend if vector_backend is not None else self._atlas
+
+    async def encode(self, texts: Union[str, List[str]]) -> np.ndarray:
+        """Encode text(s) in the thread pool, going through the embedding cache."""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            self._executor, self.embedding_cache.encode, self.model, texts
+        )
+
+    async def find_closest_merchant(self, name: str) -> tuple[Optional[Dict], float]:
+        """Find the most similar existing merchant using vector search and synonym lookup."""
+        if self.synonym_index is not None:
+            exact_match = self.synonym_index.lookup(name)
+            if exact_match:
+                return exact_match, 1.0
+
+        exact_match = await self.merchants.find_one({"synonyms": name})
+        if exact_match:
+            return exact_match, 1.0  # Perfect match score
+
+        query_vector = (await self.encode(name)).tolist()
+        return await self._vector_search(query_vector)
+
+    async def _vector_search(self, query_vector: List[float]) -> tuple[Optional[Dict], float]:
+        """Query the vector backend and return the best match and its score."""
+        if self.vector_backend is self._atlas:
+            cursor = await self.merchants.aggregate(self._atlas.build_pipeline(query_vector, 1))
+            results = self._atlas.rank(query_vector, await cursor.to_list(length=None), 1)
+        else:
+            loop = asyncio.get_running_loop()
+            results = await loop.run_in_executor(
+                self._executor, self.vector_backend.search, query_vector, 1
+            )
+
+        if not results:
+            return None, 0.0
+
+        return results[0]
+
+    async def classify_merchant(
+        self,
+        extracted_name: str,
+        llm_client,
+        languages: Optional[List[str]] = None
+    ) -> Dict:
+        """
+        Classify a merchant name using vector similarity and LLM verification.
+        llm_client must be an anthropic.AsyncAnthropic.
+        """
+        closest_match, similarity = await self.find_closest_merchant(extracted_name)
+
+        if is_known_synonym(extracted_name, closest_match, similarity):
+            return classification(closest_match["_id"], closest_match["canonical_name"], True, similarity)
+
+        if similarity > SYNONYM_SIMILARITY:
+            merchant_id = closest_match["_id"]
+            previous = await self.merchants.find_one_and_update(
+                {"_id": merchant_id},
+                synonym_update(extracted_name),
+                projection={"synonyms": 1},
+                return_document=ReturnDocument.BEFORE
+            )
+            await self._record_synonym(merchant_id, closest_match["canonical_name"], extracted_name, previous)
+            return classification(merchant_id, closest_match["canonical_name"], True, similarity)
+
+        candidate = candidate_name(closest_match)
+        analysis = None
+        if self.verdict_cache is not None:
+            analysis = await self.verdict_cache.get(extracted_name, candidate)
+
+        if analysis is None:
+            message = await llm_client.messages.create(
+                **build_verification_request(extracted_name, closest_match, languages)
+            )
+            analysis = parse_verification_response(message.content[0].text)
+            if self.verdict_cache is not None:
+                await self.verdict_cache.put(extracted_name, candidate, analysis)
+
+        embedding = (await self.encode(extracted_name)).tolist()
+        stored_fields = self.embedding_codec.stored_fields(embedding)
+
+        if is_confirmed_synonym(analysis, closest_match):
+            merchant_id = closest_match["_id"]
+            previous = await self.merchants.find_one_and_update(
+                {"_id": merchant_id},
+                synonym_update(extracted_name, stored_fields),
+                projection={"synonyms": 1},
+                return_document=ReturnDocument.BEFORE
+            )
+            self.vector_backend.upsert(merchant_id, closest_match["canonical_name"], embedding)
+            await self._record_synonym(merchant_id, closest_match["canonical_name"], extracted_name, previous)
+            return classification(merchant_id, analysis["canonical_name"], True, analysis["confidence"])
+
+        try:
+            result = await self.merchants.insert_one(new_merchant_document(extracted_name, stored_fields, languages))
+        except DuplicateKeyError:
+            # Another task or process created this merchant after our vector search
+            existing = await self.merchants.find_one({"canonical_name": extracted_name}, {"canonical_name": 1})
+            if existing is None:
+                raise
+            self.vector_backend.upsert(existing["_id"], extracted_name, embedding)
+            return classification(existing["_id"], existing["canonical_name"], True, analysis["confidence"])
+        self.vector_backend.upsert(result.inserted_id, extracted_name, embedding)
+        return classification(result.inserted_id, extracted_name, False, analysis["confidence"])
+
+    async def classify_merchants(
+        self,
+        names: List[str],
+        llm_client,
+        languages: Optional[List[str]] = None,
+        concurrency: int = 8
+    ) -> List[Dict]:
+        """
+        Classify many names concurrently (at most `concurrency` in flight).
+        Duplicates are classified once; results are returned in input order.
+        """
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def classify(name: str) -> Dict:
+            async with semaphore:
+                return await self.classify_merchant(name, llm_client, languages)
+
+        unique_names = list(dict.fromkeys(names))
+        results = await asyncio.gather(*(classify(name) for name in unique_names))
+        resolved = dict(zip(unique_names, results))
+        return [resolved[name] for name in names]
+
+    async def _record_synonym(
+        self,
+        merchant_id,
+        canonical_name: str,
+        synonym: str,
+        previous: Optional[Dict]
+    ) -> None:
+        """Async counterpart of MultilingualMerchantClassifier._record_synonym."""
+        if self.synonym_index is not None:
+            self.synonym_index.add_synonym(merchant_id, canonical_name, synonym)
+        if is_new_synonym(synonym, previous):
+            for collection in KEYED_COLLECTIONS:
+                await self.db[collection].update_many({"merchant_id": merchant_id}, merchant_key_update(synonym))
+
+    async def get_all_synonyms(self, canonical_name: str) -> List[str]:
+        """Get all synonyms for a canonical merchant name."""
+        merchant = await self.merchants.find_one(
+            {"canonical_name": canonical_name},
+            {"synonyms": 1}
+        )
+        return merchant["synonyms"] if merchant else []
+
+    async def close(self) -> None:
+        """Close the MongoDB clients and synonym index this classifier opened, and the encode thread pool."""
+        if self._sync_client is not None:
+            self.synonym_index.close()
+            self._sync_client.close()
+        if self._owns_client:
+            await self.client.close()
+        self._executor.shutdown(wait=False)
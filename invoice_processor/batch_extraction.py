@@ -0,0 +1,337 @@
+#!/usr/bin/env python3
+"""
+Offline invoice extraction through the Message Batches API.
+
+For backfills that don't need an interactive response: builds one
+extract_invoice_metadata request per PDF, submits them as message batches
+(each chunk under the per-batch size limit is submitted as soon as it is
+built, so only one chunk of base64 payloads is in memory), polls until each
+batch ends and streams the results into the documents collection in
+classify/insert batches. Batched requests are billed at a discount and don't count against
+the per-request rate limits.
+
+    python batch_extraction.py receipts/ --poll-interval 60
+
+PDFs already in the extraction cache are written without being resubmitted,
+and every batch result is added to the cache. FakeBatchClient is a local
+stand-in for the batch endpoint, for exercising the flow without the API.
+"""
+
+from typing import TYPE_CHECKING, Any, Callable, Dict, Iterator, List, Optional, Tuple
+from pathlib import Path
+from types import SimpleNamespace
+import argparse
+import hashlib
+import time
+
+import anthropic
+
+from embedding_codec import embedding_options
+from extraction_cache import ExtractionCache
+from fx_rates import DEFAULT_BASE_CURRENCY, FxRateTable, load_fx_table
+from ingest import load_settings, print_run_summary, resolve_pdf_paths, write_batch, DEFAULT_SECRETS_PATH
+from invoice_extraction import (
+    EXTRACTION_SCHEMA_VERSION,
+    build_extraction_params,
+    parse_extraction_message,
+)
+from invoice_templates import TEMPLATE_COLLECTION, TemplateExtractor
+from mongo_pool import create_client
+
+if TYPE_CHECKING:
+    # Imported in main() as in ingest.py, so importing this module doesn't load the model stack
+    from merchant_classifier import MultilingualMerchantClassifier
+
+# The API allows 100,000 requests / 256 MB per batch; stay comfortably below
+MAX_BATCH_REQUESTS = 10000
+MAX_BATCH_BYTES = 200 * 1024 * 1024
+
+
+def request_id_for(pdf_bytes: bytes) -> str:
+    """Batch custom_id for a PDF: its SHA-256, so duplicate files share one request."""
+    return hashlib.sha256(pdf_bytes).hexdigest()
+
+
+def iter_batch_requests(
+    paths: List[Path],
+    paths_by_id: Dict[str, List[Path]],
+    cached: List[Tuple[Path, Dict[str, Any]]],
+    cache: Optional[ExtractionCache] = None,
+    templates: Optional[TemplateExtractor] = None
+) -> Iterator[List[Dict]]:
+    """
+    Yield batch request chunks for paths, one at a time.
+
+    Each chunk is yielded as soon as it is full, so the caller can submit it
+    before the next PDFs are read and base64-encoded; only one chunk of
+    request payloads is held in memory. PDFs found in the cache or extracted
+    locally by templates are not submitted but appended to `cached`, and
+    every submitted custom_id is recorded in `paths_by_id`.
+    """
+    chunk: List[Dict] = []
+    chunk_bytes = 0
+
+    for path in paths:
+        pdf_bytes = path.read_bytes()
+        if cache is not None:
+            metadata = cache.get(pdf_bytes, EXTRACTION_SCHEMA_VERSION)
+            if metadata is not None:
+                cached.append((path, metadata))
+                continue
+        if templates is not None:
+            metadata = templates.extract(pdf_bytes)
+            if metadata is not None:
+                cached.append((path, metadata))
+                continue
+
+        custom_id = request_id_for(pdf_bytes)
+        if custom_id in paths_by_id:
+            paths_by_id[custom_id].append(path)
+            continue
+        paths_by_id[custom_id] = [path]
+
+        # base64 inflates the payload by 4/3
+        request_bytes = len(pdf_bytes) * 4 // 3 + 2048
+        if chunk and (len(chunk) >= MAX_BATCH_REQUESTS or chunk_bytes + request_bytes > MAX_BATCH_BYTES):
+            yield chunk
+            chunk = []
+            chunk_bytes = 0
+        chunk.append({"custom_id": custom_id, "params": build_extraction_params(pdf_bytes)})
+        chunk_bytes += request_bytes
+
+    if chunk:
+        yield chunk
+
+
+def wait_for_batch(
+    claude,
+    batch_id: str,
+    poll_interval: float = 60.0,
+    timeout: Optional[float] = None
+):
+    """Poll a message batch until processing has ended. Returns the final batch object."""
+    start = time.monotonic()
+    while True:
+        batch = claude.messages.batches.retrieve(batch_id)
+        counts = batch.request_counts
+        print(
+            f"Batch {batch_id}: {batch.processing_status} "
+            f"(processing={counts.processing}, succeeded={counts.succeeded}, errored={counts.errored})"
+        )
+        if batch.processing_status == "ended":
+            return batch
+        if timeout is not None and time.monotonic() - start > timeout:
+            raise TimeoutError(f"Batch {batch_id} did not finish within {timeout}s")
+        time.sleep(poll_interval)
+
+
+def iter_batch_results(claude, batch_id: str) -> Iterator[Tuple[str, Optional[Dict[str, Any]], Optional[str]]]:
+    """Yield (custom_id, metadata, error) for every request in an ended batch."""
+    for entry in claude.messages.batches.results(batch_id):
+        if entry.result.type != "succeeded":
+            error = getattr(entry.result, "error", None)
+            yield entry.custom_id, None, f"{entry.result.type}: {error}"
+            continue
+        try:
+            yield entry.custom_id, parse_extraction_message(entry.result.message), None
+        except ValueError as e:
+            yield entry.custom_id, None, str(e)
+
+
+def run_batch_extraction(
+    paths: List[Path],
+    db,
+    claude,
+    merchant_classifier: "MultilingualMerchantClassifier",
+    cache: Optional[ExtractionCache] = None,
+    batch_size: int = 50,
+    poll_interval: float = 60.0,
+    timeout: Optional[float] = None,
+    fx_table: Optional[FxRateTable] = None,
+    templates: Optional[TemplateExtractor] = None
+) -> Dict[str, Any]:
+    """Extract paths through message batches and store the results. Returns run statistics."""
+    start = time.perf_counter()
+    written = 0
+    failures: List[Tuple[str, str]] = []
+    rollup_errors: List[str] = []
+
+    paths_by_id: Dict[str, List[Path]] = {}
+    cached: List[Tuple[Path, Dict[str, Any]]] = []
+
+    def store(extractions: List[Tuple[Path, Dict[str, Any]]]) -> int:
+        stored = 0
+        for i in range(0, len(extractions), batch_size):
+            pending = extractions[i:i + batch_size]
+            try:
+                result = write_batch(db, merchant_classifier, claude, pending, fx_table)
+            except Exception as e:
+                print(f"Error writing batch of {len(pending)}: {e}")
+                failures.extend((str(path), str(e)) for path, _ in pending)
+                continue
+            stored += result["written"]
+            failures.extend(result["failures"])
+            if result["rollup_error"] is not None:
+                rollup_errors.append(result["rollup_error"])
+        return stored
+
+    def store_cached() -> int:
+        # Cache and template hits turn up while chunks are being built
+        if not cached:
+            return 0
+        print(f"{len(cached)} PDFs already extracted (cache or local templates), writing them directly")
+        pending = list(cached)
+        cached.clear()
+        return store(pending)
+
+    batch_ids = []
+    for chunk in iter_batch_requests(paths, paths_by_id, cached, cache, templates):
+        batch = claude.messages.batches.create(requests=chunk)
+        print(f"Submitted batch {batch.id} with {len(chunk)} requests")
+        batch_ids.append(batch.id)
+        written += store_cached()
+    written += store_cached()
+
+    for batch_id in batch_ids:
+        wait_for_batch(claude, batch_id, poll_interval, timeout)
+
+        extractions: List[Tuple[Path, Dict[str, Any]]] = []
+        for custom_id, metadata, error in iter_batch_results(claude, batch_id):
+            batch_paths = paths_by_id.get(custom_id, [])
+            if error is not None:
+                failures.extend((str(path), error) for path in batch_paths)
+                continue
+            if cache is not None and batch_paths:
+                cache.put(batch_paths[0].read_bytes(), EXTRACTION_SCHEMA_VERSION, metadata)
+            extractions.extend((path, dict(metadata)) for path in batch_paths)
+
+            if len(extractions) >= batch_size:
+                written += store(extractions)
+                extractions = []
+        written += store(extractions)
+
+    elapsed = time.perf_counter() - start
+    return {
+        "files": len(paths),
+        "batches": batch_ids,
+        "written": written,
+        "failed": len(failures),
+        "failures": failures,
+        "rollup_errors": rollup_errors,
+        "elapsed_seconds": elapsed,
+        "docs_per_second": written / elapsed if elapsed > 0 else 0.0,
+    }
+
+
+class FakeMessageBatches:
+    """
+    In-process stand-in for claude.messages.batches.
+
+    Requests are answered by responder(custom_id, params), which returns the
+    tool input for a succeeded result or raises to produce an errored one.
+    A batch reports "in_progress" for polls_until_ended retrieve calls.
+    """
+
+    def __init__(self, responder: Callable[[str, Dict], Dict[str, Any]], polls_until_ended: int = 1):
+        self.responder = responder
+        self.polls_until_ended = polls_until_ended
+        self._batches: Dict[str, Dict] = {}
+
+    def create(self, requests: List[Dict]):
+        batch_id = f"msgbatch_fake_{len(self._batches) + 1}"
+        self._batches[batch_id] = {"requests": requests, "polls": 0}
+        return self.retrieve(batch_id, count_poll=False)
+
+    def retrieve(self, batch_id: str, count_poll: bool = True):
+        state = self._batches[batch_id]
+        if count_poll:
+            state["polls"] += 1
+        ended = state["polls"] > self.polls_until_ended
+        total = len(state["requests"])
+        return SimpleNamespace(
+            id=batch_id,
+            processing_status="ended" if ended else "in_progress",
+            request_counts=SimpleNamespace(
+                processing=0 if ended else total,
+                succeeded=total if ended else 0,
+                errored=0,
+                canceled=0,
+                expired=0
+            )
+        )
+
+    def results(self, batch_id: str):
+        for request in self._batches[batch_id]["requests"]:
+            try:
+                tool_input = self.responder(request["custom_id"], request["params"])
+                result = SimpleNamespace(
+                    type="succeeded",
+                    message=SimpleNamespace(content=[
+                        SimpleNamespace(type="tool_use", name="extract_invoice_metadata", input=tool_input)
+                    ])
+                )
+            except Exception as e:
+                result = SimpleNamespace(type="errored", error=str(e))
+            yield SimpleNamespace(custom_id=request["custom_id"], result=result)
+
+
+class FakeBatchClient:
+    """Minimal anthropic.Client look-alike exposing only messages.batches."""
+
+    def __init__(self, responder: Callable[[str, Dict], Dict[str, Any]], polls_until_ended: int = 1):
+        self.messages = SimpleNamespace(batches=FakeMessageBatches(responder, polls_until_ended))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Backfill invoice PDFs through the Message Batches API")
+    parser.add_argument("source", help="Directory (searched recursively) or glob pattern of PDFs")
+    parser.add_argument("--batch-size", type=int, default=50, help="Documents per classify/insert batch")
+    parser.add_argument("--poll-interval", type=float, default=60.0, help="Seconds between status polls")
+    parser.add_argument("--timeout", type=float, help="Give up waiting for a batch after this many seconds")
+    parser.add_argument("--secrets", default=str(DEFAULT_SECRETS_PATH), help="Path to secrets.toml")
+    parser.add_argument("--mongodb-uri", help="Overrides mongodb_uri from secrets")
+    parser.add_argument("--database", help="Overrides database_name from secrets")
+    parser.add_argument("--no-cache", action="store_true", help="Ignore and don't fill the extraction cache")
+    parser.add_argument("--fx-rates", help="Daily FX rate CSV for total_amount_base (overrides fx_rates_path)")
+    parser.add_argument(
+        "--no-templates",
+        action="store_true",
+        help="Don't use local extraction templates for known merchant layouts"
+    )
+    args = parser.parse_args()
+
+    paths = resolve_pdf_paths(args.source)
+    if not paths:
+        raise SystemExit(f"No PDFs found for {args.source}")
+
+    settings = load_settings(args)
+    client, pool_metrics = create_client(settings["mongodb_uri"], settings.get("mongodb_pool"))
+    db = client[settings["database_name"]]
+    claude = anthropic.Client(api_key=settings["anthropic_api_key"])
+    from merchant_classifier import MultilingualMerchantClassifier
+
+    merchant_classifier = MultilingualMerchantClassifier(db=db, **embedding_options(settings))
+    cache = None if args.no_cache else ExtractionCache(db.extraction_cache)
+    fx_table = None
+    if settings.get("fx_rates_path"):
+        fx_table = load_fx_table(settings["fx_rates_path"], settings.get("base_currency", DEFAULT_BASE_CURRENCY))
+
+    print(f"Submitting {len(paths)} PDFs as message batches")
+    stats = run_batch_extraction(
+        paths, db, claude, merchant_classifier, cache,
+        batch_size=args.batch_size,
+        poll_interval=args.poll_interval,
+        timeout=args.timeout,
+        fx_table=fx_table,
+        templates=None if args.no_templates else TemplateExtractor(db[TEMPLATE_COLLECTION])
+    )
+
+    print_run_summary(stats, db.name, [f"Batches:    {', '.join(stats['batches']) or '-'}"])
+
+    print(f"MongoDB connections: {pool_metrics.stats()}")
+    merchant_classifier.close()
+    client.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,169 @@
+#!/usr/bin/env python3
+"""
+Benchmark receipt date range queries with string vs BSON datetime dates.
+
+Loads the same synthetic receipts into two scratch collections:
+
+- "string": date stored as an ISO string with the old indexes (merchant_id,
+  category); range filters convert every candidate row with $dateFromString
+- "datetime": date stored as a BSON datetime with the (merchant_id, date) and
+  (category, date) compound indexes from schema.py
+
+and times "one merchant, one month" and "one category, one month" queries on
+both. Documents examined per query are taken from explain.
+
+Usage:
+    python benchmark_date_queries.py --mongodb-uri "mongodb+srv://..." --database invoice_processor
+"""
+
+from datetime import datetime, timedelta
+import argparse
+import random
+import statistics
+import time
+
+from bson import ObjectId
+from pymongo import MongoClient
+
+import query_plans
+
+CATEGORIES = ["transport", "food", "telecom", "groceries", "utilities", "shopping", "travel", "health"]
+
+
+def make_receipts(count: int, merchants: int, days: int, seed: int) -> list:
+    """Synthetic receipts spread uniformly over `days` days from 2025-01-01."""
+    rng = random.Random(seed)
+    merchant_ids = [ObjectId() for _ in range(merchants)]
+    start = datetime(2025, 1, 1)
+    receipts = []
+    for _ in range(count):
+        day = start + timedelta(days=rng.randrange(days))
+        receipts.append({
+            "merchant_id": rng.choice(merchant_ids),
+            "category": rng.choice(CATEGORIES),
+            "date": day,
+            "total_amount": round(rng.uniform(2, 300), 2),
+        })
+    return receipts
+
+
+def load_collections(db, receipts: list) -> dict:
+    """(Re)create the two scratch collections. Returns {variant: collection}."""
+    string_coll = db.benchmark_dates_string
+    datetime_coll = db.benchmark_dates_datetime
+    for coll in (string_coll, datetime_coll):
+        coll.drop()
+
+    string_coll.insert_many(
+        [{**r, "date": r["date"].strftime("%Y-%m-%d")} for r in receipts], ordered=False
+    )
+    string_coll.create_index("merchant_id")
+    string_coll.create_index("category")
+
+    datetime_coll.insert_many([dict(r) for r in receipts], ordered=False)
+    datetime_coll.create_index([("merchant_id", 1), ("date", 1)])
+    datetime_coll.create_index([("category", 1), ("date", 1)])
+
+    return {"string": string_coll, "datetime": datetime_coll}
+
+
+def range_filter(variant: str, field: str, value, start: datetime, end: datetime) -> dict:
+    """$match for field == value and start <= date < end, as each variant has to write it."""
+    if variant == "datetime":
+        return {field: value, "date": {"$gte": start, "$lt": end}}
+    as_date = {"$dateFromString": {"dateString": "$date"}}
+    return {
+        field: value,
+        "$expr": {"$and": [{"$gte": [as_date, start]}, {"$lt": [as_date, end]}]}
+    }
+
+
+def docs_examined(coll, match: dict) -> int:
+    """totalDocsExamined for a $match + $count pipeline, from explain executionStats."""
+    explain = coll.database.command(
+        "explain",
+        {"aggregate": coll.name, "pipeline": [{"$match": match}, {"$count": "n"}], "cursor": {}},
+        verbosity="executionStats"
+    )
+    return query_plans.docs_examined(explain) or 0
+
+
+def run_queries(coll, variant: str, queries: list, warmup: int) -> dict:
+    """Time a sum-of-spend aggregation for every (field, value, start, end) query."""
+    def pipeline(query):
+        return [
+            {"$match": range_filter(variant, *query)},
+            {"$group": {"_id": None, "total": {"$sum": "$total_amount"}, "count": {"$sum": 1}}}
+        ]
+
+    for query in queries[:warmup]:
+        list(coll.aggregate(pipeline(query)))
+
+    latencies = []
+    for query in queries:
+        start = time.perf_counter()
+        list(coll.aggregate(pipeline(query)))
+        latencies.append((time.perf_counter() - start) * 1000)
+
+    latencies.sort()
+    return {
+        "p50_ms": statistics.median(latencies),
+        "p95_ms": latencies[int(0.95 * (len(latencies) - 1))],
+        "docs_examined": docs_examined(coll, range_filter(variant, *queries[0])),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark date range queries: string vs datetime dates")
+    parser.add_argument("--mongodb-uri", required=True, help="MongoDB connection string")
+    parser.add_argument("--database", default="invoice_processor", help="Database for the scratch collections")
+    parser.add_argument("--documents", type=int, default=100000, help="Synthetic receipts to load")
+    parser.add_argument("--merchants", type=int, default=200, help="Distinct merchants")
+    parser.add_argument("--days", type=int, default=730, help="Days the receipts are spread over")
+    parser.add_argument("--queries", type=int, default=100, help="Timed queries per variant and shape")
+    parser.add_argument("--warmup", type=int, default=10, help="Untimed warm-up queries")
+    parser.add_argument("--seed", type=int, default=42, help="Random seed")
+    parser.add_argument("--keep", action="store_true", help="Keep the scratch collections afterwards")
+    args = parser.parse_args()
+
+    client = MongoClient(args.mongodb_uri)
+    db = client[args.database]
+
+    receipts = make_receipts(args.documents, args.merchants, args.days, args.seed)
+    print(f"Loading {len(receipts)} receipts into both variants...")
+    collections = load_collections(db, receipts)
+
+    rng = random.Random(args.seed)
+    merchant_ids = list({r["merchant_id"] for r in receipts})
+    month_starts = sorted({datetime(r["date"].year, r["date"].month, 1) for r in receipts})
+
+    def month_query(field, values):
+        start = rng.choice(month_starts)
+        end = datetime(start.year + start.month // 12, start.month % 12 + 1, 1)
+        return (field, rng.choice(values), start, end)
+
+    shapes = {
+        "merchant + month": [month_query("merchant_id", merchant_ids) for _ in range(args.queries)],
+        "category + month": [month_query("category", CATEGORIES) for _ in range(args.queries)],
+    }
+
+    print("=" * 76)
+    print(f"{'query':<20}{'dates':<10}{'p50 ms':>12}{'p95 ms':>12}{'docs examined':>18}")
+    print("-" * 76)
+    for shape, queries in shapes.items():
+        for variant, coll in collections.items():
+            stats = run_queries(coll, variant, queries, args.warmup)
+            print(
+                f"{shape:<20}{variant:<10}{stats['p50_ms']:>12.2f}"
+                f"{stats['p95_ms']:>12.2f}{stats['docs_examined']:>18}"
+            )
+    print("-" * 76)
+
+    if not args.keep:
+        for coll in collections.values():
+            coll.drop()
+    client.close()
+
+
+if __name__ == "__main__":
+    main()
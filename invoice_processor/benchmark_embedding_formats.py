@@ -0,0 +1,182 @@
+#!/usr/bin/env python3
+"""
+Benchmark merchant_embedding storage formats: recall against size.
+
+Builds a synthetic merchant corpus shaped like sentence embeddings (a
+low-rank signal with a decaying spectrum, merchants grouped into brand
+families of close neighbours), stores it with every EmbeddingCodec
+configuration and runs the same noisy "name variant" queries against each:
+
+- index bytes: BSON size of the indexed merchant_embedding field
+- doc bytes: BSON size of every embedding field written (binary adds an
+  int8 rescore copy, see embedding_codec.RESCORE_FIELD)
+- recall@1 / recall@10: overlap with exact float search at full dimension
+- top-1 acc: the query's own merchant ranked first
+- "index" columns rank by what the Atlas index compares (Hamming distance
+  for binary); "rescored" columns re-rank the top --rescore-candidates hits
+  by cosine against the full-precision query, as AtlasVectorSearchBackend
+  does for int8 and binary (binary against its int8 copy)
+
+Truncation ("trunc") only preserves quality for Matryoshka-trained models;
+on this synthetic corpus information is spread across all dimensions, so it
+mostly shows the floor. Runs locally; no MongoDB or embedding model needed.
+
+Usage:
+    python benchmark_embedding_formats.py --merchants 5000 --queries 500
+"""
+
+from typing import Dict, List, Optional
+import argparse
+
+import bson
+import numpy as np
+
+from embedding_codec import EmbeddingCodec, fit_pca
+
+
+def make_corpus(merchants: int, dimensions: int, rank: int, family_size: int, seed: int) -> np.ndarray:
+    """L2-normalized synthetic merchant embeddings, family_size near neighbours per brand."""
+    rng = np.random.default_rng(seed)
+    basis, _ = np.linalg.qr(rng.normal(size=(dimensions, rank)))
+    spectrum = 1.0 / np.sqrt(1.0 + np.arange(rank))
+    families = rng.normal(size=(merchants // family_size + 1, rank)) * spectrum
+    latent = np.repeat(families, family_size, axis=0)[:merchants]
+    latent += 0.5 * rng.normal(size=latent.shape) * spectrum
+    vectors = latent @ basis.T + 0.02 * rng.normal(size=(merchants, dimensions))
+    return (vectors / np.linalg.norm(vectors, axis=1, keepdims=True)).astype(np.float32)
+
+
+def make_queries(corpus: np.ndarray, count: int, noise: float, seed: int) -> tuple:
+    """Perturbed copies of random merchants. Returns (queries, true merchant rows)."""
+    rng = np.random.default_rng(seed + 1)
+    rows = rng.integers(0, len(corpus), size=count)
+    queries = corpus[rows] + noise * rng.normal(size=(count, corpus.shape[1])) / np.sqrt(corpus.shape[1])
+    return queries.astype(np.float32), rows
+
+
+def top_k(scores: np.ndarray, k: int) -> np.ndarray:
+    """Row indexes of the k highest scores per query, best first."""
+    candidates = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+    order = np.argsort(-np.take_along_axis(scores, candidates, axis=1), axis=1)
+    return np.take_along_axis(candidates, order, axis=1)
+
+
+def recall(found: np.ndarray, expected: np.ndarray) -> float:
+    """Mean fraction of expected ids present in found, per query."""
+    return float(np.mean([
+        len(set(f) & set(e)) / len(e) for f, e in zip(found, expected)
+    ]))
+
+
+def evaluate(
+    codec: EmbeddingCodec,
+    corpus: np.ndarray,
+    queries: np.ndarray,
+    exact: np.ndarray,
+    true_rows: np.ndarray,
+    rescore_candidates: int
+) -> Dict[str, float]:
+    """Store corpus with codec, search queries, compare with exact float results."""
+    stored = [codec.stored_fields(vector) for vector in corpus]
+    decoded = np.stack([codec.decode(fields["merchant_embedding"]) for fields in stored])
+    rescore_vectors = np.stack([codec.decode(codec.stored_vector(fields)) for fields in stored])
+    reduced_queries = np.stack([codec.reduce(query) for query in queries])
+
+    if codec.format == "binary":
+        # Atlas binarizes the query and ranks by Hamming distance
+        bits = (decoded > 0)
+        query_bits = (reduced_queries > 0)
+        index_scores = query_bits.astype(np.float32) @ bits.T + (~query_bits).astype(np.float32) @ (~bits).T
+    else:
+        index_scores = reduced_queries @ decoded.T
+
+    k = exact.shape[1]
+    index_hits = top_k(index_scores, max(k, rescore_candidates))
+    result = {
+        "index_bytes": float(np.mean([
+            len(bson.encode({"merchant_embedding": fields["merchant_embedding"]})) for fields in stored[:100]
+        ])),
+        "doc_bytes": float(np.mean([len(bson.encode(fields)) for fields in stored[:100]])),
+        "recall@1": recall(index_hits[:, :1], exact[:, :1]),
+        "recall@10": recall(index_hits[:, :k], exact),
+        "top1": float(np.mean(index_hits[:, 0] == true_rows)),
+    }
+
+    if codec.rescores:
+        candidates = index_hits[:, :rescore_candidates]
+        rescored = np.einsum("qd,qcd->qc", reduced_queries, rescore_vectors[candidates])
+        order = np.argsort(-rescored, axis=1)
+        reranked = np.take_along_axis(candidates, order, axis=1)
+        result["rescored@1"] = recall(reranked[:, :1], exact[:, :1])
+        result["rescored_top1"] = float(np.mean(reranked[:, 0] == true_rows))
+    return result
+
+
+def build_codecs(dimensions: int, reduced: List[int], projection_corpus: np.ndarray) -> Dict[str, EmbeddingCodec]:
+    """Every format at full dimension, plus truncated and PCA-reduced variants."""
+    codecs = {
+        f"float {dimensions}": EmbeddingCodec("float"),
+        f"float32 {dimensions}": EmbeddingCodec("float32"),
+        f"int8 {dimensions}": EmbeddingCodec("int8"),
+        f"binary {dimensions}": EmbeddingCodec("binary"),
+    }
+    for size in reduced:
+        projection = fit_pca(projection_corpus, size)
+        codecs[f"float32 {size} trunc"] = EmbeddingCodec("float32", dimensions=size)
+        codecs[f"float32 {size} pca"] = EmbeddingCodec("float32", dimensions=size, projection=projection)
+        codecs[f"int8 {size} pca"] = EmbeddingCodec("int8", dimensions=size, projection=projection)
+        if size % 8 == 0:
+            codecs[f"binary {size} pca"] = EmbeddingCodec("binary", dimensions=size, projection=projection)
+    return codecs
+
+
+def format_rate(value: Optional[float]) -> str:
+    return f"{value:>10.3f}" if value is not None else f"{'-':>10}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark merchant embedding formats: recall vs size")
+    parser.add_argument("--merchants", type=int, default=5000, help="Synthetic merchants")
+    parser.add_argument("--dimensions", type=int, default=768, help="Model embedding dimension")
+    parser.add_argument("--rank", type=int, default=96, help="Latent rank of the synthetic embeddings")
+    parser.add_argument("--family-size", type=int, default=4, help="Merchants per brand family")
+    parser.add_argument("--queries", type=int, default=500, help="Noisy queries")
+    parser.add_argument("--noise", type=float, default=1.5, help="Query noise (relative to a unit vector)")
+    parser.add_argument(
+        "--reduced-dimensions",
+        type=int,
+        nargs="*",
+        default=[256, 128],
+        help="Reduced dimensions to test with truncation and PCA"
+    )
+    parser.add_argument("--rescore-candidates", type=int, default=10, help="Hits re-ranked for int8/binary")
+    parser.add_argument("--pca-sample", type=int, default=2000, help="Merchants used to fit PCA")
+    parser.add_argument("--seed", type=int, default=42, help="Random seed")
+    args = parser.parse_args()
+
+    corpus = make_corpus(args.merchants, args.dimensions, args.rank, args.family_size, args.seed)
+    queries, true_rows = make_queries(corpus, args.queries, args.noise, args.seed)
+    exact = top_k(queries @ corpus.T, 10)
+    codecs = build_codecs(args.dimensions, args.reduced_dimensions, corpus[:args.pca_sample])
+
+    print(f"{args.merchants} merchants, {args.queries} queries, {args.dimensions} dimensions")
+    print("=" * 116)
+    print(
+        f"{'format':<22}{'index bytes':>12}{'doc bytes':>11}{'vs float':>10}{'recall@1':>10}{'recall@10':>10}"
+        f"{'top-1 acc':>10}{'rescored@1':>12}{'rescored acc':>14}"
+    )
+    print("-" * 116)
+    baseline = None
+    for label, codec in codecs.items():
+        stats = evaluate(codec, corpus, queries, exact, true_rows, args.rescore_candidates)
+        baseline = baseline or stats["index_bytes"]
+        print(
+            f"{label:<22}{stats['index_bytes']:>12.0f}{stats['doc_bytes']:>11.0f}"
+            f"{baseline / stats['index_bytes']:>9.1f}x"
+            f"{format_rate(stats['recall@1'])}{format_rate(stats['recall@10'])}{format_rate(stats['top1'])}"
+            f"{format_rate(stats.get('rescored@1')):>12}{format_rate(stats.get('rescored_top1')):>14}"
+        )
+    print("-" * 116)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,150 @@
+#!/usr/bin/env python3
+"""
+Benchmark the merchant $vectorSearch query modes against an Atlas cluster.
+
+Compares the original "full" pipeline (projects merchant_embedding, unwinds and
+re-groups synonyms) with the "lean" pipeline (_id, canonical_name and score
+only). Query vectors are sampled from stored merchant embeddings with a little
+noise added, so the SentenceTransformer model is not needed. Bytes transferred
+are measured from the BSON size of every server reply via command monitoring.
+
+Pass --embedding-format when merchant_embedding is stored as a binary vector
+(see embedding_codec.py): sampled vectors are decoded with that codec and the
+backends encode queries (and rescore int8/binary hits) the same way the
+classifier does. Queries are built in the stored space, so a reduced
+dimension or PCA projection needs no extra flags.
+
+Usage:
+    python benchmark_vector_search.py --mongodb-uri "mongodb+srv://..." --database invoice_processor
+"""
+
+import argparse
+import statistics
+import time
+
+import bson
+import numpy as np
+from pymongo import MongoClient, monitoring
+
+from embedding_codec import EMBEDDING_FORMATS, RESCORE_FIELD, EmbeddingCodec
+from vector_backends import AtlasVectorSearchBackend
+
+
+class ReplySizeListener(monitoring.CommandListener):
+    """Accumulate the BSON size of replies to aggregate/getMore commands."""
+
+    def __init__(self):
+        self.bytes_received = 0
+
+    def started(self, event):
+        pass
+
+    def succeeded(self, event):
+        if event.command_name in ("aggregate", "getMore"):
+            self.bytes_received += len(bson.encode(event.reply))
+
+    def failed(self, event):
+        pass
+
+
+def sample_query_vectors(merchants, codec: EmbeddingCodec, count: int, noise: float, seed: int) -> list:
+    """Sample stored embeddings, decode them with codec and perturb them into query vectors."""
+    rng = np.random.default_rng(seed)
+    stored = [
+        codec.decode(codec.stored_vector(merchant))
+        for merchant in merchants.aggregate([
+            {"$match": {"merchant_embedding": {"$exists": True}}},
+            {"$sample": {"size": count}},
+            {"$project": {"merchant_embedding": 1, RESCORE_FIELD: 1}}
+        ])
+    ]
+    if not stored:
+        raise SystemExit("No merchants with merchant_embedding found - upload some documents first")
+
+    vectors = []
+    for i in range(count):
+        base = stored[i % len(stored)]
+        # Decoded vectors are unit length: scale noise so its norm is about `noise`
+        vectors.append((base + rng.normal(0, noise / np.sqrt(base.size), base.shape)).tolist())
+    return vectors
+
+
+def run_mode(backend: AtlasVectorSearchBackend, listener: ReplySizeListener, vectors: list, warmup: int) -> dict:
+    """Time every query for one backend configuration."""
+    for vector in vectors[:warmup]:
+        backend.search(vector, limit=1)
+
+    listener.bytes_received = 0
+    latencies = []
+    top_hits = []
+    for vector in vectors:
+        start = time.perf_counter()
+        results = backend.search(vector, limit=1)
+        latencies.append((time.perf_counter() - start) * 1000)
+        top_hits.append(results[0][0]["_id"] if results else None)
+
+    latencies.sort()
+    return {
+        "p50_ms": statistics.median(latencies),
+        "p95_ms": latencies[int(0.95 * (len(latencies) - 1))],
+        "mean_ms": statistics.mean(latencies),
+        "bytes_per_query": listener.bytes_received / len(vectors),
+        "top_hits": top_hits,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark lean vs full $vectorSearch pipelines")
+    parser.add_argument("--mongodb-uri", required=True, help="Atlas connection string")
+    parser.add_argument("--database", default="invoice_processor", help="Database name")
+    parser.add_argument("--queries", type=int, default=200, help="Number of timed queries per mode")
+    parser.add_argument("--warmup", type=int, default=20, help="Untimed warm-up queries per mode")
+    parser.add_argument("--num-candidates", type=int, default=100, help="numCandidates for both modes")
+    parser.add_argument("--noise", type=float, default=0.3, help="Norm of the noise added to sampled unit vectors")
+    parser.add_argument("--seed", type=int, default=42, help="Random seed")
+    parser.add_argument(
+        "--embedding-format",
+        choices=EMBEDDING_FORMATS,
+        default="float",
+        help="How merchant_embedding is stored (the classifier's embedding_format)"
+    )
+    args = parser.parse_args()
+
+    listener = ReplySizeListener()
+    client = MongoClient(args.mongodb_uri, event_listeners=[listener])
+    merchants = client[args.database].merchants
+
+    # Sampled vectors are already reduced, so the codec only re-quantizes them
+    codec = EmbeddingCodec(args.embedding_format)
+    vectors = sample_query_vectors(merchants, codec, args.queries, args.noise, args.seed)
+
+    results = {}
+    for mode in ("full", "lean"):
+        backend = AtlasVectorSearchBackend(
+            merchants,
+            mode=mode,
+            num_candidates=args.num_candidates,
+            codec=codec
+        )
+        results[mode] = run_mode(backend, listener, vectors, args.warmup)
+
+    agreement = sum(
+        full == lean for full, lean in zip(results["full"]["top_hits"], results["lean"]["top_hits"])
+    ) / len(vectors)
+
+    print("=" * 72)
+    print(f"{'mode':<8}{'p50 ms':>12}{'p95 ms':>12}{'mean ms':>12}{'bytes/query':>16}")
+    print("-" * 72)
+    for mode, stats in results.items():
+        print(
+            f"{mode:<8}{stats['p50_ms']:>12.2f}{stats['p95_ms']:>12.2f}"
+            f"{stats['mean_ms']:>12.2f}{stats['bytes_per_query']:>16.0f}"
+        )
+    print("-" * 72)
+    print(f"Top-1 agreement between modes: {agreement:.1%} over {len(vectors)} queries")
+
+    client.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+from typing import Any, Callable, Dict, Optional
+import threading
+
+# Events after which the change stream is invalidated and ends without an error
+RELOAD_OPERATIONS = ("drop", "rename", "dropDatabase", "invalidate")
+
+
+class CollectionRefresher:
+    """
+    Keeps an in-process copy of a collection fresh from a background thread.
+
+    Used by SynonymIndex and LocalVectorIndex. start() opens a change stream,
+    runs load() and then applies insert/update/replace events with apply(full
+    document) and deletes with remove(_id). When the stream is invalidated
+    (the collection was dropped or renamed) a new stream is opened and load()
+    runs again, so the copy keeps following the collection. Where change
+    streams are unavailable (standalone mongod, mongomock), or a stream fails,
+    poll() runs every poll_interval seconds instead (load() by default).
+    """
+
+    def __init__(
+        self,
+        collection,
+        load: Callable[[], None],
+        apply: Callable[[Dict], None],
+        remove: Optional[Callable[[Any], None]] = None,
+        poll: Optional[Callable[[], None]] = None,
+        poll_interval: float = 30.0,
+        name: str = "collection-refresher"
+    ):
+        self.collection = collection
+        self.load = load
+        self.apply = apply
+        self.remove = remove
+        self.poll = poll or load
+        self.poll_interval = poll_interval
+        self.name = name
+        self.mode: Optional[str] = None  # "change_stream" or "polling" once started
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._stream = None
+
+    def start(self) -> "CollectionRefresher":
+        """
+        Open the change stream, load and start the background thread.
+
+        The stream is opened before the load, so a write landing in between is
+        replayed from the stream instead of being lost until that document
+        changes again (apply must therefore be idempotent).
+        """
+        try:
+            self._stream = self._watch()
+            self.mode = "change_stream"
+            target = self._follow_change_stream
+        except Exception as e:
+            print(f"{self.name}: change streams unavailable, polling every {self.poll_interval}s: {e}")
+            self.mode = "polling"
+            target = self._poll
+        self.load()
+        self._thread = threading.Thread(target=target, name=self.name, daemon=True)
+        self._thread.start()
+        return self
+
+    def close(self) -> None:
+        """Stop the background thread."""
+        self._stop.set()
+        if self._stream is not None:
+            self._stream.close()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+
+    def _watch(self):
+        return self.collection.watch(full_document="updateLookup")
+
+    def _follow_change_stream(self) -> None:
+        try:
+            while not self._stop.is_set():
+                for change in self._stream:
+                    operation = change["operationType"]
+                    if operation in ("insert", "update", "replace") and change.get("fullDocument"):
+                        self.apply(change["fullDocument"])
+                    elif operation == "delete" and self.remove is not None:
+                        self.remove(change["documentKey"]["_id"])
+                    elif operation in RELOAD_OPERATIONS:
+                        break
+                if self._stop.is_set():
+                    return
+                # Invalidated (or ended): follow the collection with a new stream
+                self._stream.close()
+                self._stream = self._watch()
+                self.load()
+        except Exception as e:
+            if not self._stop.is_set():
+                print(f"{self.name}: change stream stopped, falling back to polling: {e}")
+                self.mode = "polling"
+                self._poll()
+
+    def _poll(self) -> None:
+        while not self._stop.wait(self.poll_interval):
+            try:
+                self.poll()
+            except Exception as e:
+                print(f"{self.name}: error refreshing: {e}")
@@ -0,0 +1,51 @@
+from typing import Any, Dict, List, Optional
+from datetime import datetime
+
+from dates import parse_document_date
+from fx_rates import FxRateTable
+from merchant_keys import merchant_keys
+
+
+def build_document(
+    metadata: Dict[str, Any],
+    source_filename: str,
+    merchant_result: Optional[Dict] = None,
+    merchant_synonyms: Optional[List[str]] = None,
+    fx_table: Optional[FxRateTable] = None
+) -> Dict[str, Any]:
+    """
+    Build the documents-collection record for extracted metadata.
+
+    The extracted date is stored as a BSON datetime (the original text is
+    kept in date_text) so range queries use the (merchant_id, date) and
+    (category, date) indexes. With an fx_table, total_amount_base (in
+    fx_table.base_currency) is added so cross-currency totals are a plain $sum.
+    Shared by the app and the ingest CLIs.
+    """
+    metadata = dict(metadata)
+    if merchant_result is not None:
+        # Update metadata with merchant details
+        metadata["merchant_id"] = merchant_result["merchant_id"]
+        metadata["merchant_name"] = merchant_result["canonical_name"]
+        metadata["merchant_synonyms"] = merchant_synonyms or []
+
+    if metadata.get("merchant_name"):
+        # Indexed match keys so queries don't need a $lookup into merchants
+        metadata["merchant_keys"] = merchant_keys(
+            metadata["merchant_name"], metadata.get("merchant_synonyms")
+        )
+
+    if isinstance(metadata.get("date"), str):
+        parsed = parse_document_date(metadata["date"])
+        if parsed is not None:
+            metadata["date_text"] = metadata["date"]
+            metadata["date"] = parsed
+
+    if fx_table is not None:
+        metadata.update(fx_table.normalize(metadata))
+
+    return {
+        **metadata,
+        "processed_date": datetime.utcnow(),
+        "source_filename": source_filename
+    }
@@ -0,0 +1,151 @@
+from typing import Dict, List, Optional, Union
+from collections import OrderedDict
+import sqlite3
+import threading
+import unicodedata
+
+import numpy as np
+
+
+def normalize_text(text: str) -> str:
+    """Normalize a merchant name for cache lookups (NFC, collapsed whitespace)."""
+    return " ".join(unicodedata.normalize("NFC", text).split())
+
+
+def cache_namespace(model_name: str, backend: str = "torch", file_name: Optional[str] = None) -> str:
+    """
+    Cache namespace for a model variant.
+
+    ONNX and quantized exports produce slightly different vectors than the
+    torch model, so each (model_name, backend, file_name) gets its own entries.
+    The torch default keeps the bare model name used by existing cache files.
+    """
+    if backend == "torch" and not file_name:
+        return model_name
+    return f"{model_name}|{backend}|{file_name or ''}"
+
+
+class EmbeddingCache:
+    """
+    Size-bounded LRU cache of sentence embeddings keyed by (model variant, normalized text).
+
+    Sits in front of SentenceTransformer.encode so recurring merchant names are
+    only encoded once. When a path is given, entries are also written through to
+    a local SQLite file so the cache survives restarts; the in-memory LRU still
+    bounds how many vectors are held in RAM. Pass the model's backend and
+    file_name so a shared SQLite file never mixes vectors of different
+    variants (see cache_namespace).
+    """
+
+    def __init__(
+        self,
+        model_name: str,
+        maxsize: int = 10000,
+        path: Optional[str] = None,
+        backend: str = "torch",
+        file_name: Optional[str] = None
+    ):
+        self.model_name = model_name
+        self.namespace = cache_namespace(model_name, backend, file_name)
+        self.maxsize = maxsize
+        self.path = path
+        self.hits = 0
+        self.misses = 0
+        self._entries: "OrderedDict[str, np.ndarray]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._conn = None
+
+        if path:
+            self._conn = sqlite3.connect(path, check_same_thread=False)
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS embeddings ("
+                "model_name TEXT NOT NULL, "
+                "text TEXT NOT NULL, "
+                "vector BLOB NOT NULL, "
+                "PRIMARY KEY (model_name, text))"
+            )
+            self._conn.commit()
+
+    def get(self, text: str) -> Optional[np.ndarray]:
+        """Return the cached embedding for text, or None (counts a hit or miss)."""
+        key = normalize_text(text)
+        with self._lock:
+            vector = self._entries.get(key)
+            if vector is None and self._conn is not None:
+                row = self._conn.execute(
+                    "SELECT vector FROM embeddings WHERE model_name = ? AND text = ?",
+                    (self.namespace, key)
+                ).fetchone()
+                if row:
+                    vector = np.frombuffer(row[0], dtype=np.float32)
+                    self._remember(key, vector)
+            if vector is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return vector
+
+    def put(self, text: str, vector: np.ndarray) -> None:
+        """Store an embedding for text."""
+        key = normalize_text(text)
+        vector = np.asarray(vector, dtype=np.float32).copy()
+        vector.setflags(write=False)
+        with self._lock:
+            self._remember(key, vector)
+            if self._conn is not None:
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO embeddings (model_name, text, vector) VALUES (?, ?, ?)",
+                    (self.namespace, key, vector.tobytes())
+                )
+                self._conn.commit()
+
+    def encode(self, model, texts: Union[str, List[str]]) -> np.ndarray:
+        """
+        Encode one text or a list of texts through the cache.
+
+        Cache misses are encoded with a single batched model.encode call. Returns a
+        1-D vector for a single string and a 2-D array for a list, like encode does.
+        """
+        if isinstance(texts, str):
+            return self.encode(model, [texts])[0]
+
+        vectors: List[Optional[np.ndarray]] = [self.get(text) for text in texts]
+        missing = [i for i, vector in enumerate(vectors) if vector is None]
+        if missing:
+            # Only encode each distinct normalized text once per batch
+            pending: Dict[str, List[int]] = {}
+            for i in missing:
+                pending.setdefault(normalize_text(texts[i]), []).append(i)
+            encoded = model.encode([texts[indexes[0]] for indexes in pending.values()])
+            for indexes, vector in zip(pending.values(), encoded):
+                self.put(texts[indexes[0]], vector)
+                for i in indexes:
+                    vectors[i] = vector
+
+        if not vectors:
+            return np.empty((0, 0), dtype=np.float32)
+        return np.vstack(vectors)
+
+    def stats(self) -> Dict[str, int]:
+        """Return hit/miss counters and current in-memory size."""
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "size": len(self._entries),
+                "maxsize": self.maxsize,
+            }
+
+    def clear(self) -> None:
+        """Drop all in-memory entries and reset counters (the disk store is kept)."""
+        with self._lock:
+            self._entries.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def _remember(self, key: str, vector: np.ndarray) -> None:
+        self._entries[key] = vector
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
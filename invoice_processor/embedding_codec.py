@@ -0,0 +1,212 @@
+#!/usr/bin/env python3
+"""
+Storage formats for merchant_embedding.
+
+By default embeddings are stored as a BSON array of doubles (~13 bytes per
+dimension once element keys are counted). EmbeddingCodec can instead store
+them as BSON binary vectors, optionally after reducing their dimension:
+
+- format: "float" (BSON doubles, the original layout), "float32", "int8"
+  (scalar-quantized, 1 byte per dimension) or "binary" (sign bits packed
+  8 per byte, compared with euclidean/Hamming distance in Atlas)
+- dimensions: keep only this many dimensions, either the leading ones
+  (Matryoshka-style truncation) or, with a projection file, the top PCA
+  components fitted on existing embeddings
+
+Vectors are L2-normalized after reduction, so cosine similarity is preserved
+under int8 scaling. Quantized formats are approximate; AtlasVectorSearchBackend
+rescores their candidates against the full-precision query (see cosine()) so
+scores stay on the (1 + cosine) / 2 scale the classifier's thresholds use.
+
+A sign-bit vector is too coarse to rescore against: an identical name only
+reaches a cosine of about 0.8 with its own bits, which would push true
+matches below the 0.85 threshold. Binary merchants therefore also store an
+int8 copy in RESCORE_FIELD (not indexed), used for rescoring and by the
+local backends. stored_fields() returns every field to write.
+
+Fit a PCA projection from stored embeddings, or re-encode stored embeddings
+after changing the format:
+
+    python embedding_codec.py fit-pca --dimensions 256 --output models/merchant_pca_256.npz --mongodb-uri "..."
+    python embedding_codec.py migrate --format int8 --dimensions 256 --projection models/merchant_pca_256.npz --mongodb-uri "..."
+"""
+
+from typing import Any, Dict, List, Optional, Union
+import argparse
+
+import numpy as np
+from bson.binary import Binary, BinaryVectorDtype
+from pymongo import MongoClient, UpdateOne
+
+EMBEDDING_FORMATS = ("float", "float32", "int8", "binary")
+
+# Unindexed int8 copy kept next to binary merchant_embedding for rescoring
+RESCORE_FIELD = "merchant_embedding_rescore"
+
+# secrets.toml keys -> classifier keyword arguments of the same name
+EMBEDDING_SETTINGS = ("embedding_format", "embedding_dimensions", "embedding_projection_path")
+
+
+def embedding_options(settings) -> Dict[str, Any]:
+    """Classifier keyword arguments for the embedding_* keys present in settings."""
+    return {key: settings.get(key) for key in EMBEDDING_SETTINGS if settings.get(key)}
+
+
+def fit_pca(vectors: np.ndarray, dimensions: int) -> Dict[str, np.ndarray]:
+    """Fit a PCA projection (mean and top components) on row vectors."""
+    vectors = np.asarray(vectors, dtype=np.float32)
+    if dimensions > min(vectors.shape):
+        raise ValueError(f"Need at least {dimensions} vectors to fit {dimensions} PCA components")
+    mean = vectors.mean(axis=0)
+    _, _, vt = np.linalg.svd(vectors - mean, full_matrices=False)
+    return {"mean": mean, "components": vt[:dimensions].astype(np.float32)}
+
+
+def save_projection(path: str, projection: Dict[str, np.ndarray]) -> None:
+    np.savez(path, mean=projection["mean"], components=projection["components"])
+
+
+def load_projection(path: str) -> Dict[str, np.ndarray]:
+    with np.load(path) as data:
+        return {"mean": data["mean"], "components": data["components"]}
+
+
+class EmbeddingCodec:
+    """Reduces, quantizes and (de)serializes merchant embeddings for one storage format."""
+
+    def __init__(
+        self,
+        format: str = "float",
+        dimensions: Optional[int] = None,
+        projection: Optional[Union[str, Dict[str, np.ndarray]]] = None
+    ):
+        if format not in EMBEDDING_FORMATS:
+            raise ValueError(f"Unknown embedding format '{format}', expected one of {EMBEDDING_FORMATS}")
+        if isinstance(projection, str):
+            projection = load_projection(projection)
+        if projection is not None:
+            dimensions = dimensions or projection["components"].shape[0]
+            if dimensions > projection["components"].shape[0]:
+                raise ValueError(f"Projection has fewer than {dimensions} components")
+        if format == "binary" and dimensions and dimensions % 8:
+            raise ValueError("Binary embeddings need a dimension that is a multiple of 8")
+
+        self.format = format
+        self.dimensions = dimensions
+        self.projection = projection
+
+    @property
+    def similarity(self) -> str:
+        """Atlas vector index similarity for this format."""
+        return "euclidean" if self.format == "binary" else "cosine"
+
+    @property
+    def rescores(self) -> bool:
+        """True if search scores should be recomputed against the full-precision query."""
+        return self.format in ("int8", "binary")
+
+    def index_dimensions(self, model_dimensions: int) -> int:
+        """numDimensions for the Atlas vector index."""
+        return self.dimensions or model_dimensions
+
+    def reduce(self, vector) -> np.ndarray:
+        """Project/truncate to the stored dimension and L2-normalize (float32)."""
+        vector = np.asarray(vector, dtype=np.float32)
+        if self.projection is not None:
+            vector = (vector - self.projection["mean"]) @ self.projection["components"][:self.dimensions].T
+        elif self.dimensions:
+            vector = vector[:self.dimensions]
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm > 0 else vector
+
+    def encode(self, vector) -> Union[List[float], Binary]:
+        """Stored (and $vectorSearch query) representation of a model embedding."""
+        reduced = self.reduce(vector)
+        if self.format == "float":
+            return reduced.tolist()
+        if self.format == "float32":
+            return Binary.from_vector(reduced.tolist(), BinaryVectorDtype.FLOAT32)
+        if self.format == "int8":
+            scale = np.abs(reduced).max() or 1.0
+            quantized = np.round(reduced / scale * 127).astype(np.int8)
+            return Binary.from_vector(quantized.tolist(), BinaryVectorDtype.INT8)
+        packed = np.packbits(reduced > 0)
+        return Binary.from_vector(packed.tolist(), BinaryVectorDtype.PACKED_BIT)
+
+    def stored_fields(self, vector) -> Dict[str, Any]:
+        """Fields to $set on a merchant for a model embedding (plus RESCORE_FIELD for binary)."""
+        fields = {"merchant_embedding": self.encode(vector)}
+        if self.format == "binary":
+            fields[RESCORE_FIELD] = EmbeddingCodec("int8", self.dimensions, self.projection).encode(vector)
+        return fields
+
+    def stored_vector(self, merchant: Dict) -> Any:
+        """Most precise stored representation on a merchant document (the int8 copy for binary)."""
+        if self.format == "binary" and merchant.get(RESCORE_FIELD) is not None:
+            return merchant[RESCORE_FIELD]
+        return merchant.get("merchant_embedding")
+
+    def decode(self, value: Any) -> np.ndarray:
+        """Stored value (any format) -> normalized float32 vector; binary bits become +/-1."""
+        if isinstance(value, Binary) and value.subtype == 9:
+            binary_vector = value.as_vector()
+            data = np.asarray(binary_vector.data)
+            if binary_vector.dtype == BinaryVectorDtype.PACKED_BIT:
+                vector = np.unpackbits(data.astype(np.uint8)).astype(np.float32) * 2 - 1
+            else:
+                vector = data.astype(np.float32)
+        else:
+            vector = np.asarray(value, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm > 0 else vector
+
+    def cosine(self, query_vector, value: Any) -> float:
+        """Cosine between a model embedding (reduced here) and a stored value."""
+        return float(self.reduce(query_vector) @ self.decode(value))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fit projections and re-encode stored merchant embeddings")
+    parser.add_argument("--mongodb-uri", required=True, help="MongoDB connection string")
+    parser.add_argument("--database", default="invoice_processor", help="Database name")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    fit = subparsers.add_parser("fit-pca", help="Fit a PCA projection on stored float embeddings")
+    fit.add_argument("--dimensions", type=int, required=True, help="Components to keep")
+    fit.add_argument("--output", required=True, help="Where to write the .npz projection")
+
+    migrate = subparsers.add_parser("migrate", help="Re-encode merchant_embedding in a new format")
+    migrate.add_argument("--format", choices=EMBEDDING_FORMATS, required=True)
+    migrate.add_argument("--dimensions", type=int, help="Reduced dimension (truncation without --projection)")
+    migrate.add_argument("--projection", help="PCA projection .npz from fit-pca")
+    args = parser.parse_args()
+
+    client = MongoClient(args.mongodb_uri)
+    merchants = client[args.database].merchants
+    rows = list(merchants.find({"merchant_embedding": {"$exists": True}}, {"merchant_embedding": 1}))
+    full_precision = [row for row in rows if isinstance(row["merchant_embedding"], list)]
+    if len(full_precision) < len(rows):
+        print(f"{len(rows) - len(full_precision)} embeddings are already binary vectors and are left as is")
+
+    if args.command == "fit-pca":
+        vectors = np.asarray([row["merchant_embedding"] for row in full_precision], dtype=np.float32)
+        save_projection(args.output, fit_pca(vectors, args.dimensions))
+        print(f"Fitted {args.dimensions} components on {len(vectors)} embeddings -> {args.output}")
+    else:
+        codec = EmbeddingCodec(args.format, args.dimensions, args.projection)
+        updates = []
+        for row in full_precision:
+            update = {"$set": codec.stored_fields(row["merchant_embedding"])}
+            if RESCORE_FIELD not in update["$set"]:
+                update["$unset"] = {RESCORE_FIELD: ""}
+            updates.append(UpdateOne({"_id": row["_id"]}, update))
+        if updates:
+            merchants.bulk_write(updates, ordered=False)
+        print(f"Re-encoded {len(updates)} embeddings as {args.format} ({codec.dimensions or 'full'} dimensions)")
+        print("Restart the app (or run schema.py with the same settings) to rebuild the vector index")
+
+    client.close()
+
+
+if __name__ == "__main__":
+    main()
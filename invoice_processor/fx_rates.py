@@ -0,0 +1,175 @@
+#!/usr/bin/env python3
+"""
+Daily FX rates for normalizing receipt amounts into one base currency.
+
+Rates are read from a local CSV file with one row per day and currency:
+
+    date,currency,rate
+    2025-01-02,USD,1.3612
+    2025-01-02,MYR,0.3034
+
+where rate is the number of base-currency units per one unit of currency.
+The base currency itself needs no rows. Documents get total_amount_base
+(and base_currency / fx_rate) at write time, using the rate for the receipt
+date or the closest earlier day (weekends and holidays have no fixing).
+
+To fill total_amount_base on documents saved before a rate file was configured:
+
+    python fx_rates.py fx_rates.csv --mongodb-uri "mongodb+srv://..." --database invoice_processor
+"""
+
+from typing import Any, Dict, List, Optional, Tuple
+from bisect import bisect_right
+from datetime import datetime
+from pathlib import Path
+import argparse
+import csv
+import threading
+
+from pymongo import MongoClient, UpdateOne
+
+from dates import rollup_day
+
+DEFAULT_BASE_CURRENCY = "SGD"
+
+# Free-form currency strings the extraction model returns -> ISO 4217 codes
+CURRENCY_ALIASES = {
+    "S$": "SGD",
+    "SG$": "SGD",
+    "US$": "USD",
+    "RM": "MYR",
+    "€": "EUR",
+    "£": "GBP",
+    "¥": "JPY",
+    "RMB": "CNY",
+    "元": "CNY",
+    "HK$": "HKD",
+    "A$": "AUD",
+}
+
+_tables: Dict[Tuple[str, str, float], "FxRateTable"] = {}
+_lock = threading.Lock()
+
+
+def normalize_currency(value: Optional[str]) -> Optional[str]:
+    """Map a free-form currency string to an ISO code (best effort)."""
+    if not value:
+        return None
+    value = value.strip()
+    return CURRENCY_ALIASES.get(value, CURRENCY_ALIASES.get(value.upper(), value.upper()))
+
+
+class FxRateTable:
+    """In-memory daily rates per currency, searched by date with bisect."""
+
+    def __init__(self, base_currency: str = DEFAULT_BASE_CURRENCY):
+        self.base_currency = base_currency.upper()
+        self._dates: Dict[str, List[datetime]] = {}
+        self._rates: Dict[str, List[float]] = {}
+
+    @classmethod
+    def from_csv(cls, path: str, base_currency: str = DEFAULT_BASE_CURRENCY) -> "FxRateTable":
+        """Load a date,currency,rate CSV file."""
+        rows: Dict[str, List[Tuple[datetime, float]]] = {}
+        with open(path, newline="") as f:
+            for row in csv.DictReader(f):
+                day = rollup_day(row["date"])
+                currency = normalize_currency(row["currency"])
+                if day is None or not currency:
+                    continue
+                rows.setdefault(currency, []).append((day, float(row["rate"])))
+
+        table = cls(base_currency)
+        for currency, entries in rows.items():
+            entries.sort()
+            table._dates[currency] = [day for day, _ in entries]
+            table._rates[currency] = [rate for _, rate in entries]
+        return table
+
+    def currencies(self) -> List[str]:
+        return sorted(self._dates)
+
+    def rate(self, currency: Optional[str], date=None) -> Optional[float]:
+        """
+        Base units per one unit of currency on date (latest rate if no date).
+
+        Returns None for unknown currencies or dates before the first rate.
+        """
+        currency = normalize_currency(currency)
+        if currency == self.base_currency:
+            return 1.0
+        dates = self._dates.get(currency)
+        if not dates:
+            return None
+
+        day = rollup_day(date)
+        if day is None:
+            return self._rates[currency][-1]
+        i = bisect_right(dates, day)
+        return self._rates[currency][i - 1] if i else None
+
+    def normalize(self, doc: Dict[str, Any]) -> Dict[str, Any]:
+        """Return the total_amount_base fields for doc ({} if it can't be converted)."""
+        amount = doc.get("total_amount")
+        if not isinstance(amount, (int, float)):
+            return {}
+        rate = self.rate(doc.get("currency"), doc.get("date"))
+        if rate is None:
+            return {}
+        return {
+            "total_amount_base": round(amount * rate, 4),
+            "base_currency": self.base_currency,
+            "fx_rate": rate
+        }
+
+
+def load_fx_table(path: str, base_currency: str = DEFAULT_BASE_CURRENCY) -> FxRateTable:
+    """Load a rate file once per process; reloaded only when the file changes."""
+    key = (str(Path(path).resolve()), base_currency.upper(), Path(path).stat().st_mtime)
+    with _lock:
+        table = _tables.get(key)
+        if table is None:
+            table = FxRateTable.from_csv(path, base_currency)
+            _tables[key] = table
+        return table
+
+
+def backfill_base_amounts(db, fx_table: FxRateTable, batch_size: int = 1000) -> int:
+    """Set total_amount_base on documents that don't have it yet. Returns documents updated."""
+    updated = 0
+    updates = []
+    for doc in db.documents.find(
+        {"total_amount_base": {"$exists": False}},
+        {"total_amount": 1, "currency": 1, "date": 1}
+    ):
+        fields = fx_table.normalize(doc)
+        if fields:
+            updates.append(UpdateOne({"_id": doc["_id"]}, {"$set": fields}))
+        if len(updates) >= batch_size:
+            updated += db.documents.bulk_write(updates, ordered=False).modified_count
+            updates = []
+    if updates:
+        updated += db.documents.bulk_write(updates, ordered=False).modified_count
+    return updated
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Backfill total_amount_base from a daily FX rate file")
+    parser.add_argument("rates", help="CSV file with date,currency,rate rows")
+    parser.add_argument("--base-currency", default=DEFAULT_BASE_CURRENCY, help="Currency the rates convert into")
+    parser.add_argument("--mongodb-uri", required=True, help="MongoDB connection string")
+    parser.add_argument("--database", default="invoice_processor", help="Database name")
+    args = parser.parse_args()
+
+    fx_table = load_fx_table(args.rates, args.base_currency)
+    print(f"Loaded rates for {', '.join(fx_table.currencies()) or 'no currencies'} -> {fx_table.base_currency}")
+
+    client = MongoClient(args.mongodb_uri)
+    db = client[args.database]
+    print(f"Updated {backfill_base_amounts(db, fx_table)} documents")
+    print("Run rollups.py to rebuild merchant_spend_daily with base-currency totals")
+    client.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,373 @@
+#!/usr/bin/env python3
+"""
+Headless bulk ingestion of invoice/receipt PDFs.
+
+Extracts metadata from every PDF in a directory or glob with bounded
+concurrency, classifies merchants in batches and writes documents with
+insert_many, then reports throughput:
+
+    python ingest.py receipts/ --concurrency 8 --batch-size 50
+    python ingest.py "archive/2025-*/**/*.pdf"
+
+Connection settings are read from .streamlit/secrets.toml (same keys as the
+app) unless given on the command line; ANTHROPIC_API_KEY is also honoured.
+"""
+
+from typing import TYPE_CHECKING, Any, Dict, List, Optional, Tuple
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from pathlib import Path
+import argparse
+import glob
+import os
+import time
+
+import anthropic
+from pymongo.errors import BulkWriteError
+
+from documents import build_document
+from embedding_codec import embedding_options
+from extraction_cache import DiskExtractionCache, ExtractionCache
+from fx_rates import DEFAULT_BASE_CURRENCY, FxRateTable, load_fx_table
+from invoice_extraction import EXTRACTION_SCHEMA_VERSION, extract_metadata_with_claude
+from invoice_templates import TEMPLATE_COLLECTION, TemplateExtractor
+from mongo_pool import create_client
+from pdf_preprocess import PdfPreprocessor
+from rollups import update_spend_rollups
+
+if TYPE_CHECKING:
+    # Imported in main(): loading it pulls in sentence-transformers, which
+    # write_batch / run_batch_extraction and their tests don't need
+    from merchant_classifier import MultilingualMerchantClassifier
+
+try:
+    import tomllib
+except ImportError:  # Python < 3.11
+    tomllib = None
+
+DEFAULT_SECRETS_PATH = Path(__file__).parent / ".streamlit" / "secrets.toml"
+CLASSIFY_LANGUAGES = ["en", "zh", "my"]
+
+
+def resolve_pdf_paths(source: str) -> List[Path]:
+    """Expand a directory (recursively) or glob pattern into a sorted list of PDFs."""
+    path = Path(source)
+    if path.is_dir():
+        return sorted(p for p in path.rglob("*") if p.suffix.lower() == ".pdf")
+    if path.is_file():
+        return [path]
+    return sorted(Path(p) for p in glob.glob(source, recursive=True) if p.lower().endswith(".pdf"))
+
+
+def load_settings(args: argparse.Namespace) -> Dict[str, str]:
+    """Merge command-line flags over .streamlit/secrets.toml."""
+    settings: Dict[str, str] = {}
+    secrets_path = Path(args.secrets)
+    if secrets_path.exists() and tomllib is not None:
+        with open(secrets_path, "rb") as f:
+            settings.update(tomllib.load(f))
+
+    if args.mongodb_uri:
+        settings["mongodb_uri"] = args.mongodb_uri
+    if args.database:
+        settings["database_name"] = args.database
+    if getattr(args, "fx_rates", None):
+        settings["fx_rates_path"] = args.fx_rates
+    if not settings.get("anthropic_api_key") and os.environ.get("ANTHROPIC_API_KEY"):
+        settings["anthropic_api_key"] = os.environ["ANTHROPIC_API_KEY"]
+
+    missing = [key for key in ("mongodb_uri", "database_name", "anthropic_api_key") if not settings.get(key)]
+    if missing:
+        raise SystemExit(f"Missing settings: {', '.join(missing)} (pass flags or fill {secrets_path})")
+    return settings
+
+
+def print_run_summary(
+    stats: Dict[str, Any],
+    database_name: str,
+    extra_lines: Optional[List[str]] = None
+) -> None:
+    """Print the end-of-run report shared by the ingest and batch extraction CLIs."""
+    print("=" * 60)
+    print(f"Files:      {stats['files']}")
+    print(f"Written:    {stats['written']}")
+    print(f"Failed:     {stats['failed']}")
+    print(f"Elapsed:    {stats['elapsed_seconds']:.1f}s")
+    print(f"Throughput: {stats['docs_per_second']:.2f} docs/sec")
+    for line in extra_lines or []:
+        print(line)
+    for path, error in stats["failures"]:
+        print(f"  FAILED {path}: {error}")
+    if stats["rollup_errors"]:
+        print(
+            f"Spend rollups failed for {len(stats['rollup_errors'])} batches (documents were stored; "
+            f"do not re-run those files). Rebuild with: "
+            f"python rollups.py --mongodb-uri ... --database {database_name}"
+        )
+
+
+def extract_file(
+    claude: anthropic.Client,
+    path: Path,
+    cache: Optional[ExtractionCache] = None,
+    preprocessor: Optional[PdfPreprocessor] = None,
+    templates: Optional[TemplateExtractor] = None
+) -> Tuple[Dict[str, Any], Optional[Dict[str, Any]]]:
+    """
+    Read one PDF and extract its metadata.
+
+    Known merchant layouts are extracted locally by templates. With a
+    preprocessor, the remaining uncached PDFs are page-trimmed in its process
+    pool first. Returns (metadata, preprocessing report or None).
+    """
+    pdf_bytes = path.read_bytes()
+    if preprocessor is None:
+        return extract_metadata_with_claude(claude, pdf_bytes, cache=cache, templates=templates), None
+
+    if cache is not None:
+        cached = cache.get(pdf_bytes, EXTRACTION_SCHEMA_VERSION)
+        if cached is not None:
+            return cached, None
+
+    if templates is not None:
+        metadata = templates.extract(pdf_bytes)
+        if metadata is not None:
+            return metadata, None
+
+    report = preprocessor.submit(pdf_bytes).result()
+    metadata = extract_metadata_with_claude(
+        claude, pdf_bytes, cache=cache,
+        send_bytes=report["pdf_bytes"], pages=report["pages"], cache_checked=True
+    )
+    return metadata, {key: value for key, value in report.items() if key != "pdf_bytes"}
+
+
+def write_batch(
+    db,
+    merchant_classifier: "MultilingualMerchantClassifier",
+    claude: anthropic.Client,
+    batch: List[Tuple[Path, Dict[str, Any]]],
+    fx_table: Optional[FxRateTable] = None
+) -> Dict[str, Any]:
+    """
+    Classify merchants for a batch of extractions, insert them and update spend rollups.
+
+    Returns {"written", "failures", "rollup_error"}. Documents are counted as
+    written once insert_many stores them; failures lists only the (path,
+    error) pairs that were not stored. A rollup failure after the insert is
+    reported in rollup_error instead, since re-running those files would
+    store them twice (rebuild the rollups with rollups.py).
+    """
+    if not batch:
+        return {"written": 0, "failures": [], "rollup_error": None}
+
+    # Template extractions already carry their merchant_id; only classify the rest
+    named = [
+        (path, metadata) for path, metadata in batch
+        if "merchant_name" in metadata and "merchant_id" not in metadata
+    ]
+    merchant_results = merchant_classifier.classify_merchants(
+        [metadata["merchant_name"] for _, metadata in named],
+        claude,
+        languages=CLASSIFY_LANGUAGES
+    )
+    by_path = {path: result for (path, _), result in zip(named, merchant_results)}
+    for path, metadata in batch:
+        if "merchant_id" in metadata:
+            result = {"merchant_id": metadata["merchant_id"], "canonical_name": metadata["merchant_name"]}
+            by_path[path] = result
+            merchant_results.append(result)
+    synonyms = merchant_classifier.get_synonyms_by_name(
+        list({result["canonical_name"] for result in merchant_results})
+    )
+
+    docs = []
+    for path, metadata in batch:
+        merchant_result = by_path.get(path)
+        docs.append(build_document(
+            metadata,
+            path.name,
+            merchant_result,
+            synonyms.get(merchant_result["canonical_name"]) if merchant_result else None,
+            fx_table
+        ))
+
+    failures: List[Tuple[str, str]] = []
+    try:
+        stored = docs
+        written = len(db.documents.insert_many(docs, ordered=False).inserted_ids)
+    except BulkWriteError as e:
+        # Unordered: every document without a write error was stored
+        errors = {error["index"]: error.get("errmsg", str(error)) for error in e.details.get("writeErrors", [])}
+        stored = [doc for i, doc in enumerate(docs) if i not in errors]
+        written = e.details.get("nInserted", len(stored))
+        failures = [(str(batch[i][0]), message) for i, message in sorted(errors.items())]
+
+    rollup_error = None
+    try:
+        update_spend_rollups(db, stored)
+    except Exception as e:
+        rollup_error = str(e)
+        print(f"Error updating spend rollups for {len(stored)} stored documents: {e}")
+    return {"written": written, "failures": failures, "rollup_error": rollup_error}
+
+
+def ingest(
+    paths: List[Path],
+    db,
+    claude: anthropic.Client,
+    merchant_classifier: "MultilingualMerchantClassifier",
+    concurrency: int = 4,
+    batch_size: int = 50,
+    cache: Optional[ExtractionCache] = None,
+    fx_table: Optional[FxRateTable] = None,
+    preprocessor: Optional[PdfPreprocessor] = None,
+    templates: Optional[TemplateExtractor] = None
+) -> Dict[str, Any]:
+    """Extract, classify and store every PDF in paths. Returns run statistics."""
+    start = time.perf_counter()
+    written = 0
+    failures: List[Tuple[str, str]] = []
+    rollup_errors: List[str] = []
+    trimmed = bytes_saved = tokens_saved = 0
+    batch: List[Tuple[Path, Dict[str, Any]]] = []
+
+    def flush(pending: List[Tuple[Path, Dict[str, Any]]]) -> int:
+        try:
+            result = write_batch(db, merchant_classifier, claude, pending, fx_table)
+        except Exception as e:
+            print(f"Error writing batch of {len(pending)}: {e}")
+            failures.extend((str(path), str(e)) for path, _ in pending)
+            return 0
+        failures.extend(result["failures"])
+        if result["rollup_error"] is not None:
+            rollup_errors.append(result["rollup_error"])
+        return result["written"]
+
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        futures = {
+            executor.submit(extract_file, claude, path, cache, preprocessor, templates): path
+            for path in paths
+        }
+        for future in as_completed(futures):
+            path = futures[future]
+            try:
+                metadata, report = future.result()
+                batch.append((path, metadata))
+                if report and report["mode"] == "trimmed":
+                    trimmed += 1
+                    bytes_saved += report["bytes_saved"]
+                    tokens_saved += report["est_tokens_saved"]
+                    print(
+                        f"Extracted {path} (sent pages {[i + 1 for i in report['pages']]} "
+                        f"of {report['page_count']}, {report['bytes_saved'] / 1024:.0f} KB and "
+                        f"~{report['est_tokens_saved']} tokens saved)"
+                    )
+                else:
+                    print(f"Extracted {path}")
+            except Exception as e:
+                failures.append((str(path), str(e)))
+                print(f"Error extracting {path}: {e}")
+
+            if len(batch) >= batch_size:
+                written += flush(batch)
+                batch = []
+
+    written += flush(batch)
+
+    elapsed = time.perf_counter() - start
+    return {
+        "files": len(paths),
+        "written": written,
+        "failed": len(failures),
+        "failures": failures,
+        "rollup_errors": rollup_errors,
+        "trimmed": trimmed,
+        "bytes_saved": bytes_saved,
+        "est_tokens_saved": tokens_saved,
+        "elapsed_seconds": elapsed,
+        "docs_per_second": written / elapsed if elapsed > 0 else 0.0,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Bulk-ingest invoice/receipt PDFs into MongoDB")
+    parser.add_argument("source", help="Directory (searched recursively) or glob pattern of PDFs")
+    parser.add_argument("--concurrency", type=int, default=4, help="Concurrent extraction requests")
+    parser.add_argument("--batch-size", type=int, default=50, help="Documents per classify/insert batch")
+    parser.add_argument("--secrets", default=str(DEFAULT_SECRETS_PATH), help="Path to secrets.toml")
+    parser.add_argument("--mongodb-uri", help="Overrides mongodb_uri from secrets")
+    parser.add_argument("--database", help="Overrides database_name from secrets")
+    parser.add_argument(
+        "--cache-dir",
+        help="Cache extractions as JSON files here instead of the extraction_cache collection"
+    )
+    parser.add_argument("--no-cache", action="store_true", help="Always call the extraction API")
+    parser.add_argument("--fx-rates", help="Daily FX rate CSV for total_amount_base (overrides fx_rates_path)")
+    parser.add_argument(
+        "--trim-pages",
+        type=int,
+        default=2,
+        help="Send at most this many text-layer-selected pages per PDF (0 sends whole PDFs)"
+    )
+    parser.add_argument("--preprocess-workers", type=int, help="Processes for PDF page selection")
+    parser.add_argument(
+        "--no-templates",
+        action="store_true",
+        help="Don't use local extraction templates for known merchant layouts"
+    )
+    args = parser.parse_args()
+
+    paths = resolve_pdf_paths(args.source)
+    if not paths:
+        raise SystemExit(f"No PDFs found for {args.source}")
+
+    settings = load_settings(args)
+    client, pool_metrics = create_client(settings["mongodb_uri"], settings.get("mongodb_pool"))
+    db = client[settings["database_name"]]
+    claude = anthropic.Client(api_key=settings["anthropic_api_key"])
+    from merchant_classifier import MultilingualMerchantClassifier
+
+    merchant_classifier = MultilingualMerchantClassifier(db=db, **embedding_options(settings))
+
+    cache = None
+    if not args.no_cache:
+        cache = DiskExtractionCache(args.cache_dir) if args.cache_dir else ExtractionCache(db.extraction_cache)
+
+    fx_table = None
+    if settings.get("fx_rates_path"):
+        fx_table = load_fx_table(settings["fx_rates_path"], settings.get("base_currency", DEFAULT_BASE_CURRENCY))
+
+    print(f"Ingesting {len(paths)} PDFs with concurrency {args.concurrency}")
+    templates = None if args.no_templates else TemplateExtractor(db[TEMPLATE_COLLECTION])
+
+    preprocessor = None
+    if args.trim_pages > 0:
+        preprocessor = PdfPreprocessor(args.preprocess_workers, max_pages=args.trim_pages)
+    try:
+        stats = ingest(
+            paths, db, claude, merchant_classifier, args.concurrency, args.batch_size, cache,
+            fx_table, preprocessor, templates
+        )
+    finally:
+        if preprocessor is not None:
+            preprocessor.close()
+
+    extra_lines = []
+    if stats["trimmed"]:
+        extra_lines.append(
+            f"Trimmed:    {stats['trimmed']} PDFs, {stats['bytes_saved'] / 1024 / 1024:.1f} MB "
+            f"and ~{stats['est_tokens_saved']} input tokens saved"
+        )
+    if cache is not None:
+        extra_lines.append(f"Extraction cache: {cache.stats()}")
+    if templates is not None:
+        extra_lines.append(f"Local templates: {templates.stats()}")
+    print_run_summary(stats, db.name, extra_lines)
+
+    print(f"MongoDB connections: {pool_metrics.stats()}")
+    merchant_classifier.close()
+    client.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,197 @@
+"""
+Invoice metadata extraction with Claude PDF vision and structured outputs.
+
+Shared by the Streamlit app and the headless ingest CLI.
+"""
+
+from typing import Any, Dict, List, Optional
+import base64
+
+import anthropic
+
+from extraction_cache import ExtractionCache, schema_version_for
+
+
+# Tool definition for Claude structured outputs
+INVOICE_EXTRACTION_TOOL = {
+    "name": "extract_invoice_metadata",
+    "description": "Extract structured metadata from an invoice or receipt document",
+    "input_schema": {
+        "type": "object",
+        "properties": {
+            "merchant_name": {
+                "type": "string",
+                "description": "The business or merchant name"
+            },
+            "date": {
+                "type": "string",
+                "description": "The transaction or document date in ISO 8601 format (YYYY-MM-DD)"
+            },
+            "total_amount": {
+                "type": "number",
+                "description": "The total amount of the transaction"
+            },
+            "currency": {
+                "type": "string",
+                "description": "The currency code (e.g., USD, SGD, EUR)"
+            },
+            "category": {
+                "type": "string",
+                "enum": ["receipt", "invoice", "statement", "bill", "other"],
+                "description": "The type of document"
+            },
+            "payment_method": {
+                "type": "string",
+                "description": "The payment method if mentioned (e.g., credit_card, cash, debit)"
+            },
+            "items": {
+                "type": "array",
+                "description": "Array of items/services mentioned with prices",
+                "items": {
+                    "type": "object",
+                    "properties": {
+                        "description": {"type": "string"},
+                        "quantity": {"type": "number"},
+                        "unit_price": {"type": "number"},
+                        "total": {"type": "number"}
+                    },
+                    "required": ["description"]
+                }
+            }
+        },
+        "required": ["merchant_name", "total_amount", "currency"]
+    }
+}
+
+
+EXTRACTION_MODEL = "claude-sonnet-4-5-20250929"
+EXTRACTION_PROMPT = "Extract all invoice/receipt metadata from this document. Include merchant name, date, amounts, items, and payment details."
+
+# Changes whenever the tool schema, model or prompt changes, invalidating cached extractions
+EXTRACTION_SCHEMA_VERSION = schema_version_for(INVOICE_EXTRACTION_TOOL, EXTRACTION_MODEL, EXTRACTION_PROMPT)
+
+
+def extraction_version(pages: Optional[List[int]] = None) -> str:
+    """
+    Cache version for an extraction of the given pages (None for the whole PDF).
+
+    An extraction from a page-trimmed copy only saw those pages, so it is
+    cached apart from whole-document extractions instead of standing in for one.
+    """
+    if pages is None:
+        return EXTRACTION_SCHEMA_VERSION
+    return f"{EXTRACTION_SCHEMA_VERSION}:pages={','.join(str(i) for i in pages)}"
+
+
+def build_extraction_params(pdf_bytes: bytes) -> Dict[str, Any]:
+    """Build the messages.create parameters for extracting one PDF."""
+    # Encode PDF as base64 for vision API
+    pdf_base64 = base64.standard_b64encode(pdf_bytes).decode("utf-8")
+
+    return {
+        "model": EXTRACTION_MODEL,
+        "max_tokens": 1024,
+        "tools": [INVOICE_EXTRACTION_TOOL],
+        "tool_choice": {"type": "tool", "name": "extract_invoice_metadata"},
+        "messages": [
+            {
+                "role": "user",
+                "content": [
+                    {
+                        "type": "document",
+                        "source": {
+                            "type": "base64",
+                            "media_type": "application/pdf",
+                            "data": pdf_base64
+                        }
+                    },
+                    {
+                        "type": "text",
+                        "text": EXTRACTION_PROMPT
+                    }
+                ]
+            }
+        ]
+    }
+
+
+def parse_extraction_message(message) -> Dict[str, Any]:
+    """Return the extract_invoice_metadata tool input from a Claude message."""
+    # With tool_choice forcing the tool, the response is guaranteed to be
+    # valid JSON matching our schema - no parsing/cleanup needed
+    for block in message.content:
+        if block.type == "tool_use":
+            return block.input
+
+    raise ValueError("Claude did not return tool use response")
+
+
+def has_required_fields(metadata: Dict[str, Any]) -> bool:
+    """True if every required field of the extraction schema has a value."""
+    return all(
+        metadata.get(field) not in (None, "")
+        for field in INVOICE_EXTRACTION_TOOL["input_schema"]["required"]
+    )
+
+
+def extract_metadata_with_claude(
+    claude: anthropic.Client,
+    pdf_bytes: bytes,
+    cache: Optional[ExtractionCache] = None,
+    send_bytes: Optional[bytes] = None,
+    templates=None,
+    pages: Optional[List[int]] = None,
+    cache_checked: bool = False
+) -> Dict[str, Any]:
+    """
+    Extract metadata from PDF using Claude's vision capability and structured outputs.
+
+    Uses PDF vision to preserve document layout (tables, formatting) and tool use
+    for guaranteed valid JSON output matching the schema. With a cache, results
+    are looked up by SHA-256 of pdf_bytes first, so a PDF is only sent once.
+    Pass cache_checked=True when the caller has already looked pdf_bytes up
+    (e.g. before preprocessing) so the lookup isn't repeated.
+
+    send_bytes is a page-trimmed copy of pdf_bytes (see pdf_preprocess.py) to
+    send instead, holding the pdf_bytes page indexes in pages; if the trimmed
+    extraction misses a required field, the whole document is sent. Trimmed
+    extractions are cached under extraction_version(pages), so they are only
+    reused for the same page selection, never as whole-document results.
+
+    templates is an optional invoice_templates.TemplateExtractor: PDFs from
+    merchants with a known layout are read from their text layer locally and
+    only fall back to Claude below its confidence gate.
+    """
+    trimmed = send_bytes is not None and send_bytes != pdf_bytes
+    # Version the result is cached under; None for a trimmed send of unknown pages
+    version = EXTRACTION_SCHEMA_VERSION
+    if trimmed:
+        version = extraction_version(pages) if pages is not None else None
+
+    if cache is not None:
+        # A whole-document extraction is preferred over one of the same pages
+        lookups = [] if cache_checked else [EXTRACTION_SCHEMA_VERSION]
+        if version not in (None, EXTRACTION_SCHEMA_VERSION):
+            lookups.append(version)
+        for lookup in lookups:
+            cached = cache.get(pdf_bytes, lookup)
+            if cached is not None:
+                return cached
+
+    if templates is not None:
+        metadata = templates.extract(pdf_bytes)
+        if metadata is not None:
+            return metadata
+
+    message = claude.messages.create(**build_extraction_params(send_bytes if trimmed else pdf_bytes))
+    metadata = parse_extraction_message(message)
+
+    if trimmed and not has_required_fields(metadata):
+        print("Trimmed PDF missed required fields, retrying with the full document")
+        message = claude.messages.create(**build_extraction_params(pdf_bytes))
+        metadata = parse_extraction_message(message)
+        version = EXTRACTION_SCHEMA_VERSION
+
+    if cache is not None and version is not None:
+        cache.put(pdf_bytes, version, metadata)
+    return metadata
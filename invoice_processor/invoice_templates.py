@@ -0,0 +1,241 @@
+#!/usr/bin/env python3
+"""
+Local text-layer extraction for known merchant layouts.
+
+Digitally generated PDFs from high-volume merchants (telcos, utilities,
+ride hailing) have a clean text layer and a fixed layout, so their fields can
+be read with regular expressions instead of a vision call. Templates live in
+the extraction_templates collection with the merchant's merchant_id as _id:
+
+    {
+        "_id": ObjectId(merchant_id),
+        "canonical_name": "Singtel",
+        "identify": ["Singapore Telecommunications Limited", "Tax Invoice"],
+        "fields": {
+            "date": {"pattern": "Bill Date\\s*:?\\s*(\\d{1,2} \\w{3} \\d{4})"},
+            "total_amount": {"pattern": "Total Amount Due\\s*S?\\$\\s*([\\d,]+\\.\\d{2})"},
+            "currency": {"value": "SGD"},
+            "category": {"value": "bill"}
+        }
+    }
+
+A template applies when every "identify" pattern matches. Its result is only
+used if it reaches min_confidence: each field with a pattern must match
+exactly one distinct value, and every required field of the extraction tool
+schema must be filled. Anything else falls back to the LLM.
+
+    python invoice_templates.py --mongodb-uri "..." add --merchant "Singtel" singtel.json
+    python invoice_templates.py --mongodb-uri "..." test receipts/singtel-2025-01.pdf
+"""
+
+from typing import Any, Dict, List, Optional, Tuple
+import argparse
+import json
+import re
+import threading
+
+from pymongo import MongoClient
+
+from dates import parse_document_date
+from invoice_extraction import INVOICE_EXTRACTION_TOOL
+from pdf_preprocess import extract_page_texts, has_text_layer
+
+TEMPLATE_COLLECTION = "extraction_templates"
+
+
+def parse_amount(text: str) -> Optional[float]:
+    """Parse "1,234.50" / "1 234.50" style amounts."""
+    try:
+        return float(re.sub(r"[,\s]", "", text))
+    except ValueError:
+        return None
+
+
+def parse_field(name: str, raw: str) -> Any:
+    """Convert a matched string to the type INVOICE_EXTRACTION_TOOL expects for name."""
+    if name == "total_amount":
+        return parse_amount(raw)
+    if name == "date":
+        parsed = parse_document_date(raw)
+        return parsed.strftime("%Y-%m-%d") if parsed else None
+    return raw.strip()
+
+
+def compile_template(template: Dict) -> Dict:
+    """
+    Validate a template and compile its patterns.
+
+    Every field spec needs a "pattern" (a regex; its first group, or the whole
+    match, is the value) or a fixed "value". Raises ValueError naming the
+    offending field otherwise.
+    """
+    name = template.get("canonical_name", template.get("_id"))
+    identify = template.get("identify", [])
+    fields = template.get("fields", {})
+    if not isinstance(identify, list) or not all(isinstance(p, str) for p in identify):
+        raise ValueError(f"Template {name}: identify must be a list of patterns")
+    if not isinstance(fields, dict):
+        raise ValueError(f"Template {name}: fields must be an object of field specs")
+
+    compiled = {}
+    for field, spec in fields.items():
+        if not isinstance(spec, dict) or ("pattern" not in spec and "value" not in spec):
+            raise ValueError(f"Template {name}: field {field!r} needs a \"pattern\" or a \"value\", got {spec!r}")
+        if "value" in spec:
+            continue
+        try:
+            compiled[field] = re.compile(spec["pattern"], re.IGNORECASE | re.MULTILINE)
+        except (re.error, TypeError) as e:
+            raise ValueError(f"Template {name}: invalid pattern for field {field!r}: {e}") from e
+
+    try:
+        identify_patterns = [re.compile(p, re.IGNORECASE) for p in identify]
+    except re.error as e:
+        raise ValueError(f"Template {name}: invalid identify pattern: {e}") from e
+    return {**template, "_identify": identify_patterns, "_fields": compiled}
+
+
+class TemplateExtractor:
+    """
+    In-memory set of merchant layout templates with a confidence gate.
+
+    extract() returns INVOICE_EXTRACTION_TOOL-shaped metadata (plus the
+    template's merchant_id, so classification can be skipped) when exactly one
+    template identifies the document and its fields parse unambiguously;
+    otherwise None, and the caller should use the LLM.
+    """
+
+    def __init__(self, collection, min_confidence: float = 1.0):
+        self.collection = collection
+        self.min_confidence = min_confidence
+        self.hits = 0
+        self.fallbacks = 0
+        self._templates: List[Dict] = []
+        self._lock = threading.Lock()
+        self.load()
+
+    def load(self) -> None:
+        """(Re)load templates from the collection; invalid ones are skipped with an error."""
+        templates = []
+        for template in self.collection.find({}):
+            try:
+                templates.append(compile_template(template))
+            except ValueError as e:
+                print(f"Skipping extraction template {template['_id']}. {e}")
+        with self._lock:
+            self._templates = templates
+
+    def match(self, text: str) -> List[Dict]:
+        """Templates whose identify patterns all occur in text."""
+        with self._lock:
+            templates = list(self._templates)
+        return [
+            template for template in templates
+            if template["_identify"] and all(p.search(text) for p in template["_identify"])
+        ]
+
+    def apply(self, template: Dict, text: str) -> Tuple[Dict[str, Any], float]:
+        """Fill the extraction schema from one template. Returns (metadata, confidence)."""
+        metadata: Dict[str, Any] = {
+            "merchant_name": template["canonical_name"],
+            "merchant_id": template["_id"]
+        }
+        parsed = 0
+        expected = 0
+        for name, spec in template.get("fields", {}).items():
+            if "value" in spec:
+                metadata[name] = spec["value"]
+                continue
+            expected += 1
+            values = {parse_field(name, m.group(1) if m.groups() else m.group(0))
+                      for m in template["_fields"][name].finditer(text)}
+            values.discard(None)
+            # Ambiguous (several distinct values) counts as not found
+            if len(values) == 1:
+                metadata[name] = values.pop()
+                parsed += 1
+
+        required = INVOICE_EXTRACTION_TOOL["input_schema"]["required"]
+        if any(metadata.get(field) in (None, "") for field in required):
+            return metadata, 0.0
+        return metadata, parsed / expected if expected else 1.0
+
+    def extract(self, pdf_bytes: bytes) -> Optional[Dict[str, Any]]:
+        """Extract metadata locally, or None to fall back to the LLM."""
+        metadata = None
+        page_texts = extract_page_texts(pdf_bytes)
+        if page_texts and has_text_layer(page_texts):
+            text = "\n".join(page_texts)
+            matches = self.match(text)
+            if len(matches) == 1:
+                metadata, confidence = self.apply(matches[0], text)
+                if confidence < self.min_confidence:
+                    print(
+                        f"Template for {matches[0]['canonical_name']} below confidence gate "
+                        f"({confidence:.2f} < {self.min_confidence}), using the LLM"
+                    )
+                    metadata = None
+
+        with self._lock:
+            if metadata is None:
+                self.fallbacks += 1
+            else:
+                self.hits += 1
+        return metadata
+
+    def stats(self) -> Dict[str, int]:
+        return {"hits": self.hits, "fallbacks": self.fallbacks, "templates": len(self._templates)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Manage local extraction templates")
+    parser.add_argument("--mongodb-uri", required=True, help="MongoDB connection string")
+    parser.add_argument("--database", default="invoice_processor", help="Database name")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    add = subparsers.add_parser("add", help="Add or replace a merchant's template from a JSON file")
+    add.add_argument("template", help="JSON file with identify and fields")
+    add.add_argument("--merchant", required=True, help="Canonical merchant name (must exist in merchants)")
+
+    test = subparsers.add_parser("test", help="Run the templates against a PDF")
+    test.add_argument("pdf", help="PDF file")
+
+    subparsers.add_parser("list", help="List templates")
+    args = parser.parse_args()
+
+    client = MongoClient(args.mongodb_uri)
+    db = client[args.database]
+    collection = db[TEMPLATE_COLLECTION]
+
+    if args.command == "add":
+        merchant = db.merchants.find_one({"canonical_name": args.merchant}, {"canonical_name": 1})
+        if merchant is None:
+            raise SystemExit(f"No merchant named {args.merchant!r}")
+        with open(args.template) as f:
+            template = json.load(f)
+        template.update({"_id": merchant["_id"], "canonical_name": merchant["canonical_name"]})
+        try:
+            compile_template(template)
+        except ValueError as e:
+            raise SystemExit(str(e))
+        collection.replace_one({"_id": merchant["_id"]}, template, upsert=True)
+        print(f"Saved template for {merchant['canonical_name']} ({merchant['_id']})")
+    elif args.command == "test":
+        extractor = TemplateExtractor(collection)
+        with open(args.pdf, "rb") as f:
+            pdf_bytes = f.read()
+        text = "\n".join(extract_page_texts(pdf_bytes) or [])
+        for template in extractor.match(text):
+            metadata, confidence = extractor.apply(template, text)
+            print(f"{template['canonical_name']}: confidence {confidence:.2f}")
+            print(json.dumps(metadata, indent=2, ensure_ascii=False, default=str))
+        print(f"Result: {'local' if extractor.extract(pdf_bytes) else 'LLM fallback'}")
+    else:
+        for template in collection.find({}, {"canonical_name": 1, "identify": 1}):
+            print(f"{template['_id']}  {template['canonical_name']}  identify={template.get('identify')}")
+
+    client.close()
+
+
+if __name__ == "__main__":
+    main()
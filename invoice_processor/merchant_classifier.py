@@ -1,93 +1,296 @@
 from typing import Dict, List, Optional, Union, Any
 from datetime import datetime
-from pymongo import MongoClient
-from pymongo.operations import SearchIndexModel
-from sentence_transformers import SentenceTransformer
+from pymongo import MongoClient, ReturnDocument
+from pymongo.errors import DuplicateKeyError
 import numpy as np
 import json
-import time
+from concurrent.futures import ThreadPoolExecutor
+from embedding_cache import EmbeddingCache
+from embedding_codec import EmbeddingCodec
+from merchant_keys import add_merchant_key
+from model_registry import get_model
+from schema import ensure_schema
+from synonym_index import SynonymIndex
+from verdict_cache import VerdictCache
+from vector_backends import VectorSearchBackend, create_vector_backend
+
+
+def build_verification_prompt(
+    extracted_name: str,
+    closest_match: Optional[Dict],
+    languages: Optional[List[str]] = None
+) -> str:
+    """Build the LLM prompt asking whether extracted_name is a variation of the closest match."""
+    language_context = ""
+    if languages:
+        language_context = f"Consider that the names might be in any of these languages: {', '.join(languages)}. "
+
+    return f"""Analyze if '{extracted_name}' is a synonym or variation of '{closest_match["canonical_name"] if closest_match else "None"}' if one exists.
+        {language_context}Consider common variations, misspellings, and business name patterns.
+        Return JSON with these fields:
+        - is_new_merchant: boolean
+        - canonical_name: string (either existing or suggested new name)
+        - confidence: float (0-1)
+        - reasoning: string
+        """
+
+
+def parse_verification_response(response_text: str) -> Dict:
+    """Parse the LLM's JSON verdict, tolerating markdown code fences."""
+    # Get the response and clean it before parsing
+    response_text = response_text.strip()
+
+    # Remove markdown code blocks if present
+    if response_text.startswith('```json'):
+        response_text = response_text.split('```json')[1]
+    if response_text.startswith('```'):
+        response_text = response_text.split('```')[1]
+    if response_text.endswith('```'):
+        response_text = response_text.rsplit('```', 1)[0]
+    response_text = response_text.strip()
+
+    try:
+        return json.loads(response_text)
+    except json.JSONDecodeError as e:
+        # Print the response for debugging
+        print(f"Failed to parse JSON. Response was: {response_text}")
+        raise ValueError(f"Claude returned invalid JSON: {e}") from e
+
+
+# Shared by MultilingualMerchantClassifier and AsyncMultilingualMerchantClassifier:
+# the decisions and MongoDB documents of a classification, without the I/O.
+SYNONYM_SIMILARITY = 0.85  # Above this a vector match is taken as a synonym without asking the LLM
+VERIFICATION_MODEL = "claude-sonnet-4-5-20250929"
+
+
+def build_verification_request(
+    extracted_name: str,
+    closest_match: Optional[Dict],
+    languages: Optional[List[str]] = None
+) -> Dict[str, Any]:
+    """messages.create parameters for the LLM synonym verdict."""
+    return {
+        "model": VERIFICATION_MODEL,
+        "max_tokens": 1000,
+        "temperature": 0,
+        "messages": [
+            {
+                "role": "user",
+                "content": build_verification_prompt(extracted_name, closest_match, languages)
+            }
+        ]
+    }
+
+
+def candidate_name(closest_match: Optional[Dict]) -> Optional[str]:
+    """Canonical name the LLM is asked about (the verdict cache key)."""
+    return closest_match["canonical_name"] if closest_match else None
+
+
+def is_confirmed_synonym(analysis: Dict, closest_match: Optional[Dict]) -> bool:
+    """True if the LLM verdict makes extracted_name a synonym of closest_match."""
+    return not analysis["is_new_merchant"] and closest_match is not None
+
+
+def is_known_synonym(extracted_name: str, closest_match: Optional[Dict], similarity: float) -> bool:
+    """True for an exact synonym hit, which needs no write: the merchant already lists extracted_name."""
+    return (
+        similarity >= 1.0
+        and closest_match is not None
+        and extracted_name in closest_match.get("synonyms", [])
+    )
+
+
+def synonym_update(synonym: str, stored_fields: Optional[Dict] = None) -> Dict:
+    """Update adding synonym to a merchant, optionally storing its new embedding fields."""
+    return {
+        "$addToSet": {"synonyms": synonym},
+        "$set": {
+            **(stored_fields or {}),
+            "last_updated": datetime.utcnow()
+        }
+    }
+
+
+def is_new_synonym(synonym: str, previous: Optional[Dict]) -> bool:
+    """True if the merchant as it was before synonym_update did not have synonym yet."""
+    return previous is not None and synonym not in previous.get("synonyms", [])
+
+
+def new_merchant_document(name: str, stored_fields: Dict, languages: Optional[List[str]] = None) -> Dict:
+    """Merchant document for a name the LLM judged to be a new merchant."""
+    now = datetime.utcnow()
+    return {
+        "canonical_name": name,
+        "synonyms": [],
+        **stored_fields,
+        "metadata": {
+            "first_seen": now,
+            "last_updated": now,
+            "source": "pdf_extraction",
+            "languages": languages
+        }
+    }
+
+
+def classification(merchant_id, canonical_name: str, is_synonym: bool, confidence: float) -> Dict:
+    """Result returned by classify_merchant."""
+    return {
+        "merchant_id": merchant_id,
+        "canonical_name": canonical_name,
+        "is_synonym": is_synonym,
+        "confidence": confidence
+    }
+
 
 class MultilingualMerchantClassifier:
     def __init__(
         self,
-        mongodb_uri: str,
+        mongodb_uri: Optional[str] = None,
         db_name: str = "cathay",
-        model_name: str = "paraphrase-multilingual-mpnet-base-v2"
+        model_name: str = "paraphrase-multilingual-mpnet-base-v2",
+        embedding_cache_size: int = 10000,
+        embedding_cache_path: Optional[str] = None,
+        use_synonym_index: bool = True,
+        synonym_poll_interval: float = 30.0,
+        vector_backend: Union[str, VectorSearchBackend] = "atlas",
+        vector_search_options: Optional[Dict] = None,
+        verdict_ttl_seconds: Optional[float] = 30 * 24 * 3600,
+        model_backend: str = "torch",
+        model_file_name: Optional[str] = None,
+        ensure_indexes: bool = True,
+        client: Optional[MongoClient] = None,
+        db=None,
+        embedding_format: str = "float",
+        embedding_dimensions: Optional[int] = None,
+        embedding_projection_path: Optional[str] = None
     ):
         """
         Initialize with MongoDB Atlas connection and multilingual model.
         Using mpnet-base-v2 for superior multilingual support including Chinese.
+
+        Embeddings are memoized in a bounded LRU cache; pass embedding_cache_path
+        to persist them to a local SQLite file across restarts.
+
+        With use_synonym_index, exact synonym matches are served from an
+        in-process map kept fresh by a change stream (or by polling every
+        synonym_poll_interval seconds where change streams are unavailable).
+
+        vector_backend selects nearest-neighbour search: "atlas" ($vectorSearch,
+        the default), "local" / "local-hnsw" (in-process, for local or on-prem
+        MongoDB), or any VectorSearchBackend instance. vector_search_options are
+        passed to the backend, e.g. {"num_candidates": 50} or {"mode": "full"}
+        for Atlas.
+
+        LLM synonym verdicts are cached in the merchant_verdicts collection for
+        verdict_ttl_seconds (None disables the cache).
+
+        The model comes from the process-wide model_registry, so every
+        classifier in the process shares one instance. Set model_backend="onnx"
+        (and model_file_name for a quantized export) to serve it through ONNX.
+
+        ensure_indexes bootstraps the schema the first time a database is seen
+        in this process; pass False when `python schema.py` has already run.
+
+        Pass an existing client (or a db handle, which takes precedence over
+        db_name) to share its connection pool; the classifier then never closes
+        it. mongodb_uri is only used when neither is given.
+
+        embedding_format / embedding_dimensions / embedding_projection_path
+        choose how merchant_embedding is stored (see embedding_codec.py):
+        e.g. embedding_format="int8" with embedding_dimensions=256 stores
+        256 one-byte values instead of 768 BSON doubles. Existing embeddings
+        must be re-encoded with `python embedding_codec.py migrate`.
         """
-        self.client = MongoClient(mongodb_uri)
-        self.db = self.client[db_name]
+        if db is not None:
+            client = db.client
+        self._owns_client = client is None
+        if client is None:
+            if not mongodb_uri:
+                raise ValueError("Pass mongodb_uri, client or db")
+            client = MongoClient(mongodb_uri)
+        self.client = client
+        self.db = db if db is not None else self.client[db_name]
         # Separate collections for merchants and documents
         self.merchants = self.db.merchants
         self.documents = self.db.documents
 
-        # Load the model with retries
-        max_retries = 3
-        for attempt in range(max_retries):
-            try:
-                print(f"Loading model {model_name}, attempt {attempt + 1}")
-                self.model = SentenceTransformer(model_name)
-                print("Model loaded successfully")
-                break
-            except Exception as e:
-                print(f"Error loading model (attempt {attempt + 1}): {e}")
-                if attempt < max_retries - 1:
-                    time.sleep(1)  # Wait before retrying
-                else:
-                    raise
-
-        # Setup indexes
-        self._setup_indexes()
-
-    def _setup_indexes(self):
-        """Setup MongoDB Atlas Vector Search index and other indexes."""
-        search_index_model = SearchIndexModel(
-            definition = {
-                "fields": [
-                    {
-                        "type": "vector",
-                        "path": "merchant_embedding",
-                        "similarity": "cosine",
-                        "numDimensions": self.model.get_sentence_embedding_dimension(),
-                    }
-                ]
-            },
-            name="merchant_vector_index",
-            type="vectorSearch",
+        self.verdict_cache = None
+        if verdict_ttl_seconds:
+            self.verdict_cache = VerdictCache(self.db.merchant_verdicts, ttl_seconds=verdict_ttl_seconds)
+
+        self.model = get_model(model_name, backend=model_backend, file_name=model_file_name)
+
+        self.embedding_cache = EmbeddingCache(
+            model_name,
+            maxsize=embedding_cache_size,
+            path=embedding_cache_path,
+            backend=model_backend,
+            file_name=model_file_name
         )
 
-        try:
-            # Check if the search index exists
-            existing_indexes = self.merchants.list_search_indexes()
-            vector_index_exists = any(idx["name"] == "merchant_vector_index" for idx in existing_indexes)
+        self.embedding_codec = EmbeddingCodec(
+            embedding_format,
+            dimensions=embedding_dimensions,
+            projection=embedding_projection_path
+        )
 
-            if not vector_index_exists:
-                self.merchants.create_search_index(search_index_model)
-                print("Vector search index created successfully")
+        # A backend built here (e.g. a refreshing LocalVectorIndex) is closed by close()
+        self._owns_vector_backend = isinstance(vector_backend, str)
+        if isinstance(vector_backend, str):
+            vector_backend = create_vector_backend(
+                vector_backend,
+                self.merchants,
+                dimensions=self.model.get_sentence_embedding_dimension(),
+                codec=self.embedding_codec,
+                **(vector_search_options or {})
+            )
+        self.vector_backend = vector_backend
+
+        # Setup indexes once per database (see schema.py), not on every construction
+        if ensure_indexes:
+            ensure_schema(
+                self.db,
+                dimensions=self.embedding_codec.index_dimensions(
+                    self.model.get_sentence_embedding_dimension()
+                ),
+                similarity=self.embedding_codec.similarity,
+                vector_search=self.vector_backend.name == "atlas",
+                verdict_ttl_seconds=verdict_ttl_seconds
+            )
 
-            # Create regular indexes for merchants collection
-            self.merchants.create_index("canonical_name", unique=True)
-            self.merchants.create_index("synonyms")
+        self.synonym_index = None
+        if use_synonym_index:
+            self.synonym_index = SynonymIndex(
+                self.merchants,
+                poll_interval=synonym_poll_interval
+            ).start()
 
-            # Create indexes for documents collection
-            self.documents.create_index("merchant_id")  # Reference to merchant
-            self.documents.create_index("processed_date")
-            self.documents.create_index("merchant_name")  # For text search
-            print("All indexes created successfully")
+    def close(self) -> None:
+        """Stop the synonym index and vector index refreshers, and close the MongoDB client if this classifier opened it."""
+        if self.synonym_index is not None:
+            self.synonym_index.close()
+        if self._owns_vector_backend:
+            self.vector_backend.close()
+        if self._owns_client:
+            self.client.close()
 
-        except Exception as e:
-            print(f"Error creating indexes: {e}")
+    def encode(self, texts: Union[str, List[str]]) -> np.ndarray:
+        """Encode text(s) with the sentence model, going through the embedding cache."""
+        return self.embedding_cache.encode(self.model, texts)
 
     def find_closest_merchant(
         self,
         name: str,
-        threshold: float = 0.85
+        threshold: float = SYNONYM_SIMILARITY
     ) -> tuple[Optional[Dict], float]:
         """Find the most similar existing merchant using vector search and synonym lookup."""
-        # 1. First check exact match in synonyms
+        # 1. First check exact match in synonyms, in memory if the index is running
+        if self.synonym_index is not None:
+            exact_match = self.synonym_index.lookup(name)
+            if exact_match:
+                return exact_match, 1.0
+
         exact_match = self.merchants.find_one({
             "synonyms": name
         })
@@ -95,64 +298,66 @@ class MultilingualMerchantClassifier:
             return exact_match, 1.0  # Perfect match score
 
         # 2. If no exact synonym match, do vector search
-        query_vector = self.model.encode(name).tolist()
-
-        pipeline = [
-            {
-                "$vectorSearch": {
-                    "index": "merchant_vector_index",
-                    "path": "merchant_embedding",
-                    "queryVector": query_vector,
-                    "numCandidates": 100,
-                    "limit": 5  # Increased to check more candidates
-                }
-            },
-            # Add a stage to unwind synonyms for vector comparison
-            {
-                "$project": {
-                    "_id": 1,
-                    "canonical_name": 1,
-                    "synonyms": 1,
-                    "merchant_embedding": 1,
-                    "score": { "$meta": "vectorSearchScore" }
-                }
-            },
-            {
-                "$unwind": {
-                    "path": "$synonyms",
-                    "preserveNullAndEmptyArrays": True  # Changed from true to True
-                }
-            },
-            # Group back to get best score whether from canonical or synonym
-            {
-                "$group": {
-                    "_id": "$_id",
-                    "canonical_name": { "$first": "$canonical_name" },
-                    "synonyms": { "$push": "$synonyms" },
-                    "score": { "$first": "$score" }
-                }
-            },
-            # Sort by similarity score
-            {
-                "$sort": {
-                    "score": -1
-                }
-            },
-            {
-                "$limit": 1
-            }
-        ]
+        query_vector = self.encode(name).tolist()
+        return self._vector_search(query_vector)
 
-        results = list(self.merchants.aggregate(pipeline))
+    def _vector_search(self, query_vector: List[float]) -> tuple[Optional[Dict], float]:
+        """Query the configured vector backend and return the best match and its score."""
+        results = self.vector_backend.search(query_vector, limit=1)
 
         if not results:
             return None, 0.0
 
-        best_match = results[0]
-        similarity = best_match["score"]
+        best_match, similarity = results[0]
 
         return best_match, similarity
 
+    def find_closest_merchants(
+        self,
+        names: List[str],
+        max_workers: int = 8
+    ) -> Dict[str, tuple[Optional[Dict], float]]:
+        """
+        Batch variant of find_closest_merchant for a list of unique names.
+
+        Resolves all exact synonym matches with a single $in query, encodes the
+        remaining names in one batched encode call and runs their vector searches
+        concurrently. Returns a dict mapping each name to (match, similarity).
+        """
+        matches: Dict[str, tuple[Optional[Dict], float]] = {}
+        if not names:
+            return matches
+
+        # 1. Exact synonym matches from memory, then the rest in one round trip
+        if self.synonym_index is not None:
+            for name in names:
+                exact_match = self.synonym_index.lookup(name)
+                if exact_match:
+                    matches[name] = (exact_match, 1.0)
+
+        wanted = set(name for name in names if name not in matches)
+        if wanted:
+            for merchant in self.merchants.find(
+                {"synonyms": {"$in": list(wanted)}},
+                {"canonical_name": 1, "synonyms": 1}
+            ):
+                for synonym in merchant.get("synonyms", []):
+                    if synonym in wanted and synonym not in matches:
+                        matches[synonym] = (merchant, 1.0)
+
+        misses = [name for name in names if name not in matches]
+        if not misses:
+            return matches
+
+        # 2. Encode all misses in one batch, then search concurrently
+        query_vectors = self.encode(misses).tolist()
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            results = executor.map(self._vector_search, query_vectors)
+            for name, result in zip(misses, results):
+                matches[name] = result
+
+        return matches
+
     def classify_merchant(
         self,
         extracted_name: str,
@@ -164,114 +369,153 @@ class MultilingualMerchantClassifier:
         Returns merchant details including ID for document reference.
         """
         closest_match, similarity = self.find_closest_merchant(extracted_name)
+        return self._resolve_merchant(
+            extracted_name, closest_match, similarity, llm_client, languages
+        )
 
-        if similarity > 0.85:  # High confidence match
-            # Add to synonyms array if it's a high confidence match
-            merchant_id = closest_match["_id"]
-            self.merchants.update_one(
-                {"_id": merchant_id},
-                {
-                    "$addToSet": {"synonyms": extracted_name},
-                    "$set": {
-                        "last_updated": datetime.utcnow()
-                    }
-                }
+    def classify_merchants(
+        self,
+        names: List[str],
+        llm_client,
+        languages: Optional[List[str]] = None,
+        max_workers: int = 8
+    ) -> List[Dict]:
+        """
+        Classify a batch of merchant names.
+
+        Duplicate names are classified once. Lookups are batched through
+        find_closest_merchants; LLM verification and writes then run per unique
+        name in input order. Returns one result per input name, in input order.
+
+        Merchants created earlier in the batch were not there when the lookups
+        ran (and Atlas indexes them asynchronously), so each later name that
+        wasn't an exact synonym hit is also compared with them directly; near
+        duplicates like "Grab Singapore" / "grab sg" then become synonyms
+        instead of separate merchants, as with sequential classify_merchant.
+        """
+        unique_names = list(dict.fromkeys(names))
+        matches = self.find_closest_merchants(unique_names, max_workers=max_workers)
+
+        resolved = {}
+        created = []  # (merchant, unit embedding) for merchants inserted by this batch
+        for name in unique_names:
+            closest_match, similarity = matches[name]
+            if created and similarity < 1.0:
+                closest_match, similarity = self._closest_created(name, closest_match, similarity, created)
+            result = self._resolve_merchant(
+                name, closest_match, similarity, llm_client, languages
             )
+            resolved[name] = result
+            if not result["is_synonym"]:
+                merchant = {"_id": result["merchant_id"], "canonical_name": result["canonical_name"]}
+                created.append((merchant, self._unit(self.encode(name))))
 
-            return {
-                "merchant_id": merchant_id,
-                "canonical_name": closest_match["canonical_name"],
-                "is_synonym": True,
-                "confidence": similarity
-            }
+        return [resolved[name] for name in names]
 
-        language_context = ""
-        if languages:
-            language_context = f"Consider that the names might be in any of these languages: {', '.join(languages)}. "
+    def _closest_created(
+        self,
+        name: str,
+        closest_match: Optional[Dict],
+        similarity: float,
+        created: List[tuple]
+    ) -> tuple[Optional[Dict], float]:
+        """Best of the looked-up match and the merchants created so far, on the (1 + cosine) / 2 scale."""
+        vector = self._unit(self.encode(name))
+        for merchant, merchant_vector in created:
+            score = float((1.0 + vector @ merchant_vector) / 2.0)
+            if score > similarity:
+                closest_match, similarity = merchant, score
+        return closest_match, similarity
 
-        prompt = f"""Analyze if '{extracted_name}' is a synonym or variation of '{closest_match["canonical_name"] if closest_match else "None"}' if one exists.
-        {language_context}Consider common variations, misspellings, and business name patterns.
-        Return JSON with these fields:
-        - is_new_merchant: boolean
-        - canonical_name: string (either existing or suggested new name)
-        - confidence: float (0-1)
-        - reasoning: string
-        """
+    @staticmethod
+    def _unit(vector: np.ndarray) -> np.ndarray:
+        vector = np.asarray(vector, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm > 0 else vector
 
-        message = llm_client.messages.create(
-            model="claude-sonnet-4-5-20250929",
-            max_tokens=1000,
-            temperature=0,
-            messages=[
-                {
-                    "role": "user",
-                    "content": prompt
-                }
-            ]
-        )
+    def _resolve_merchant(
+        self,
+        extracted_name: str,
+        closest_match: Optional[Dict],
+        similarity: float,
+        llm_client,
+        languages: Optional[List[str]] = None
+    ) -> Dict:
+        """Turn a closest-match lookup into a classification, verifying with the LLM if needed."""
+        if is_known_synonym(extracted_name, closest_match, similarity):
+            return classification(closest_match["_id"], closest_match["canonical_name"], True, similarity)
 
-        # Get the response and clean it before parsing
-        response_text = message.content[0].text.strip()
+        if similarity > SYNONYM_SIMILARITY:
+            # Add to synonyms array if it's a high confidence match
+            merchant_id = closest_match["_id"]
+            previous = self.merchants.find_one_and_update(
+                {"_id": merchant_id},
+                synonym_update(extracted_name),
+                projection={"synonyms": 1},
+                return_document=ReturnDocument.BEFORE
+            )
+            self._record_synonym(merchant_id, closest_match["canonical_name"], extracted_name, previous)
+            return classification(merchant_id, closest_match["canonical_name"], True, similarity)
 
-        # Remove markdown code blocks if present
-        if response_text.startswith('```json'):
-            response_text = response_text.split('```json')[1]
-        if response_text.startswith('```'):
-            response_text = response_text.split('```')[1]
-        if response_text.endswith('```'):
-            response_text = response_text.rsplit('```', 1)[0]
-        response_text = response_text.strip()
+        candidate = candidate_name(closest_match)
+        analysis = None
+        if self.verdict_cache is not None:
+            analysis = self.verdict_cache.get(extracted_name, candidate)
 
-        try:
-            analysis = json.loads(response_text)
-        except json.JSONDecodeError as e:
-            # Print the response for debugging
-            print(f"Failed to parse JSON. Response was: {response_text}")
-            raise ValueError(f"Claude returned invalid JSON: {e}") from e
+        if analysis is None:
+            message = llm_client.messages.create(
+                **build_verification_request(extracted_name, closest_match, languages)
+            )
+            analysis = parse_verification_response(message.content[0].text)
+            if self.verdict_cache is not None:
+                self.verdict_cache.put(extracted_name, candidate, analysis)
+
+        embedding = self.encode(extracted_name).tolist()
+        stored_fields = self.embedding_codec.stored_fields(embedding)
 
-        if not analysis["is_new_merchant"] and closest_match:
+        if is_confirmed_synonym(analysis, closest_match):
             # Add as synonym if it doesn't exist
             merchant_id = closest_match["_id"]
-            canonical_name = analysis["canonical_name"]
-
-            self.merchants.update_one(
+            previous = self.merchants.find_one_and_update(
                 {"_id": merchant_id},
-                {
-                    "$addToSet": {"synonyms": extracted_name},
-                    "$set": {
-                        "merchant_embedding": self.model.encode(extracted_name).tolist(),
-                        "last_updated": datetime.utcnow()
-                    }
-                }
+                synonym_update(extracted_name, stored_fields),
+                projection={"synonyms": 1},
+                return_document=ReturnDocument.BEFORE
             )
+            self.vector_backend.upsert(merchant_id, closest_match["canonical_name"], embedding)
+            self._record_synonym(merchant_id, closest_match["canonical_name"], extracted_name, previous)
+            return classification(merchant_id, analysis["canonical_name"], True, analysis["confidence"])
 
-            return {
-                "merchant_id": merchant_id,
-                "canonical_name": canonical_name,
-                "is_synonym": True,
-                "confidence": analysis["confidence"]
-            }
-        else:
-            # Add new merchant
-            embedding = self.model.encode(extracted_name).tolist()
-            result = self.merchants.insert_one({
-                "canonical_name": extracted_name,
-                "synonyms": [],
-                "merchant_embedding": embedding,
-                "metadata": {
-                    "first_seen": datetime.utcnow(),
-                    "last_updated": datetime.utcnow(),
-                    "source": "pdf_extraction",
-                    "languages": languages
-                }
-            })
-
-            return {
-                "merchant_id": result.inserted_id,
-                "canonical_name": extracted_name,
-                "is_synonym": False,
-                "confidence": analysis["confidence"]
-            }
+        # Add new merchant
+        try:
+            result = self.merchants.insert_one(new_merchant_document(extracted_name, stored_fields, languages))
+        except DuplicateKeyError:
+            # Another process created this merchant after our vector search
+            existing = self.merchants.find_one({"canonical_name": extracted_name}, {"canonical_name": 1})
+            if existing is None:
+                raise
+            self.vector_backend.upsert(existing["_id"], extracted_name, embedding)
+            return classification(existing["_id"], existing["canonical_name"], True, analysis["confidence"])
+        self.vector_backend.upsert(result.inserted_id, extracted_name, embedding)
+        return classification(result.inserted_id, extracted_name, False, analysis["confidence"])
+
+    def _record_synonym(
+        self,
+        merchant_id,
+        canonical_name: str,
+        synonym: str,
+        previous: Optional[Dict] = None
+    ) -> None:
+        """
+        Reflect a synonym write in the in-process index, if one is running.
+
+        previous is the merchant as it was before the $addToSet; if the synonym
+        is new, its match key is added to the merchant's stored documents.
+        """
+        if self.synonym_index is not None:
+            self.synonym_index.add_synonym(merchant_id, canonical_name, synonym)
+        if is_new_synonym(synonym, previous):
+            add_merchant_key(self.db, merchant_id, synonym)
 
     def get_merchant_details(self, merchant_id: str) -> Optional[Dict]:
         """Get full merchant details by ID."""
@@ -283,4 +527,14 @@ class MultilingualMerchantClassifier:
             {"canonical_name": canonical_name},
             {"synonyms": 1}
         )
-        return merchant["synonyms"] if merchant else []
\ No newline at end of file
+        return merchant["synonyms"] if merchant else []
+
+    def get_synonyms_by_name(self, canonical_names: List[str]) -> Dict[str, List[str]]:
+        """Get synonyms for many canonical merchant names in one query."""
+        synonyms = {name: [] for name in canonical_names}
+        for merchant in self.merchants.find(
+            {"canonical_name": {"$in": list(synonyms)}},
+            {"canonical_name": 1, "synonyms": 1}
+        ):
+            synonyms[merchant["canonical_name"]] = merchant.get("synonyms", [])
+        return synonyms
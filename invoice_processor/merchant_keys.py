@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+"""
+Denormalized merchant match keys.
+
+Every document (and spend rollup row) carries merchant_keys: the normalized,
+casefolded canonical name and synonyms of its merchant. Generated pipelines
+match a merchant with an indexed {"$match": {"merchant_keys": "..."}} instead
+of a correlated $lookup into merchants; normalize_key_literals applies the
+same normalization to the literals they match with.
+
+The classifier adds a key to existing documents whenever a merchant gains a
+new synonym. To recompute keys after synonyms were edited directly in the
+merchants collection (or for documents saved before keys existed):
+
+    python merchant_keys.py --mongodb-uri "mongodb+srv://..." --database invoice_processor
+    python merchant_keys.py --mongodb-uri "..." --merchant "Grab Singapore"
+"""
+
+from typing import Dict, List, Optional
+import argparse
+
+from pymongo import MongoClient
+
+from embedding_cache import normalize_text
+from rollups import ROLLUP_COLLECTION
+
+# Collections whose rows carry merchant_id and merchant_keys
+KEYED_COLLECTIONS = ("documents", ROLLUP_COLLECTION)
+
+
+def merchant_key(name: str) -> str:
+    """Match key for a merchant name: NFC, collapsed whitespace, casefolded."""
+    return normalize_text(name).casefold()
+
+
+def merchant_keys(canonical_name: str, synonyms: Optional[List[str]] = None) -> List[str]:
+    """Sorted, de-duplicated match keys for a merchant's canonical name and synonyms."""
+    names = [canonical_name] + list(synonyms or [])
+    return sorted({merchant_key(name) for name in names if name})
+
+
+def _normalize_key_condition(condition):
+    """merchant_keys condition with its string literals turned into match keys."""
+    if isinstance(condition, str):
+        return merchant_key(condition)
+    if isinstance(condition, list):
+        return [_normalize_key_condition(item) for item in condition]
+    if isinstance(condition, dict):
+        return {
+            operator: _normalize_key_condition(value)
+            if operator in ("$eq", "$ne", "$in", "$nin", "$all") else value
+            for operator, value in condition.items()
+        }
+    return condition
+
+
+def _normalize_key_query(query):
+    """$match query with every merchant_keys literal normalized, including under $and/$or/$nor."""
+    if not isinstance(query, dict):
+        return query
+    normalized = {}
+    for field, condition in query.items():
+        if field == "merchant_keys":
+            condition = _normalize_key_condition(condition)
+        elif field in ("$and", "$or", "$nor") and isinstance(condition, list):
+            condition = [_normalize_key_query(clause) for clause in condition]
+        normalized[field] = condition
+    return normalized
+
+
+def normalize_key_literals(pipeline: List[Dict]) -> List[Dict]:
+    """
+    Pipeline with the merchant_keys literals of its $match stages normalized like merchant_key.
+
+    Generated pipelines only lowercase merchant names; for names such as
+    "Straße" (key "strasse") the lowercased literal would never match.
+    """
+    return [
+        {
+            name: _normalize_key_query(content) if name == "$match" else content
+            for name, content in stage.items()
+        } if isinstance(stage, dict) else stage
+        for stage in pipeline
+    ]
+
+
+def merchant_key_update(name: str) -> Dict:
+    """Update adding one new synonym's key to a stored row."""
+    return {"$addToSet": {"merchant_keys": merchant_key(name)}}
+
+
+def add_merchant_key(db, merchant_id, name: str) -> None:
+    """Add one new synonym's key to every stored row for merchant_id."""
+    for collection in KEYED_COLLECTIONS:
+        db[collection].update_many({"merchant_id": merchant_id}, merchant_key_update(name))
+
+
+def backfill_merchant_keys(db, canonical_names: Optional[List[str]] = None) -> Dict[str, int]:
+    """
+    Recompute merchant_keys from the merchants collection.
+
+    Limited to canonical_names if given. Returns rows updated per collection.
+    """
+    query = {"canonical_name": {"$in": canonical_names}} if canonical_names else {}
+    updated = {collection: 0 for collection in KEYED_COLLECTIONS}
+
+    for merchant in db.merchants.find(query, {"canonical_name": 1, "synonyms": 1}):
+        keys = merchant_keys(merchant["canonical_name"], merchant.get("synonyms"))
+        for collection in KEYED_COLLECTIONS:
+            result = db[collection].update_many(
+                {"merchant_id": merchant["_id"]},
+                {"$set": {"merchant_keys": keys}}
+            )
+            updated[collection] += result.modified_count
+
+    return updated
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Backfill merchant_keys on documents and spend rollups")
+    parser.add_argument("--mongodb-uri", required=True, help="MongoDB connection string")
+    parser.add_argument("--database", default="invoice_processor", help="Database name")
+    parser.add_argument(
+        "--merchant",
+        action="append",
+        help="Only backfill this canonical merchant name (repeatable)"
+    )
+    args = parser.parse_args()
+
+    client = MongoClient(args.mongodb_uri)
+    db = client[args.database]
+    updated = backfill_merchant_keys(db, args.merchant)
+    for collection, count in updated.items():
+        print(f"{collection}: {count} rows updated")
+    client.close()
+
+
+if __name__ == "__main__":
+    main()
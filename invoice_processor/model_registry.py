@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+"""
+Process-wide registry of SentenceTransformer models.
+
+Every classifier in a process asks the registry for its model instead of
+constructing one, so the ~1 GB model is loaded once (lazily, on first use) and
+shared. Models can also be served through sentence-transformers' ONNX backend,
+optionally from a dynamically quantized int8 export for faster CPU inference:
+
+    python model_registry.py export --output models/mpnet-onnx-int8 --config avx2
+
+and then load it with backend="onnx", model_name="models/mpnet-onnx-int8",
+file_name="onnx/model_qint8_avx2.onnx". Non-torch backends need
+sentence-transformers>=3.2 with its extra: pip install "sentence-transformers[onnx]".
+"""
+
+from typing import TYPE_CHECKING, Dict, Optional, Tuple
+import argparse
+import threading
+import time
+
+if TYPE_CHECKING:
+    from sentence_transformers import SentenceTransformer
+
+DEFAULT_MODEL_NAME = "paraphrase-multilingual-mpnet-base-v2"
+
+_models: Dict[Tuple[str, str, Optional[str]], "SentenceTransformer"] = {}
+_lock = threading.Lock()
+
+
+def require_backend(backend: str) -> None:
+    """Raise a helpful ImportError if the optional packages for backend are missing."""
+    if backend == "torch":
+        return
+    try:
+        import optimum  # noqa: F401  (installed by the sentence-transformers extra)
+    except ImportError:
+        raise ImportError(
+            f'backend="{backend}" requires optimum. '
+            f'Install with: pip install "sentence-transformers[{backend}]>=3.2"'
+        )
+
+
+def load_sentence_model(
+    model_name: str,
+    max_retries: int = 3,
+    backend: str = "torch",
+    file_name: Optional[str] = None
+) -> "SentenceTransformer":
+    """Load a SentenceTransformer model with retries (bypasses the registry)."""
+    # Imported here so modules that only pass models around start without torch
+    from sentence_transformers import SentenceTransformer
+
+    require_backend(backend)
+    kwargs = {}
+    if backend != "torch":
+        kwargs["backend"] = backend
+    if file_name:
+        kwargs["model_kwargs"] = {"file_name": file_name}
+
+    for attempt in range(max_retries):
+        try:
+            print(f"Loading model {model_name} ({backend}), attempt {attempt + 1}")
+            model = SentenceTransformer(model_name, **kwargs)
+            print("Model loaded successfully")
+            return model
+        except Exception as e:
+            print(f"Error loading model (attempt {attempt + 1}): {e}")
+            if attempt < max_retries - 1:
+                time.sleep(1)  # Wait before retrying
+            else:
+                raise
+
+
+def get_model(
+    model_name: str = DEFAULT_MODEL_NAME,
+    backend: str = "torch",
+    file_name: Optional[str] = None
+) -> "SentenceTransformer":
+    """Return the shared model instance, loading it on first use."""
+    key = (model_name, backend, file_name)
+    model = _models.get(key)
+    if model is not None:
+        return model
+
+    # Hold the lock while loading so concurrent callers don't load twice
+    with _lock:
+        model = _models.get(key)
+        if model is None:
+            model = load_sentence_model(model_name, backend=backend, file_name=file_name)
+            _models[key] = model
+        return model
+
+
+def loaded_models() -> list:
+    """Return the (model_name, backend, file_name) keys currently loaded."""
+    return list(_models)
+
+
+def export_quantized_onnx(
+    model_name: str,
+    output_dir: str,
+    config: str = "avx2"
+) -> str:
+    """
+    Export model_name to ONNX with dynamic int8 quantization into output_dir.
+
+    config is the quantization target: "arm64", "avx2", "avx512" or
+    "avx512_vnni". Returns the file_name to pass to get_model(backend="onnx").
+    """
+    require_backend("onnx")
+    from sentence_transformers import SentenceTransformer, export_dynamic_quantized_onnx_model
+
+    model = SentenceTransformer(model_name, backend="onnx")
+    model.save_pretrained(output_dir)
+    export_dynamic_quantized_onnx_model(model, config, output_dir)
+    return f"onnx/model_qint8_{config}.onnx"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="SentenceTransformer model utilities")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    export = subparsers.add_parser("export", help="Export a quantized ONNX copy of the model")
+    export.add_argument("--model", default=DEFAULT_MODEL_NAME, help="Model name or path")
+    export.add_argument("--output", required=True, help="Directory to write the ONNX model to")
+    export.add_argument(
+        "--config",
+        default="avx2",
+        choices=["arm64", "avx2", "avx512", "avx512_vnni"],
+        help="Quantization target for the CPU running the app"
+    )
+    args = parser.parse_args()
+
+    file_name = export_quantized_onnx(args.model, args.output, args.config)
+    print(f"Exported to {args.output}")
+    print(f'Use it with: model_name="{args.output}", model_backend="onnx", model_file_name="{file_name}"')
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+"""
+Shared MongoClient construction and connection pool metrics.
+
+One process should hold one MongoClient per cluster: every client has its own
+socket pool, monitoring threads and TLS handshakes. create_client builds that
+client from the optional [mongodb_pool] settings (same keys in secrets.toml
+for the app and the ingest CLIs) with a ConnectionPoolMetrics listener and
+returns both; pass the client (or a database from it) to the classifier
+instead of letting it open its own.
+"""
+
+from typing import Any, Dict, Optional, Tuple
+import threading
+
+from pymongo import MongoClient, monitoring
+
+# [mongodb_pool] key -> MongoClient keyword
+POOL_SETTINGS = {
+    "max_pool_size": "maxPoolSize",
+    "min_pool_size": "minPoolSize",
+    "max_idle_time_ms": "maxIdleTimeMS",
+    "max_connecting": "maxConnecting",
+    "wait_queue_timeout_ms": "waitQueueTimeoutMS",
+    "compressors": "compressors",
+    "zlib_compression_level": "zlibCompressionLevel",
+}
+
+
+class ConnectionPoolMetrics(monitoring.ConnectionPoolListener):
+    """Counts connections opened, closed and checked out across every pool of a client."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.created = 0
+        self.closed = 0
+        self.checked_out = 0
+        self.checkout_failures = 0
+
+    def _add(self, name: str, delta: int = 1) -> None:
+        with self._lock:
+            setattr(self, name, getattr(self, name) + delta)
+
+    def connection_created(self, event):
+        self._add("created")
+
+    def connection_closed(self, event):
+        self._add("closed")
+
+    def connection_checked_out(self, event):
+        self._add("checked_out")
+
+    def connection_checked_in(self, event):
+        self._add("checked_out", -1)
+
+    def connection_check_out_failed(self, event):
+        self._add("checkout_failures")
+
+    # Remaining ConnectionPoolListener hooks are not needed for the counts
+    def pool_created(self, event):
+        pass
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_cleared(self, event):
+        pass
+
+    def pool_closed(self, event):
+        pass
+
+    def connection_ready(self, event):
+        pass
+
+    def connection_check_out_started(self, event):
+        pass
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "open": self.created - self.closed,
+                "checked_out": self.checked_out,
+                "created": self.created,
+                "closed": self.closed,
+                "checkout_failures": self.checkout_failures,
+            }
+
+
+def client_options(pool_settings: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """Translate [mongodb_pool] settings into MongoClient keyword arguments."""
+    options = {}
+    for key, value in (pool_settings or {}).items():
+        if key not in POOL_SETTINGS:
+            raise ValueError(f"Unknown mongodb_pool setting '{key}', expected one of {sorted(POOL_SETTINGS)}")
+        if key == "compressors" and not isinstance(value, str):
+            value = ",".join(value)
+        options[POOL_SETTINGS[key]] = value
+    return options
+
+
+def create_client(
+    mongodb_uri: str,
+    pool_settings: Optional[Dict[str, Any]] = None,
+    metrics: Optional[ConnectionPoolMetrics] = None
+) -> Tuple[MongoClient, ConnectionPoolMetrics]:
+    """Build the process's MongoClient with pool options. Returns (client, metrics listener)."""
+    metrics = metrics or ConnectionPoolMetrics()
+    client = MongoClient(mongodb_uri, event_listeners=[metrics], **client_options(pool_settings))
+    return client, metrics
@@ -0,0 +1,175 @@
+"""
+Text-layer page selection for PDFs before vision extraction.
+
+Multi-page statements are sent to Claude whole even though the merchant header
+and totals are usually on one or two pages. preprocess_pdf reads the PDF's own
+text layer, keeps the first page (merchant header) plus the pages that look
+like they carry totals, and rewrites the PDF with only those pages. Scanned
+PDFs without a text layer, short documents and PDFs pypdf can't read are sent
+unchanged.
+
+preprocess_pdf is a plain top-level function so it can run in a
+ProcessPoolExecutor (text extraction is CPU-bound); PdfPreprocessor wraps
+the pool for the ingest CLI.
+"""
+
+from typing import Any, Dict, List, Optional
+from concurrent.futures import Future, ProcessPoolExecutor
+import io
+import re
+
+try:
+    import pypdf
+except ImportError:  # Optional: without it every PDF is sent whole
+    pypdf = None
+
+# Rough per-page cost of PDF vision input: the page image plus its extracted text
+EST_IMAGE_TOKENS_PER_PAGE = 1600
+EST_CHARS_PER_TOKEN = 4
+
+# Below this many text characters per page the text layer is treated as missing (scans)
+MIN_TEXT_CHARS_PER_PAGE = 40
+
+TOTAL_KEYWORDS = re.compile(
+    r"\b(total|amount due|balance due|grand total|subtotal|sub-total|amount payable|"
+    r"gst|vat|tax invoice|jumlah|bayaran)\b|合计|總計|总计|应付|金额",
+    re.IGNORECASE
+)
+AMOUNT_PATTERN = re.compile(r"(?<![\d.])\d{1,3}(?:[,\s]\d{3})*\.\d{2}(?!\d)")
+
+
+def extract_page_texts(pdf_bytes: bytes) -> Optional[List[str]]:
+    """Text layer of every page, or None if pypdf is missing or can't read the PDF."""
+    if pypdf is None:
+        return None
+    try:
+        reader = pypdf.PdfReader(io.BytesIO(pdf_bytes))
+        return [page.extract_text() or "" for page in reader.pages]
+    except Exception as e:
+        print(f"Could not read PDF text layer: {e}")
+        return None
+
+
+def has_text_layer(page_texts: List[str]) -> bool:
+    """False for scans: too little extractable text per page."""
+    return sum(len(text.strip()) for text in page_texts) >= MIN_TEXT_CHARS_PER_PAGE * len(page_texts)
+
+
+def estimate_tokens(page_texts: List[str]) -> int:
+    """Estimated input tokens for sending these pages through PDF vision."""
+    return sum(
+        EST_IMAGE_TOKENS_PER_PAGE + len(text) // EST_CHARS_PER_TOKEN
+        for text in page_texts
+    )
+
+
+def score_page(text: str) -> int:
+    """How likely a page is to hold the document totals: keyword hits, then amounts."""
+    return 10 * len(TOTAL_KEYWORDS.findall(text)) + len(AMOUNT_PATTERN.findall(text))
+
+
+def select_pages(page_texts: List[str], max_pages: int = 2) -> Optional[List[int]]:
+    """
+    Indexes of the pages to send, or None to send the whole document.
+
+    Keeps page 0 (merchant header) and the last page with total keywords
+    (statements print the closing total at the end), then fills up to
+    max_pages with the highest scoring remaining pages. Never returns more
+    than max_pages pages: with max_pages=1 only the header page is kept.
+    """
+    if max_pages < 1 or len(page_texts) <= max_pages:
+        return None
+    if not has_text_layer(page_texts):
+        return None
+
+    with_totals = [i for i, text in enumerate(page_texts) if TOTAL_KEYWORDS.search(text)]
+    if not with_totals:
+        return None
+
+    ranked = sorted(range(len(page_texts)), key=lambda i: score_page(page_texts[i]), reverse=True)
+    keep = []
+    for i in [0, with_totals[-1]] + [i for i in ranked if score_page(page_texts[i]) > 0]:
+        if len(keep) >= max_pages:
+            break
+        if i not in keep:
+            keep.append(i)
+
+    return sorted(keep)
+
+
+def preprocess_pdf(pdf_bytes: bytes, max_pages: int = 2) -> Dict[str, Any]:
+    """
+    Trim a PDF to the pages that matter for extraction.
+
+    Returns a dict with pdf_bytes (what to send), mode ("trimmed", "full" or
+    "unavailable"), page_count, pages (kept page indexes), original_bytes,
+    sent_bytes, bytes_saved and est_tokens_saved.
+    """
+    result = {
+        "pdf_bytes": pdf_bytes,
+        "mode": "full",
+        "page_count": None,
+        "pages": None,
+        "original_bytes": len(pdf_bytes),
+        "sent_bytes": len(pdf_bytes),
+        "bytes_saved": 0,
+        "est_tokens_saved": 0,
+    }
+    if pypdf is None:
+        result["mode"] = "unavailable"
+        return result
+
+    try:
+        reader = pypdf.PdfReader(io.BytesIO(pdf_bytes))
+        page_texts = [page.extract_text() or "" for page in reader.pages]
+    except Exception as e:
+        print(f"Could not read PDF text layer, sending whole document: {e}")
+        return result
+
+    result["page_count"] = len(page_texts)
+    pages = select_pages(page_texts, max_pages)
+    if pages is None:
+        return result
+
+    writer = pypdf.PdfWriter()
+    for i in pages:
+        writer.add_page(reader.pages[i])
+    buffer = io.BytesIO()
+    writer.write(buffer)
+    trimmed = buffer.getvalue()
+
+    # Shared resources (fonts, images) can make a subset barely smaller; keep the original then
+    if len(trimmed) >= len(pdf_bytes):
+        return result
+
+    result.update({
+        "pdf_bytes": trimmed,
+        "mode": "trimmed",
+        "pages": pages,
+        "sent_bytes": len(trimmed),
+        "bytes_saved": len(pdf_bytes) - len(trimmed),
+        "est_tokens_saved": estimate_tokens(
+            [text for i, text in enumerate(page_texts) if i not in pages]
+        ),
+    })
+    return result
+
+
+class PdfPreprocessor:
+    """Process pool running preprocess_pdf off the main interpreter."""
+
+    def __init__(self, max_workers: Optional[int] = None, max_pages: int = 2):
+        self.max_pages = max_pages
+        self._pool = ProcessPoolExecutor(max_workers=max_workers)
+
+    def submit(self, pdf_bytes: bytes) -> Future:
+        return self._pool.submit(preprocess_pdf, pdf_bytes, self.max_pages)
+
+    def close(self) -> None:
+        self._pool.shutdown()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -0,0 +1,197 @@
+from typing import Callable, Dict, Iterable, Optional
+from datetime import datetime, timedelta
+import json
+import re
+import threading
+import time
+
+import numpy as np
+
+from merchant_keys import merchant_key
+from vector_backends import LocalVectorIndex
+
+# Queries whose meaning depends on when they are asked. Generated pipelines
+# carry literal dates, so these are never cached or served from the cache.
+RELATIVE_DATE_PATTERN = re.compile(
+    r"\b(today|yesterday|tomorrow|tonight|recent(ly)?|ago|so far|to date|ytd|mtd|"
+    r"(this|last|next|past|previous|current|coming)\s+(\d+\s+)?"
+    r"(day|week|weekend|fortnight|month|quarter|year|\d+)s?)\b",
+    re.IGNORECASE
+)
+
+# Merchant name words too common to tell queries apart
+MERCHANT_STOPWORDS = frozenset({"the", "and", "of", "for", "on", "in", "at", "my", "pte", "ltd", "limited"})
+
+
+def has_relative_dates(query: str) -> bool:
+    """True for queries like "last month" or "this year"."""
+    return RELATIVE_DATE_PATTERN.search(query) is not None
+
+
+def merchant_terms(names: Iterable[str]) -> frozenset:
+    """Lowercased words of merchant names, for query_entities."""
+    return frozenset(
+        word
+        for name in names
+        for word in re.findall(r"\w+", merchant_key(name))
+        if len(word) > 1 and word not in MERCHANT_STOPWORDS
+    )
+
+
+def query_entities(query: str, known_terms: frozenset = frozenset()) -> frozenset:
+    """
+    Literal-looking tokens that must match for a cached pipeline to be reused.
+
+    Numbers and capitalized words (merchant names, months, currencies) after
+    the first word, plus any word, in any position or case, that belongs to a
+    known merchant name. "Grab" and "Gojek" queries embed very closely, so
+    similarity alone is not enough to share a pipeline.
+    """
+    words = re.findall(r"[\w$€£¥.,/-]+", query)
+    entities = set()
+    for i, word in enumerate(words):
+        token = word.strip(".,").casefold()
+        if token in known_terms:
+            entities.add(token)
+        elif i > 0 and word != "I" and (any(c.isdigit() for c in word) or any(c.isupper() for c in word)):
+            entities.add(token)
+    return frozenset(entities)
+
+
+class SemanticQueryCache:
+    """
+    Cache of natural-language query embeddings -> validated aggregation pipelines.
+
+    Queries are embedded with the classifier's SentenceTransformer (through its
+    embedding cache) and matched in-process with a LocalVectorIndex. A query
+    whose cosine similarity to a cached one is at least `threshold`, and whose
+    literal tokens (see query_entities) are identical, reuses that pipeline
+    instead of generating a new one. Only pipelines that passed
+    validate_pipeline should be stored. Entries persist in a MongoDB collection.
+
+    Entries are tagged with prompt_version (a hash of the generator's prompt
+    and tool schema) and only reused by a cache with the same version, so a
+    prompt or schema change never serves pipelines written for the old one.
+    Entries expire after ttl_seconds, and queries with relative dates ("last
+    month") are neither stored nor looked up. Merchant names for
+    query_entities are read from merchants every terms_refresh_seconds.
+    """
+
+    def __init__(
+        self,
+        collection,
+        encode: Callable[[str], np.ndarray],
+        dimensions: int,
+        threshold: float = 0.95,
+        prompt_version: str = "",
+        ttl_seconds: float = 7 * 24 * 3600,
+        merchants=None,
+        terms_refresh_seconds: float = 300.0
+    ):
+        self.collection = collection
+        self.encode = encode
+        self.threshold = threshold
+        self.prompt_version = prompt_version
+        self.ttl_seconds = ttl_seconds
+        self.merchants = merchants
+        self.terms_refresh_seconds = terms_refresh_seconds
+        self.hits = 0
+        self.misses = 0
+        self.skipped = 0
+        self._index = LocalVectorIndex(dimensions)
+        self._entries: Dict = {}
+        self._terms = frozenset()
+        self._terms_loaded_at = None
+        self._lock = threading.Lock()
+        self.load()
+
+    def load(self) -> None:
+        """Load current, unexpired cached pipelines from the collection into the in-process index."""
+        self.collection.delete_many({"created_at": {"$lt": self._cutoff()}})
+        for entry in self.collection.find({"prompt_version": self.prompt_version}):
+            self._remember(entry)
+
+    def known_terms(self) -> frozenset:
+        """Merchant name words, reloaded from merchants every terms_refresh_seconds."""
+        if self.merchants is None:
+            return self._terms
+        now = time.monotonic()
+        if self._terms_loaded_at is None or now - self._terms_loaded_at >= self.terms_refresh_seconds:
+            names = []
+            for merchant in self.merchants.find({}, {"canonical_name": 1, "synonyms": 1}):
+                names.append(merchant["canonical_name"])
+                names.extend(merchant.get("synonyms", []))
+            self._terms = merchant_terms(names)
+            self._terms_loaded_at = now
+        return self._terms
+
+    def lookup(self, query: str) -> Optional[Dict]:
+        """Return a cached {pipeline, collection, explanation, cached_query, similarity} or None."""
+        if has_relative_dates(query):
+            self.skipped += 1
+            return None
+        vector = self.encode(query)
+        entities = query_entities(query, self.known_terms())
+        cutoff = self._cutoff()
+        # Scores are on the (1 + cosine) / 2 scale; convert back to cosine
+        for match, score in self._index.search(vector, limit=5):
+            similarity = 2 * score - 1
+            if similarity < self.threshold:
+                break
+            entry = self._entries.get(match["_id"])
+            if entry is not None and entry["created_at"] < cutoff:
+                continue
+            if entry is not None and frozenset(entry["entities"]) == entities:
+                self.hits += 1
+                self.collection.update_one(
+                    {"_id": entry["_id"]},
+                    {"$inc": {"hits": 1}, "$set": {"last_hit": datetime.utcnow()}}
+                )
+                result = {
+                    "pipeline": json.loads(entry["pipeline_json"]),
+                    "collection": entry.get("collection", "documents"),
+                    "cached_query": entry["query"],
+                    "similarity": similarity,
+                }
+                if entry.get("explanation"):
+                    result["explanation"] = entry["explanation"]
+                return result
+        self.misses += 1
+        return None
+
+    def store(self, query: str, query_result: Dict) -> None:
+        """Cache a generated pipeline for query. Call only after validate_pipeline passed."""
+        if has_relative_dates(query):
+            return
+        entry = {
+            "query": query,
+            "prompt_version": self.prompt_version,
+            "entities": sorted(query_entities(query, self.known_terms())),
+            "embedding": np.asarray(self.encode(query), dtype=np.float32).tolist(),
+            # Stored as JSON: pipeline stages are $-prefixed keys
+            "pipeline_json": json.dumps(query_result["pipeline"]),
+            "collection": query_result.get("collection", "documents"),
+            "explanation": query_result.get("explanation"),
+            "created_at": datetime.utcnow(),
+            "hits": 0
+        }
+        entry["_id"] = self.collection.insert_one(entry).inserted_id
+        self._remember(entry)
+
+    def stats(self) -> Dict[str, int]:
+        return {"hits": self.hits, "misses": self.misses, "skipped": self.skipped, "size": len(self._entries)}
+
+    def _cutoff(self) -> datetime:
+        return datetime.utcnow() - timedelta(seconds=self.ttl_seconds)
+
+    def _remember(self, entry: Dict) -> None:
+        with self._lock:
+            self._entries[entry["_id"]] = entry
+        self._index.upsert(entry["_id"], entry["query"], entry["embedding"])
+
+    def invalidate(self) -> None:
+        """Drop every cached pipeline (e.g. after the collection schema changes)."""
+        self.collection.delete_many({})
+        with self._lock:
+            self._entries.clear()
+        self._index = LocalVectorIndex(self._index.dimensions)
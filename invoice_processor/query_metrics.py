@@ -0,0 +1,68 @@
+from typing import Dict, List, Optional
+from collections import deque
+from datetime import datetime
+import threading
+
+
+class QueryMetricsRecorder:
+    """
+    Bounded in-memory log of per-query LLM metrics for the Query Database tab.
+
+    Each record holds time-to-first-token, total latency and the token usage
+    reported by the API, including prompt cache reads and writes, so the effect
+    of caching the system prompt and tool schema is visible per query.
+    """
+
+    def __init__(self, maxlen: int = 200):
+        self._records = deque(maxlen=maxlen)
+        self._lock = threading.Lock()
+
+    def record(
+        self,
+        query: str,
+        usage,
+        ttft_ms: Optional[float],
+        total_ms: float,
+        source: str = "llm"
+    ) -> Dict:
+        """Store one query's metrics. usage is the Message.usage object (or None)."""
+        record = {
+            "timestamp": datetime.utcnow(),
+            "query": query,
+            "source": source,
+            "ttft_ms": ttft_ms,
+            "total_ms": total_ms,
+            "input_tokens": getattr(usage, "input_tokens", 0) or 0,
+            "output_tokens": getattr(usage, "output_tokens", 0) or 0,
+            "cache_read_input_tokens": getattr(usage, "cache_read_input_tokens", 0) or 0,
+            "cache_creation_input_tokens": getattr(usage, "cache_creation_input_tokens", 0) or 0,
+        }
+        with self._lock:
+            self._records.append(record)
+        return record
+
+    def records(self) -> List[Dict]:
+        """Return recorded queries, oldest first."""
+        with self._lock:
+            return list(self._records)
+
+    def summary(self) -> Dict:
+        """Aggregate counts, mean latencies and cache hit share over the recorded queries."""
+        records = self.records()
+        if not records:
+            return {"queries": 0}
+
+        ttfts = [r["ttft_ms"] for r in records if r["ttft_ms"] is not None]
+        cache_read = sum(r["cache_read_input_tokens"] for r in records)
+        prompt_tokens = sum(
+            r["input_tokens"] + r["cache_read_input_tokens"] + r["cache_creation_input_tokens"]
+            for r in records
+        )
+        return {
+            "queries": len(records),
+            "mean_ttft_ms": sum(ttfts) / len(ttfts) if ttfts else None,
+            "mean_total_ms": sum(r["total_ms"] for r in records) / len(records),
+            "cache_read_input_tokens": cache_read,
+            "cache_creation_input_tokens": sum(r["cache_creation_input_tokens"] for r in records),
+            "cached_prompt_share": cache_read / prompt_tokens if prompt_tokens else 0.0,
+        }
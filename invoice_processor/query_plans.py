@@ -0,0 +1,91 @@
+"""
+Helpers for reading aggregate explain output.
+
+An aggregate explain nests the query planner output differently depending on
+the server version and topology: at the top level, under a leading $cursor
+stage, or once per shard. Only winning plans are read; rejectedPlans (and
+allPlansExecution) describe plans the server will not run, so a COLLSCAN
+there says nothing about the query's cost.
+"""
+
+from typing import Dict, Iterator, List, Optional
+
+
+def explain_sections(explain: Dict) -> Iterator[Dict]:
+    """Yield every part of an explain document holding queryPlanner / executionStats."""
+    if not isinstance(explain, dict):
+        return
+    if "queryPlanner" in explain or "executionStats" in explain:
+        yield explain
+    # Pipelines not fully pushed down to the query layer: [{"$cursor": {...}}, ...]
+    for stage in explain.get("stages") or []:
+        if isinstance(stage, dict) and "$cursor" in stage:
+            yield from explain_sections(stage["$cursor"])
+    # Sharded aggregate: {"shards": {name: {...}}}
+    shards = explain.get("shards")
+    if isinstance(shards, dict):
+        for shard in shards.values():
+            yield from explain_sections(shard)
+
+
+def winning_plans(explain: Dict) -> List[Dict]:
+    """The winning plan of every section (and of every shard in a sharded winning plan)."""
+    plans = []
+    for section in explain_sections(explain):
+        plan = (section.get("queryPlanner") or {}).get("winningPlan")
+        if not isinstance(plan, dict):
+            continue
+        shard_plans = plan.get("shards")
+        if isinstance(shard_plans, list):
+            plans.extend(shard["winningPlan"] for shard in shard_plans if "winningPlan" in shard)
+        else:
+            plans.append(plan)
+    return plans
+
+
+def plan_stages(plan) -> List[str]:
+    """Stage names in a plan tree (inputStage, inputStages, queryPlan, ...)."""
+    stages = []
+    if isinstance(plan, dict):
+        for key, value in plan.items():
+            if key == "stage" and isinstance(value, str):
+                stages.append(value)
+            elif key != "rejectedPlans":
+                stages.extend(plan_stages(value))
+    elif isinstance(plan, list):
+        for item in plan:
+            stages.extend(plan_stages(item))
+    return stages
+
+
+def winning_plan_stages(explain: Dict) -> List[str]:
+    """Stage names of every winning plan in an explain document."""
+    return [stage for plan in winning_plans(explain) for stage in plan_stages(plan)]
+
+
+def docs_examined(explain: Dict) -> Optional[int]:
+    """
+    totalDocsExamined of the executed plan, summed over shards.
+
+    Only present with executionStats verbosity; None otherwise.
+    """
+    found = [
+        section["executionStats"]["totalDocsExamined"]
+        for section in explain_sections(explain)
+        if isinstance(section.get("executionStats"), dict)
+        and isinstance(section["executionStats"].get("totalDocsExamined"), int)
+    ]
+    return sum(found) if found else None
+
+
+def input_docs_estimate(explain: Dict, collection_docs: int) -> int:
+    """
+    Documents entering the pipeline after its query stage.
+
+    totalDocsExamined where executionStats ran; otherwise unknown, so the
+    collection's document count is used as an upper bound. An IXSCAN plan
+    says nothing about how selective the index is, so it must not count as
+    zero documents.
+    """
+    examined = docs_examined(explain)
+    return examined if examined is not None else collection_docs
@@ -0,0 +1,79 @@
+"""
+Paging through the results of a validated NL query pipeline.
+
+Kept free of Streamlit so the app's cached page loader and the tests share
+the same pipeline windowing.
+"""
+
+from bson import ObjectId
+
+RESULTS_PAGE_SIZES = [25, 50, 100, 250]
+
+# Stages that pass rows through in their incoming order
+ORDER_PRESERVING_STAGES = {"$project", "$addFields", "$set", "$unset", "$limit", "$skip", "$match"}
+
+
+def paginate_pipeline(pipeline: list, page: int, page_size: int) -> list:
+    """
+    Append a $skip/$limit window to a validated pipeline.
+
+    One extra row is requested so the caller can tell whether a next page
+    exists without counting the full result set. Rows are only in a stable
+    order if the pipeline's last $sort is on a unique key and only
+    order-preserving stages follow it; a $sort followed by $group / $unwind /
+    $lookup, or one on tied values such as total_amount, could repeat or skip
+    rows across pages. That last $sort gets an _id tiebreak, and any other
+    pipeline is sorted by _id.
+    """
+    window = list(pipeline)
+    for position in range(len(window) - 1, -1, -1):
+        stage = window[position]
+        if "$sort" in stage:
+            if "_id" not in stage["$sort"]:
+                window[position] = {"$sort": {**stage["$sort"], "_id": 1}}
+            break
+        if not set(stage) <= ORDER_PRESERVING_STAGES:
+            window.append({"$sort": {"_id": 1}})
+            break
+    else:
+        window.append({"$sort": {"_id": 1}})
+    return window + [
+        {"$skip": page * page_size},
+        {"$limit": page_size + 1}
+    ]
+
+
+def fetch_results_page(
+    db,
+    pipeline: list,
+    page: int,
+    page_size: int,
+    max_time_ms: int = None,
+    collection: str = "documents"
+):
+    """Run one page of a pipeline against collection. Returns (rows, has_next_page)."""
+    options = {"batchSize": page_size + 1}
+    if max_time_ms:
+        options["maxTimeMS"] = max_time_ms
+    cursor = db[collection].aggregate(
+        paginate_pipeline(pipeline, page, page_size),
+        **options
+    )
+    rows = list(cursor)
+    return rows[:page_size], len(rows) > page_size
+
+
+def display_value(value):
+    """A BSON value with every ObjectId, however deeply nested, as a string."""
+    if isinstance(value, ObjectId):
+        return str(value)
+    if isinstance(value, dict):
+        return {key: display_value(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [display_value(item) for item in value]
+    return value
+
+
+def display_document(doc: dict) -> dict:
+    """Convert ObjectIds to strings so a result renders in st.json / st.dataframe."""
+    return display_value(doc)
@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+"""
+Incrementally maintained spend rollups.
+
+merchant_spend_daily holds one row per (merchant_id, day, currency) with the
+summed total_amount and document count, so the common "how much / how many
+by merchant, month and currency" questions read a small indexed collection
+instead of grouping every document with a $lookup into merchants.
+
+Rows are updated with $inc upserts whenever documents are saved (app and
+ingest CLI). To rebuild from scratch, e.g. after a bulk import that bypassed
+those paths:
+
+    python rollups.py --mongodb-uri "mongodb+srv://..." --database invoice_processor
+"""
+
+from typing import Any, Dict, List, Optional
+from datetime import datetime
+import argparse
+
+from pymongo import MongoClient, UpdateOne
+
+from dates import rollup_day
+
+ROLLUP_COLLECTION = "merchant_spend_daily"
+
+
+def rollup_update(doc: Dict[str, Any]) -> Optional[UpdateOne]:
+    """Build the $inc upsert that adds one saved document to its rollup row."""
+    amount = doc.get("total_amount")
+    if not isinstance(amount, (int, float)):
+        return None
+
+    day = rollup_day(doc.get("date"))
+    increments = {"total_amount": amount, "count": 1}
+    if isinstance(doc.get("total_amount_base"), (int, float)):
+        increments["total_amount_base"] = doc["total_amount_base"]
+    return UpdateOne(
+        {
+            "_id": {
+                "merchant_id": doc.get("merchant_id"),
+                "date": day,
+                "currency": doc.get("currency")
+            }
+        },
+        {
+            "$inc": increments,
+            "$set": {
+                "merchant_id": doc.get("merchant_id"),
+                "merchant_name": doc.get("merchant_name"),
+                "merchant_keys": doc.get("merchant_keys", []),
+                "date": day,
+                "month": day.strftime("%Y-%m") if day else None,
+                "currency": doc.get("currency"),
+                "last_updated": datetime.utcnow()
+            }
+        },
+        upsert=True
+    )
+
+
+def update_spend_rollups(db, docs: List[Dict[str, Any]]) -> int:
+    """Apply saved documents to merchant_spend_daily. Returns the number of rows touched."""
+    updates = [update for update in (rollup_update(doc) for doc in docs) if update is not None]
+    if not updates:
+        return 0
+    result = db[ROLLUP_COLLECTION].bulk_write(updates, ordered=False)
+    return result.modified_count + result.upserted_count
+
+
+def rebuild_spend_rollups(db) -> int:
+    """Recompute merchant_spend_daily from the documents collection."""
+    db[ROLLUP_COLLECTION].delete_many({})
+    written = 0
+    batch = []
+    for doc in db.documents.find(
+        {},
+        {
+            "merchant_id": 1, "merchant_name": 1, "merchant_keys": 1,
+            "date": 1, "currency": 1, "total_amount": 1, "total_amount_base": 1
+        }
+    ):
+        batch.append(doc)
+        if len(batch) >= 1000:
+            written += update_spend_rollups(db, batch)
+            batch = []
+    written += update_spend_rollups(db, batch)
+    return written
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Rebuild the merchant_spend_daily rollup collection")
+    parser.add_argument("--mongodb-uri", required=True, help="MongoDB connection string")
+    parser.add_argument("--database", default="invoice_processor", help="Database name")
+    args = parser.parse_args()
+
+    client = MongoClient(args.mongodb_uri)
+    db = client[args.database]
+    rebuild_spend_rollups(db)
+    print(f"Rebuilt {ROLLUP_COLLECTION}: {db[ROLLUP_COLLECTION].count_documents({})} rows")
+    client.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,226 @@
+#!/usr/bin/env python3
+"""
+One-time, idempotent schema bootstrap for the invoice processor database.
+
+Creates the Atlas Vector Search index and the regular indexes, then records
+SCHEMA_VERSION in the schema_info collection. Run it once per deployment:
+
+    python schema.py --mongodb-uri "mongodb+srv://..." --database invoice_processor
+
+Classifiers call ensure_schema() instead, which is a no-op after the first
+call in a process and only reads the recorded version otherwise, so request
+path startup performs no DDL once the database has been bootstrapped.
+Bump SCHEMA_VERSION whenever bootstrap_schema() gains a new index.
+
+The vector index definition follows the merchant_embedding storage format
+(see embedding_codec.py): --dimensions is the stored dimension and
+--similarity is "euclidean" for binary vectors. The definition is recorded
+alongside the version, and a changed definition updates the existing index.
+
+Documents saved before receipt dates were stored as BSON datetimes can be
+converted in place with --migrate-dates.
+"""
+
+from typing import Dict, Optional
+import argparse
+import threading
+
+from pymongo import MongoClient
+from pymongo.operations import SearchIndexModel
+
+from dates import parse_document_date
+from rollups import ROLLUP_COLLECTION
+from verdict_cache import VerdictCache
+
+SCHEMA_VERSION = 6
+SCHEMA_ID = "invoice_processor"
+DEFAULT_VERDICT_TTL_SECONDS = 30 * 24 * 3600
+
+_checked = set()
+_lock = threading.Lock()
+
+
+def migrate_document_dates(db) -> int:
+    """Convert string date fields on documents to BSON datetimes. Returns documents converted."""
+    converted = 0
+    for doc in db.documents.find({"date": {"$type": "string"}}, {"date": 1}):
+        parsed = parse_document_date(doc["date"])
+        if parsed is None:
+            print(f"Leaving unparseable date {doc['date']!r} on {doc['_id']}")
+            continue
+        db.documents.update_one(
+            {"_id": doc["_id"]},
+            {"$set": {"date": parsed, "date_text": doc["date"]}}
+        )
+        converted += 1
+    return converted
+
+
+def get_schema_version(db) -> int:
+    """Return the schema version recorded in the database (0 if never bootstrapped)."""
+    info = db.schema_info.find_one({"_id": SCHEMA_ID})
+    return info["version"] if info else 0
+
+
+def vector_index_definition(dimensions: int = 768, similarity: str = "cosine") -> Dict:
+    """Atlas Vector Search definition for merchant_embedding."""
+    return {
+        "fields": [
+            {
+                "type": "vector",
+                "path": "merchant_embedding",
+                "similarity": similarity,
+                "numDimensions": dimensions,
+            }
+        ]
+    }
+
+
+def bootstrap_schema(
+    db,
+    dimensions: int = 768,
+    vector_search: bool = True,
+    verdict_ttl_seconds: Optional[float] = DEFAULT_VERDICT_TTL_SECONDS,
+    similarity: str = "cosine"
+) -> bool:
+    """
+    Create all indexes and record SCHEMA_VERSION. Safe to re-run.
+
+    Returns True if every index was created (and the version recorded).
+    """
+    merchants = db.merchants
+    documents = db.documents
+
+    definition = vector_index_definition(dimensions, similarity)
+    search_index_model = SearchIndexModel(
+        definition=definition,
+        name="merchant_vector_index",
+        type="vectorSearch",
+    )
+
+    try:
+        # Check if the search index exists (Atlas only)
+        if vector_search:
+            existing_indexes = {idx["name"]: idx for idx in merchants.list_search_indexes()}
+            existing = existing_indexes.get("merchant_vector_index")
+
+            if existing is None:
+                merchants.create_search_index(search_index_model)
+                print("Vector search index created successfully")
+            elif existing.get("latestDefinition") != definition:
+                # Storage format or dimension changed; Atlas rebuilds the index in place
+                merchants.update_search_index("merchant_vector_index", definition)
+                print(f"Vector search index updated ({similarity}, {dimensions} dimensions)")
+
+        # Create regular indexes for merchants collection
+        merchants.create_index("canonical_name", unique=True)
+        merchants.create_index("synonyms")
+
+        # Create indexes for documents collection
+        documents.create_index("merchant_id")  # Reference to merchant
+        documents.create_index("processed_date")
+        documents.create_index("merchant_name")  # For text search
+        documents.create_index("merchant_keys")  # Denormalized merchant name/synonym match
+        documents.create_index("total_amount_base")  # Currency-normalized amount
+        # Time-range queries per merchant / category
+        documents.create_index([("merchant_id", 1), ("date", 1)])
+        documents.create_index([("merchant_keys", 1), ("date", 1)])
+        documents.create_index([("category", 1), ("date", 1)])
+
+        # Spend rollups: merchant/date range reads and month/currency totals
+        rollups = db[ROLLUP_COLLECTION]
+        rollups.create_index([("merchant_id", 1), ("date", 1)])
+        rollups.create_index([("merchant_name", 1), ("date", 1)])
+        rollups.create_index([("merchant_keys", 1), ("date", 1)])
+        rollups.create_index([("month", 1), ("currency", 1)])
+
+        if verdict_ttl_seconds:
+            VerdictCache(db.merchant_verdicts, ttl_seconds=verdict_ttl_seconds).ensure_indexes()
+        print("All indexes created successfully")
+
+    except Exception as e:
+        print(f"Error creating indexes: {e}")
+        return False
+
+    recorded = {"version": SCHEMA_VERSION, "verdict_ttl_seconds": verdict_ttl_seconds}
+    if vector_search:
+        recorded["vector_index"] = definition
+    db.schema_info.update_one(
+        {"_id": SCHEMA_ID},
+        {"$set": recorded},
+        upsert=True
+    )
+    return True
+
+
+def ensure_schema(db, **bootstrap_kwargs) -> None:
+    """
+    Bootstrap the schema only if it is missing or out of date.
+
+    Guarded once per process and database, so repeated classifier construction
+    (e.g. on every Streamlit rerun) costs nothing after the first call. A
+    vector index definition that differs from the recorded one (new embedding
+    format or dimension) or verdict TTL also triggers a bootstrap.
+    """
+    key = (id(db.client), db.name)
+    if key in _checked:
+        return
+
+    with _lock:
+        if key in _checked:
+            return
+        info = db.schema_info.find_one({"_id": SCHEMA_ID}) or {}
+        current = info.get("version", 0) >= SCHEMA_VERSION
+        if current and bootstrap_kwargs.get("vector_search", True):
+            wanted = vector_index_definition(
+                bootstrap_kwargs.get("dimensions", 768),
+                bootstrap_kwargs.get("similarity", "cosine")
+            )
+            current = info.get("vector_index") == wanted
+        if current:
+            wanted_ttl = bootstrap_kwargs.get("verdict_ttl_seconds", DEFAULT_VERDICT_TTL_SECONDS)
+            current = not wanted_ttl or info.get("verdict_ttl_seconds") == wanted_ttl
+        if current or bootstrap_schema(db, **bootstrap_kwargs):
+            _checked.add(key)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Create indexes for the invoice processor database")
+    parser.add_argument("--mongodb-uri", required=True, help="MongoDB connection string")
+    parser.add_argument("--database", default="invoice_processor", help="Database name")
+    parser.add_argument("--dimensions", type=int, default=768, help="Embedding dimensions for the vector index")
+    parser.add_argument(
+        "--similarity",
+        choices=["cosine", "euclidean", "dotProduct"],
+        default="cosine",
+        help="Vector index similarity (euclidean for binary embeddings)"
+    )
+    parser.add_argument(
+        "--no-vector-search",
+        action="store_true",
+        help="Skip the Atlas Vector Search index (local/on-prem MongoDB)"
+    )
+    parser.add_argument(
+        "--migrate-dates",
+        action="store_true",
+        help="Also convert string date fields on existing documents to datetimes"
+    )
+    args = parser.parse_args()
+
+    client = MongoClient(args.mongodb_uri)
+    db = client[args.database]
+    print(f"Current schema version: {get_schema_version(db)}")
+    if bootstrap_schema(
+        db,
+        dimensions=args.dimensions,
+        vector_search=not args.no_vector_search,
+        similarity=args.similarity
+    ):
+        print(f"Schema is at version {SCHEMA_VERSION}")
+    if args.migrate_dates:
+        print(f"Converted dates on {migrate_document_dates(db)} documents")
+    client.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+from typing import Dict, Optional
+import threading
+
+from collection_refresher import CollectionRefresher
+
+
+class SynonymIndex:
+    """
+    In-process synonym -> merchant hash map mirroring the merchants collection.
+
+    Loaded once at startup, then kept fresh by a CollectionRefresher that tails
+    a change stream. Deployments without change streams (standalone mongod, a
+    local mongomock stand-in) fall back to reloading the map every
+    poll_interval seconds.
+    """
+
+    def __init__(self, merchants, poll_interval: float = 30.0):
+        self.merchants = merchants
+        self.poll_interval = poll_interval
+        self._by_synonym: Dict[str, Dict] = {}
+        self._by_id: Dict = {}
+        self._lock = threading.Lock()
+        self._refresher = CollectionRefresher(
+            merchants,
+            load=self.load,
+            apply=self._apply,
+            remove=self._remove,
+            poll_interval=poll_interval,
+            name="synonym-index"
+        )
+
+    def load(self) -> None:
+        """(Re)load the whole map from the merchants collection."""
+        by_synonym: Dict[str, Dict] = {}
+        by_id: Dict = {}
+        for merchant in self.merchants.find({}, {"canonical_name": 1, "synonyms": 1}):
+            entry = self._entry(merchant)
+            by_id[merchant["_id"]] = entry
+            for synonym in merchant.get("synonyms") or []:
+                by_synonym[synonym] = entry
+        with self._lock:
+            self._by_synonym = by_synonym
+            self._by_id = by_id
+
+    @property
+    def mode(self) -> Optional[str]:
+        """"change_stream" or "polling" once started."""
+        return self._refresher.mode
+
+    def start(self) -> "SynonymIndex":
+        """Open the change stream, load the map and start the background refresher."""
+        self._refresher.start()
+        return self
+
+    def close(self) -> None:
+        """Stop the background refresher."""
+        self._refresher.close()
+
+    def lookup(self, name: str) -> Optional[Dict]:
+        """Return {_id, canonical_name, synonyms} for an exact synonym, or None."""
+        with self._lock:
+            entry = self._by_synonym.get(name)
+            return dict(entry, synonyms=list(entry["synonyms"])) if entry else None
+
+    def add_synonym(self, merchant_id, canonical_name: str, synonym: str) -> None:
+        """Record a synonym written by this process without waiting for the refresher."""
+        with self._lock:
+            entry = self._by_id.get(merchant_id)
+            if entry is None:
+                entry = {"_id": merchant_id, "canonical_name": canonical_name, "synonyms": []}
+                self._by_id[merchant_id] = entry
+            if synonym not in entry["synonyms"]:
+                entry["synonyms"].append(synonym)
+            self._by_synonym[synonym] = entry
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._by_synonym)
+
+    def _apply(self, merchant: Dict) -> None:
+        entry = self._entry(merchant)
+        with self._lock:
+            self._drop_entry(merchant["_id"])
+            self._by_id[merchant["_id"]] = entry
+            for synonym in entry["synonyms"]:
+                self._by_synonym[synonym] = entry
+
+    def _remove(self, merchant_id) -> None:
+        with self._lock:
+            self._drop_entry(merchant_id)
+
+    def _drop_entry(self, merchant_id) -> None:
+        old = self._by_id.pop(merchant_id, None)
+        if old is None:
+            return
+        for synonym in old["synonyms"]:
+            if self._by_synonym.get(synonym) is old:
+                del self._by_synonym[synonym]
+
+    @staticmethod
+    def _entry(merchant: Dict) -> Dict:
+        return {
+            "_id": merchant["_id"],
+            "canonical_name": merchant.get("canonical_name"),
+            "synonyms": list(merchant.get("synonyms") or []),
+        }
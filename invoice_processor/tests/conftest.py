@@ -0,0 +1,174 @@
+import json
+import queue
+import sys
+import time
+import zlib
+from pathlib import Path
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+# The invoice_processor modules import each other as top-level modules
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+
+class FakeChangeStream:
+    """Iterates events pushed by WatchedCollection; ends after an invalidate, like pymongo's."""
+
+    def __init__(self):
+        self.events = queue.Queue()
+
+    def __iter__(self):
+        while True:
+            event = self.events.get()
+            if event is None:
+                return
+            yield event
+            if event["operationType"] == "invalidate":
+                return
+
+    def close(self):
+        self.events.put(None)
+
+
+class WatchedCollection:
+    """
+    mongomock collection with a minimal watch(): writes made through this
+    wrapper are pushed to every open stream, and drop() invalidates them.
+    """
+
+    def __init__(self, collection):
+        self.collection = collection
+        self.streams = []
+        self.watch_calls = 0
+
+    def __getattr__(self, name):
+        return getattr(self.collection, name)
+
+    def watch(self, **kwargs):
+        self.watch_calls += 1
+        stream = FakeChangeStream()
+        self.streams.append(stream)
+        return stream
+
+    def insert_one(self, document):
+        result = self.collection.insert_one(document)
+        self._push({"operationType": "insert", "fullDocument": self.collection.find_one(result.inserted_id)})
+        return result
+
+    def update_one(self, query, update, **kwargs):
+        result = self.collection.update_one(query, update, **kwargs)
+        for document in self.collection.find(query):
+            self._push({"operationType": "update", "fullDocument": document})
+        return result
+
+    def drop(self):
+        self.collection.drop()
+        self._push({"operationType": "drop"})
+        self._push({"operationType": "invalidate"})
+
+    def _push(self, event):
+        for stream in self.streams:
+            stream.events.put(event)
+
+
+@pytest.fixture
+def watched_merchants():
+    mongomock = pytest.importorskip("mongomock")
+    return WatchedCollection(mongomock.MongoClient().db.merchants)
+
+
+def wait_until(condition, timeout=5.0):
+    """Poll condition() until it is true or timeout seconds pass. Returns its last value."""
+    deadline = time.monotonic() + timeout
+    while not condition() and time.monotonic() < deadline:
+        time.sleep(0.01)
+    return condition()
+
+
+class FakeModel:
+    """
+    Unrelated unit vectors per name, so only exact synonyms match without the LLM.
+    Names in aliases encode like the name they map to; encoded records every text.
+    """
+
+    def __init__(self, aliases=None):
+        self.aliases = aliases or {}
+        self.encoded = []
+
+    def get_sentence_embedding_dimension(self):
+        return 16
+
+    def encode(self, texts):
+        self.encoded.extend(texts)
+        texts = [self.aliases.get(text, text) for text in texts]
+        vectors = [np.random.default_rng(zlib.crc32(text.encode())).normal(size=16) for text in texts]
+        return np.array([vector / np.linalg.norm(vector) for vector in vectors], dtype=np.float32)
+
+
+class FakeLLM:
+    """Returns queued verdicts and records the names it was asked about."""
+
+    def __init__(self, *verdicts):
+        self.verdicts = list(verdicts)
+        self.prompts = []
+        self.messages = self
+
+    def create(self, **params):
+        self.prompts.append(params["messages"][0]["content"])
+        return SimpleNamespace(content=[SimpleNamespace(text=json.dumps(self.verdicts.pop(0)))])
+
+
+def verdict(is_new, canonical_name, confidence=0.9):
+    return {"is_new_merchant": is_new, "canonical_name": canonical_name, "confidence": confidence, "reasoning": ""}
+
+
+class AsyncCursor:
+    """Aggregate cursor of AsyncCollection."""
+
+    def __init__(self, cursor):
+        self.cursor = cursor
+
+    async def to_list(self, length=None):
+        return list(self.cursor)
+
+
+class AsyncCollection:
+    """Awaitable facade over a mongomock collection, shaped like pymongo's AsyncCollection."""
+
+    def __init__(self, collection):
+        self.collection = collection
+
+    def __getattr__(self, name):
+        method = getattr(self.collection, name)
+
+        async def call(*args, **kwargs):
+            result = method(*args, **kwargs)
+            return AsyncCursor(result) if name == "aggregate" else result
+
+        return call
+
+
+class AsyncDatabase:
+    def __init__(self, db):
+        self.db = db
+
+    def __getattr__(self, name):
+        return AsyncCollection(self.db[name])
+
+    def __getitem__(self, name):
+        return AsyncCollection(self.db[name])
+
+
+class AsyncClient:
+    """Stands in for AsyncMongoClient over a mongomock client."""
+
+    def __init__(self, client):
+        self.client = client
+
+    def __getitem__(self, name):
+        return AsyncDatabase(self.client[name])
+
+    async def close(self):
+        self.client.close()
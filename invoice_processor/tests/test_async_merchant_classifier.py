@@ -0,0 +1,106 @@
+import asyncio
+
+import pytest
+
+mongomock = pytest.importorskip("mongomock")
+
+import async_merchant_classifier
+from async_merchant_classifier import AsyncMultilingualMerchantClassifier
+from conftest import AsyncClient, FakeLLM, FakeModel, verdict
+from synonym_index import SynonymIndex
+from vector_backends import LocalVectorIndex
+
+
+class AsyncFakeLLM(FakeLLM):
+    """FakeLLM with an awaitable messages.create, like anthropic.AsyncAnthropic."""
+
+    async def create(self, **params):
+        return super().create(**params)
+
+
+@pytest.fixture
+def model():
+    return FakeModel(aliases={"grab sg": "Grab Singapore"})
+
+
+@pytest.fixture
+def db():
+    return mongomock.MongoClient().cathay
+
+
+@pytest.fixture
+def make_classifier(monkeypatch, model, db):
+    monkeypatch.setattr(async_merchant_classifier, "get_model", lambda *args, **kwargs: model)
+    db.merchants.create_index("canonical_name", unique=True)
+    classifiers = []
+
+    def make(**options):
+        options.setdefault("vector_backend", LocalVectorIndex(16))
+        classifier = AsyncMultilingualMerchantClassifier(
+            client=AsyncClient(db.client),
+            use_synonym_index=False,
+            verdict_ttl_seconds=None,
+            **options
+        )
+        classifiers.append(classifier)
+        return classifier
+
+    yield make
+    for classifier in classifiers:
+        asyncio.run(classifier.close())
+
+
+def test_empty_local_index_is_used_instead_of_atlas(make_classifier, db):
+    classifier = make_classifier()
+    llm = AsyncFakeLLM(verdict(True, "Grab Singapore"))
+
+    created = asyncio.run(classifier.classify_merchant("Grab Singapore", llm))
+    synonym = asyncio.run(classifier.classify_merchant("grab sg", llm))
+
+    assert created["is_synonym"] is False
+    assert synonym["merchant_id"] == created["merchant_id"]
+    assert synonym["is_synonym"] is True
+    assert synonym["confidence"] == pytest.approx(1.0)
+    assert len(llm.prompts) == 1
+    assert db.merchants.find_one()["synonyms"] == ["grab sg"]
+
+
+def test_exact_synonyms_skip_the_llm_vector_search_and_write(make_classifier, model, db, monkeypatch):
+    grab = db.merchants.insert_one({"canonical_name": "Grab", "synonyms": ["Grab Taxi"]}).inserted_id
+    gojek = db.merchants.insert_one({"canonical_name": "Gojek", "synonyms": ["GOJEK SG"]}).inserted_id
+    synonym_index = SynonymIndex(db.merchants)
+    synonym_index.load()
+    db.merchants.update_one({"_id": grab}, {"$push": {"synonyms": "GRAB SG"}})
+    classifier = make_classifier(synonym_index=synonym_index)
+
+    def no_search(*args, **kwargs):
+        raise AssertionError("vector search for an exact synonym")
+
+    def no_write(*args, **kwargs):
+        raise AssertionError("write for an exact synonym")
+
+    monkeypatch.setattr(classifier.vector_backend, "search", no_search)
+    monkeypatch.setattr(db.merchants, "find_one_and_update", no_write)
+    results = asyncio.run(classifier.classify_merchants(["Grab Taxi", "GOJEK SG", "GRAB SG"], AsyncFakeLLM()))
+
+    # From the in-process index, then (not yet in the index) from MongoDB
+    assert [(result["merchant_id"], result["is_synonym"], result["confidence"]) for result in results] == [
+        (grab, True, 1.0),
+        (gojek, True, 1.0),
+        (grab, True, 1.0),
+    ]
+    assert model.encoded == []
+
+
+def test_classify_merchants_dedupes_and_keeps_input_order(make_classifier, db):
+    classifier = make_classifier()
+    llm = AsyncFakeLLM(verdict(True, "Grab"), verdict(True, "Gojek"))
+
+    results = asyncio.run(classifier.classify_merchants(["Grab", "Gojek", "Grab", "Gojek"], llm, concurrency=1))
+
+    assert [result["canonical_name"] for result in results] == ["Grab", "Gojek", "Grab", "Gojek"]
+    assert results[0] == results[2]
+    assert results[1] == results[3]
+    assert results[0]["merchant_id"] != results[1]["merchant_id"]
+    assert len(llm.prompts) == 2
+    assert db.merchants.count_documents({}) == 2
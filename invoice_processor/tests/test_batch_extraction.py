@@ -0,0 +1,70 @@
+from pathlib import Path
+
+import pytest
+
+mongomock = pytest.importorskip("mongomock")
+
+from batch_extraction import FakeBatchClient, request_id_for, run_batch_extraction
+from extraction_cache import ExtractionCache
+
+
+class FakeClassifier:
+    """Resolves every name to a merchant of its own, without embeddings or an LLM."""
+
+    def __init__(self):
+        self.calls = []
+
+    def classify_merchants(self, names, llm_client, languages=None):
+        self.calls.append(list(names))
+        return [
+            {"merchant_id": name, "canonical_name": name, "is_synonym": False, "confidence": 1.0}
+            for name in names
+        ]
+
+    def get_synonyms_by_name(self, canonical_names):
+        return {name: [] for name in canonical_names}
+
+
+def write_pdfs(directory: Path, contents):
+    paths = []
+    for i, content in enumerate(contents):
+        path = directory / f"receipt_{i}.pdf"
+        path.write_bytes(content)
+        paths.append(path)
+    return paths
+
+
+def test_run_batch_extraction_stores_results_errors_and_cache_hits(tmp_path):
+    db = mongomock.MongoClient().db
+    cache = ExtractionCache(db.extraction_cache)
+    paths = write_pdfs(tmp_path, [b"%PDF grab", b"%PDF gojek", b"%PDF broken"])
+    broken_id = request_id_for(b"%PDF broken")
+    responded = []
+
+    def responder(custom_id, params):
+        responded.append(custom_id)
+        if custom_id == broken_id:
+            raise RuntimeError("invalid_request_error")
+        merchant = "Grab" if custom_id == request_id_for(b"%PDF grab") else "Gojek"
+        return {"merchant_name": merchant, "total_amount": 12.5, "currency": "SGD", "date": "2025-03-01"}
+
+    claude = FakeBatchClient(responder, polls_until_ended=0)
+    stats = run_batch_extraction(paths, db, claude, FakeClassifier(), cache, poll_interval=0)
+
+    assert stats["written"] == 2
+    assert stats["failed"] == 1
+    assert stats["failures"][0][0] == str(paths[2])
+    assert "errored" in stats["failures"][0][1]
+    assert len(stats["batches"]) == 1
+    assert sorted(doc["merchant_name"] for doc in db.documents.find()) == ["Gojek", "Grab"]
+    assert len(responded) == 3
+
+    # Re-run: the two successes come from the extraction cache, only the error is resubmitted
+    responded.clear()
+    stats = run_batch_extraction(paths, db, claude, FakeClassifier(), cache, poll_interval=0)
+
+    assert responded == [broken_id]
+    assert stats["written"] == 2
+    assert stats["failed"] == 1
+    assert cache.stats()["hits"] == 2
+    assert db.documents.count_documents({}) == 4
@@ -0,0 +1,30 @@
+from datetime import datetime
+
+import pytest
+
+from dates import parse_document_date, rollup_day
+
+
+@pytest.mark.parametrize("value, expected", [
+    ("2025-03-01", datetime(2025, 3, 1)),
+    ("2025-03-01T10:30:00+08:00", datetime(2025, 3, 1, 2, 30)),
+    ("2025-03-01T02:30:00Z", datetime(2025, 3, 1, 2, 30)),
+    ("01/03/2025", datetime(2025, 3, 1)),
+    ("1 Mar 2025", datetime(2025, 3, 1)),
+    ("March 1, 2025", datetime(2025, 3, 1)),
+    (datetime(2025, 3, 1), datetime(2025, 3, 1)),
+])
+def test_parses_receipt_dates(value, expected):
+    assert parse_document_date(value) == expected
+
+
+@pytest.mark.parametrize("value", [None, "", "  ", "next Tuesday", 20250301])
+def test_unparseable_dates_return_none(value):
+    assert parse_document_date(value) is None
+
+
+def test_rollup_day_truncates_datetimes_and_strings():
+    assert rollup_day(datetime(2025, 3, 1, 14, 30)) == datetime(2025, 3, 1)
+    assert rollup_day("2025-03-01T14:30:00") == datetime(2025, 3, 1)
+    assert rollup_day("01/03/2025") is None
+    assert rollup_day(None) is None
@@ -0,0 +1,50 @@
+import numpy as np
+
+from embedding_cache import EmbeddingCache, cache_namespace
+
+
+class CountingModel:
+    def __init__(self, offset=0.0):
+        self.offset = offset
+        self.calls = []
+
+    def encode(self, texts):
+        self.calls.append(list(texts))
+        return np.array([[len(text) + self.offset, 1.0] for text in texts], dtype=np.float32)
+
+
+def test_encode_only_misses_once_per_normalized_text():
+    cache = EmbeddingCache("model", maxsize=10)
+    model = CountingModel()
+
+    first = cache.encode(model, ["Grab", " Grab ", "Gojek"])
+    second = cache.encode(model, "Grab")
+
+    assert model.calls == [["Grab", "Gojek"]]
+    assert np.array_equal(first[0], first[1])
+    assert np.array_equal(second, first[0])
+    assert cache.stats()["hits"] == 1
+
+
+def test_lru_evicts_oldest_entry():
+    cache = EmbeddingCache("model", maxsize=2)
+    model = CountingModel()
+    cache.encode(model, ["a", "bb", "ccc"])
+
+    assert cache.get("a") is None
+    assert cache.get("ccc") is not None
+
+
+def test_disk_cache_is_separate_per_model_variant(tmp_path):
+    path = str(tmp_path / "embeddings.sqlite")
+    torch_cache = EmbeddingCache("mpnet", path=path)
+    torch_cache.encode(CountingModel(), ["Grab"])
+
+    onnx_model = CountingModel(offset=0.5)
+    onnx_cache = EmbeddingCache("mpnet", path=path, backend="onnx", file_name="onnx/model_qint8_avx2.onnx")
+    onnx_vector = onnx_cache.encode(onnx_model, "Grab")
+
+    assert onnx_model.calls == [["Grab"]]
+    assert onnx_vector[0] == 4.5
+    assert EmbeddingCache("mpnet", path=path).get("Grab")[0] == 4.0
+    assert cache_namespace("mpnet") == "mpnet"
@@ -0,0 +1,69 @@
+import numpy as np
+import pytest
+from bson import BSON
+
+from embedding_codec import RESCORE_FIELD, EmbeddingCodec, fit_pca, load_projection, save_projection
+
+
+def random_vectors(count, dimensions=64, seed=0):
+    return np.random.default_rng(seed).normal(size=(count, dimensions)).astype(np.float32)
+
+
+def bson_round_trip(fields):
+    """Store and read back through BSON, as MongoDB would."""
+    return BSON.decode(BSON.encode(fields))
+
+
+@pytest.mark.parametrize("embedding_format, min_cosine", [
+    ("float", 0.9999),
+    ("float32", 0.9999),
+    ("int8", 0.999),
+])
+def test_stored_vectors_decode_close_to_the_original(embedding_format, min_cosine):
+    codec = EmbeddingCodec(embedding_format)
+    for vector in random_vectors(5):
+        stored = bson_round_trip(codec.stored_fields(vector))
+        assert codec.cosine(vector, codec.stored_vector(stored)) >= min_cosine
+
+
+def test_binary_keeps_an_int8_copy_for_rescoring():
+    codec = EmbeddingCodec("binary")
+    vector = random_vectors(1)[0]
+    stored = bson_round_trip(codec.stored_fields(vector))
+
+    assert RESCORE_FIELD in stored
+    # The sign bits alone cap an identical vector at about 0.8
+    assert codec.cosine(vector, stored["merchant_embedding"]) < 0.9
+    assert codec.cosine(vector, codec.stored_vector(stored)) >= 0.999
+    bits = codec.decode(stored["merchant_embedding"])
+    assert set(np.unique(np.sign(bits))) == {-1.0, 1.0}
+
+
+def test_truncation_reduces_and_normalizes():
+    codec = EmbeddingCodec("float", dimensions=16)
+    reduced = codec.reduce(random_vectors(1)[0])
+
+    assert reduced.shape == (16,)
+    assert np.linalg.norm(reduced) == pytest.approx(1.0)
+    assert codec.index_dimensions(64) == 16
+
+
+def test_pca_projection_round_trips_through_a_file(tmp_path):
+    vectors = random_vectors(100)
+    path = str(tmp_path / "projection.npz")
+    save_projection(path, fit_pca(vectors, 8))
+
+    codec = EmbeddingCodec("int8", projection=path)
+    stored = bson_round_trip(codec.stored_fields(vectors[0]))
+
+    assert codec.dimensions == 8
+    assert load_projection(path)["components"].shape == (8, 64)
+    assert codec.decode(stored["merchant_embedding"]).shape == (8,)
+    assert codec.cosine(vectors[0], stored["merchant_embedding"]) >= 0.999
+
+
+def test_invalid_configurations_are_rejected():
+    with pytest.raises(ValueError):
+        EmbeddingCodec("float16")
+    with pytest.raises(ValueError):
+        EmbeddingCodec("binary", dimensions=12)
@@ -0,0 +1,64 @@
+from datetime import datetime
+
+import pytest
+
+from fx_rates import FxRateTable, load_fx_table, normalize_currency
+
+RATES = """date,currency,rate
+2025-01-03,USD,1.36
+2025-01-02,USD,1.35
+2025-01-06,USD,1.37
+2025-01-02,RM,0.30
+not-a-date,USD,9.99
+"""
+
+
+@pytest.fixture
+def rates_path(tmp_path):
+    path = tmp_path / "fx_rates.csv"
+    path.write_text(RATES)
+    return path
+
+
+@pytest.fixture
+def fx_table(rates_path):
+    return FxRateTable.from_csv(str(rates_path))
+
+
+def test_currency_aliases():
+    assert normalize_currency(" us$ ") == "USD"
+    assert normalize_currency("RM") == "MYR"
+    assert normalize_currency("sgd") == "SGD"
+    assert normalize_currency("") is None
+
+
+def test_rate_for_the_receipt_day(fx_table):
+    assert fx_table.currencies() == ["MYR", "USD"]
+    assert fx_table.rate("USD", datetime(2025, 1, 3, 18, 45)) == 1.36
+    assert fx_table.rate("US$", "2025-01-02") == 1.35
+    assert fx_table.rate("SGD", datetime(2025, 1, 3)) == 1.0
+
+
+def test_rate_falls_back_to_the_closest_earlier_day(fx_table):
+    # Saturday and Sunday have no fixing
+    assert fx_table.rate("USD", datetime(2025, 1, 5)) == 1.36
+    assert fx_table.rate("USD", None) == 1.37
+    assert fx_table.rate("USD", datetime(2025, 1, 1)) is None
+    assert fx_table.rate("EUR", datetime(2025, 1, 3)) is None
+
+
+def test_normalize_converts_an_invoice(fx_table):
+    invoice = {"total_amount": 42.5, "currency": "RM", "date": datetime(2025, 1, 4)}
+
+    assert fx_table.normalize(invoice) == {
+        "total_amount_base": 12.75,
+        "base_currency": "SGD",
+        "fx_rate": 0.30,
+    }
+    assert fx_table.normalize({"total_amount": "42.50", "currency": "USD"}) == {}
+    assert fx_table.normalize({"total_amount": 10, "currency": "EUR"}) == {}
+
+
+def test_load_fx_table_is_cached_per_file(rates_path):
+    assert load_fx_table(str(rates_path)) is load_fx_table(str(rates_path))
+    assert load_fx_table(str(rates_path), "usd").base_currency == "USD"
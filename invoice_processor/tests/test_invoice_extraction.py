@@ -0,0 +1,71 @@
+from types import SimpleNamespace
+
+import pytest
+
+mongomock = pytest.importorskip("mongomock")
+
+from extraction_cache import ExtractionCache
+from invoice_extraction import EXTRACTION_SCHEMA_VERSION, extract_metadata_with_claude, extraction_version
+
+FULL = {"merchant_name": "Grab", "total_amount": 24.31, "currency": "SGD"}
+
+
+class FakeClaude:
+    """Returns one queued tool input per messages.create call."""
+
+    def __init__(self, *responses):
+        self.responses = list(responses)
+        self.sent = []
+        self.messages = self
+
+    def create(self, **params):
+        self.sent.append(params["messages"][0]["content"][0]["source"]["data"])
+        block = SimpleNamespace(type="tool_use", input=self.responses.pop(0))
+        return SimpleNamespace(content=[block])
+
+
+@pytest.fixture
+def cache():
+    return ExtractionCache(mongomock.MongoClient().db.extraction_cache)
+
+
+def test_trimmed_extraction_is_cached_under_its_page_selection(cache):
+    claude = FakeClaude(FULL)
+
+    assert extract_metadata_with_claude(claude, b"%PDF full", cache=cache, send_bytes=b"%PDF p1", pages=[0, 3]) == FULL
+
+    assert cache.get(b"%PDF full", EXTRACTION_SCHEMA_VERSION) is None
+    assert cache.get(b"%PDF full", extraction_version([0, 3])) == FULL
+    # The same selection is served from the cache; the whole document is not
+    assert extract_metadata_with_claude(claude, b"%PDF full", cache=cache, send_bytes=b"%PDF p1", pages=[0, 3]) == FULL
+    assert len(claude.sent) == 1
+    claude.responses.append(FULL)
+    extract_metadata_with_claude(claude, b"%PDF full", cache=cache)
+    assert len(claude.sent) == 2
+
+
+def test_incomplete_trimmed_extraction_retries_and_caches_whole_document(cache):
+    claude = FakeClaude({"merchant_name": "Grab", "total_amount": None, "currency": "SGD"}, FULL)
+
+    assert extract_metadata_with_claude(claude, b"%PDF full", cache=cache, send_bytes=b"%PDF p1", pages=[0]) == FULL
+
+    assert len(claude.sent) == 2
+    assert cache.get(b"%PDF full", EXTRACTION_SCHEMA_VERSION) == FULL
+    assert cache.get(b"%PDF full", extraction_version([0])) is None
+
+
+def test_trimmed_send_without_pages_is_not_cached(cache):
+    extract_metadata_with_claude(FakeClaude(FULL), b"%PDF full", cache=cache, send_bytes=b"%PDF p1")
+
+    assert cache.collection.count_documents({}) == 0
+
+
+def test_cache_checked_skips_only_the_whole_document_lookup(cache):
+    extract_metadata_with_claude(FakeClaude(FULL), b"%PDF full", cache=cache, send_bytes=b"%PDF p1", pages=[0])
+    cache.hits = cache.misses = 0
+
+    extract_metadata_with_claude(
+        FakeClaude(), b"%PDF full", cache=cache, send_bytes=b"%PDF p1", pages=[0], cache_checked=True
+    )
+
+    assert cache.stats() == {"hits": 1, "misses": 0}
@@ -0,0 +1,56 @@
+import pytest
+
+mongomock = pytest.importorskip("mongomock")
+
+from invoice_templates import TemplateExtractor, compile_template
+
+TEXT = "Singapore Telecommunications Limited  Tax Invoice\nBill Date: 05 Mar 2025\nTotal Amount Due S$ 1,234.50"
+
+
+def singtel(**fields):
+    return {
+        "_id": "singtel",
+        "canonical_name": "Singtel",
+        "identify": ["Singapore Telecommunications Limited", "Tax Invoice"],
+        "fields": {
+            "date": {"pattern": r"Bill Date\s*:?\s*(\d{1,2} \w{3} \d{4})"},
+            "total_amount": {"pattern": r"Total Amount Due\s*S?\$\s*([\d,]+\.\d{2})"},
+            "currency": {"value": "SGD"},
+            **fields,
+        },
+    }
+
+
+def test_valid_template_fills_the_extraction_schema():
+    extractor = TemplateExtractor(mongomock.MongoClient().db.templates)
+    template = compile_template(singtel())
+
+    metadata, confidence = extractor.apply(template, TEXT)
+
+    assert confidence == 1.0
+    assert metadata == {
+        "merchant_name": "Singtel", "merchant_id": "singtel",
+        "date": "2025-03-05", "total_amount": 1234.5, "currency": "SGD",
+    }
+
+
+@pytest.mark.parametrize("spec, message", [
+    ({}, "needs a \"pattern\" or a \"value\""),
+    ({"regex": "Ref (\\d+)"}, "needs a \"pattern\" or a \"value\""),
+    ("Ref (\\d+)", "needs a \"pattern\" or a \"value\""),
+    ({"pattern": "Ref (\\d+"}, "invalid pattern for field 'reference'"),
+])
+def test_invalid_field_specs_are_rejected(spec, message):
+    with pytest.raises(ValueError, match="Template Singtel: .*" + message.replace("(", r"\(")):
+        compile_template(singtel(reference=spec))
+
+
+def test_load_skips_invalid_templates(capsys):
+    collection = mongomock.MongoClient().db.templates
+    collection.insert_many([singtel(), dict(singtel(reference={}), _id="broken", canonical_name="Broken")])
+
+    extractor = TemplateExtractor(collection)
+
+    assert extractor.stats()["templates"] == 1
+    assert [template["_id"] for template in extractor.match(TEXT)] == ["singtel"]
+    assert "field 'reference' needs a" in capsys.readouterr().out
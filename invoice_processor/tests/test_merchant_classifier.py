@@ -0,0 +1,112 @@
+import pytest
+
+mongomock = pytest.importorskip("mongomock")
+
+import merchant_classifier
+from conftest import FakeLLM, FakeModel, verdict
+from merchant_classifier import MultilingualMerchantClassifier
+
+
+@pytest.fixture
+def model():
+    return FakeModel(aliases={"grab sg": "Grab Singapore"})
+
+
+@pytest.fixture
+def classifier(monkeypatch, model):
+    monkeypatch.setattr(merchant_classifier, "get_model", lambda *args, **kwargs: model)
+    db = mongomock.MongoClient().db
+    db.merchants.create_index("canonical_name", unique=True)
+    classifier = MultilingualMerchantClassifier(
+        db=db,
+        vector_backend="local",
+        use_synonym_index=False,
+        ensure_indexes=False,
+        verdict_ttl_seconds=None
+    )
+    yield classifier
+    classifier.close()
+
+
+def test_new_merchant_then_confirmed_synonym(classifier):
+    llm = FakeLLM(verdict(True, "Grab"), verdict(False, "Grab"))
+
+    created = classifier.classify_merchant("Grab", llm)
+    classifier.documents.insert_one({"merchant_id": created["merchant_id"], "merchant_keys": ["grab"]})
+    synonym = classifier.classify_merchant("GRAB SG", llm)
+
+    assert created["is_synonym"] is False
+    assert synonym == {"merchant_id": created["merchant_id"], "canonical_name": "Grab", "is_synonym": True, "confidence": 0.9}
+    merchant = classifier.merchants.find_one({"_id": created["merchant_id"]})
+    assert merchant["synonyms"] == ["GRAB SG"]
+    assert merchant["metadata"]["source"] == "pdf_extraction"
+    assert classifier.documents.find_one()["merchant_keys"] == ["grab", "grab sg"]
+
+
+def test_known_synonym_skips_the_llm_and_the_write(classifier, monkeypatch):
+    merchant_id = classifier.merchants.insert_one({"canonical_name": "Grab", "synonyms": ["Grab Taxi"]}).inserted_id
+
+    def no_write(*args, **kwargs):
+        raise AssertionError("write for an exact synonym")
+
+    monkeypatch.setattr(classifier.merchants, "find_one_and_update", no_write)
+    result = classifier.classify_merchant("Grab Taxi", FakeLLM())
+
+    assert result == {"merchant_id": merchant_id, "canonical_name": "Grab", "is_synonym": True, "confidence": 1.0}
+
+
+def test_merchant_created_concurrently_is_returned_as_existing(classifier):
+    merchant_id = classifier.merchants.insert_one({"canonical_name": "Gojek", "synonyms": []}).inserted_id
+
+    result = classifier.classify_merchant("Gojek", FakeLLM(verdict(True, "Gojek")))
+
+    assert result["merchant_id"] == merchant_id
+    assert result["is_synonym"] is True
+    assert classifier.merchants.count_documents({}) == 1
+
+
+def test_batch_classifies_duplicates_once_in_input_order(classifier):
+    llm = FakeLLM(verdict(True, "Grab"), verdict(True, "Gojek"))
+
+    results = classifier.classify_merchants(["Grab", "Gojek", "Grab", "Gojek"], llm)
+
+    assert [result["canonical_name"] for result in results] == ["Grab", "Gojek", "Grab", "Gojek"]
+    assert results[0] == results[2]
+    assert results[1] == results[3]
+    assert results[0]["merchant_id"] != results[1]["merchant_id"]
+    assert len(llm.prompts) == 2
+    assert classifier.merchants.count_documents({}) == 2
+
+
+def test_batch_resolves_exact_synonyms_without_llm_or_vector_search(classifier, model, monkeypatch):
+    grab = classifier.merchants.insert_one({"canonical_name": "Grab", "synonyms": ["Grab Taxi", "GRAB SG"], "merchant_embedding": [0.5] * 16}).inserted_id
+    gojek = classifier.merchants.insert_one({"canonical_name": "Gojek", "synonyms": ["Gojek"]}).inserted_id
+
+    def no_search(*args, **kwargs):
+        raise AssertionError("vector search for an exact synonym")
+
+    monkeypatch.setattr(classifier.vector_backend, "search", no_search)
+    results = classifier.classify_merchants(["GRAB SG", "Gojek", "Grab Taxi"], FakeLLM())
+
+    assert [(result["merchant_id"], result["is_synonym"], result["confidence"]) for result in results] == [
+        (grab, True, 1.0),
+        (gojek, True, 1.0),
+        (grab, True, 1.0),
+    ]
+    assert model.encoded == []
+    assert "merchant_embedding" not in classifier.find_closest_merchants(["GRAB SG"])["GRAB SG"][0]
+
+
+def test_batch_attaches_later_near_duplicate_to_merchant_created_earlier(classifier):
+    llm = FakeLLM(verdict(True, "Grab Singapore"))
+
+    first, second = classifier.classify_merchants(["Grab Singapore", "grab sg"], llm)
+
+    assert first["is_synonym"] is False
+    assert second["merchant_id"] == first["merchant_id"]
+    assert second["canonical_name"] == "Grab Singapore"
+    assert second["is_synonym"] is True
+    assert second["confidence"] == pytest.approx(1.0)
+    assert len(llm.prompts) == 1
+    assert classifier.merchants.count_documents({}) == 1
+    assert classifier.merchants.find_one()["synonyms"] == ["grab sg"]
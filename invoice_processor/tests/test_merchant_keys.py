@@ -0,0 +1,23 @@
+from merchant_keys import merchant_keys, normalize_key_literals
+
+
+def test_keys_are_casefolded():
+    assert merchant_keys("Bäckerei Straße", ["BÄCKEREI  STRASSE", "bäckerei straße"]) == ["bäckerei strasse"]
+
+
+def test_lowercased_literals_match_casefolded_keys():
+    pipeline = [
+        {"$match": {
+            "merchant_keys": "bäckerei straße",
+            "$or": [{"merchant_keys": {"$in": ["Maß Haus", "grab  sg"]}}, {"category": "Straße"}],
+        }},
+        {"$group": {"_id": "$merchant_keys", "total": {"$sum": "$total_amount"}}},
+    ]
+
+    assert normalize_key_literals(pipeline) == [
+        {"$match": {
+            "merchant_keys": "bäckerei strasse",
+            "$or": [{"merchant_keys": {"$in": ["mass haus", "grab sg"]}}, {"category": "Straße"}],
+        }},
+        {"$group": {"_id": "$merchant_keys", "total": {"$sum": "$total_amount"}}},
+    ]
@@ -0,0 +1,23 @@
+import pytest
+
+from mongo_pool import ConnectionPoolMetrics, client_options, create_client
+
+
+def test_client_options_translate_pool_settings():
+    assert client_options({"max_pool_size": 20, "compressors": ["zstd", "zlib"]}) == {
+        "maxPoolSize": 20,
+        "compressors": "zstd,zlib",
+    }
+    with pytest.raises(ValueError):
+        client_options({"pool_size": 20})
+
+
+def test_create_client_returns_its_metrics_listener():
+    metrics = ConnectionPoolMetrics()
+    client, listener = create_client("mongodb://localhost:1", {"max_pool_size": 5}, metrics=metrics)
+    try:
+        assert listener is metrics
+        assert client.options.pool_options.max_pool_size == 5
+        assert metrics in client.options.event_listeners
+    finally:
+        client.close()
@@ -0,0 +1,25 @@
+from pdf_preprocess import select_pages
+
+HEADER = "GRAB HOLDINGS PTE LTD  Statement of account for March, customer reference 12345"
+ITEMS = "Ride 01/03 Orchard to Raffles Place 12.50 Ride 02/03 Bugis to Tanjong Pagar 9.80"
+FILLER = "Terms and conditions apply to every ride booked through the application, see site"
+TOTALS = "Subtotal 22.30 GST 2.01 Total amount due 24.31 thank you for riding with us today"
+
+
+def test_short_documents_and_scans_are_sent_whole():
+    assert select_pages([HEADER, TOTALS], max_pages=2) is None
+    assert select_pages(["", "", ""], max_pages=2) is None
+    assert select_pages([HEADER, FILLER, FILLER], max_pages=2) is None
+
+
+def test_keeps_header_and_last_totals_page():
+    assert select_pages([HEADER, ITEMS, FILLER, TOTALS], max_pages=2) == [0, 3]
+    assert select_pages([HEADER, ITEMS, FILLER, TOTALS], max_pages=3) == [0, 1, 3]
+
+
+def test_never_returns_more_than_max_pages():
+    pages = [HEADER, ITEMS, ITEMS, FILLER, TOTALS]
+    for max_pages in range(1, len(pages)):
+        assert len(select_pages(pages, max_pages=max_pages)) <= max_pages
+    assert select_pages(pages, max_pages=1) == [0]
+    assert select_pages(pages, max_pages=0) is None
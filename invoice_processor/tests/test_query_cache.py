@@ -0,0 +1,88 @@
+from datetime import datetime, timedelta
+import hashlib
+
+import numpy as np
+import pytest
+
+mongomock = pytest.importorskip("mongomock")
+
+from query_cache import SemanticQueryCache, has_relative_dates, query_entities
+
+DIMENSIONS = 64
+RESULT = {"pipeline": [{"$match": {"merchant_keys": "grab"}}], "collection": "documents", "explanation": "Grab"}
+
+
+def encode(text):
+    """Character-trigram hash embedding: similar strings get similar vectors."""
+    padded = f" {text.lower()} "
+    vector = np.zeros(DIMENSIONS, dtype=np.float32)
+    for i in range(len(padded) - 2):
+        vector[int(hashlib.md5(padded[i:i + 3].encode()).hexdigest(), 16) % DIMENSIONS] += 1
+    return vector
+
+
+@pytest.fixture
+def db():
+    db = mongomock.MongoClient().db
+    db.merchants.insert_many([
+        {"canonical_name": "Grab Singapore", "synonyms": ["Grab"]},
+        {"canonical_name": "Gojek", "synonyms": []},
+    ])
+    return db
+
+
+def make_cache(db, **kwargs):
+    return SemanticQueryCache(db.query_cache, encode, DIMENSIONS, threshold=0.8, merchants=db.merchants, **kwargs)
+
+
+def test_entities_include_known_merchants_in_any_case_or_position():
+    known = frozenset({"grab", "gojek"})
+    assert query_entities("grab spending", known) == {"grab"}
+    assert query_entities("Grab spending in March", known) == {"grab", "march"}
+    assert query_entities("total for gojek", known) == {"gojek"}
+
+
+def test_relative_dates_are_detected():
+    assert has_relative_dates("Grab spending last month")
+    assert has_relative_dates("spend so far this year")
+    assert not has_relative_dates("Grab spending in March 2025")
+
+
+def test_similar_query_hits_and_other_merchant_misses(db):
+    cache = make_cache(db)
+    cache.store("Grab spending in March", RESULT)
+
+    hit = cache.lookup("Grab spending in March?")
+    assert hit["pipeline"] == RESULT["pipeline"]
+    assert hit["cached_query"] == "Grab spending in March"
+    assert cache.lookup("gojek spending in March") is None
+    assert cache.stats()["hits"] == 1
+
+
+def test_relative_date_queries_are_never_cached(db):
+    cache = make_cache(db)
+    cache.store("Grab spending last month", RESULT)
+
+    assert db.query_cache.count_documents({}) == 0
+    assert cache.lookup("Grab spending last month") is None
+    assert cache.stats()["skipped"] == 1
+
+
+def test_entries_from_another_prompt_version_are_ignored(db):
+    make_cache(db, prompt_version="v1").store("Grab spending in March", RESULT)
+
+    assert make_cache(db, prompt_version="v2").lookup("Grab spending in March") is None
+    assert make_cache(db, prompt_version="v1").lookup("Grab spending in March") is not None
+
+
+def test_expired_entries_are_ignored_and_deleted_on_load(db):
+    cache = make_cache(db)
+    cache.store("Grab spending in March", RESULT)
+    db.query_cache.update_many({}, {"$set": {"created_at": datetime.utcnow() - timedelta(days=30)}})
+
+    reloaded = make_cache(db, ttl_seconds=7 * 24 * 3600)
+    assert db.query_cache.count_documents({}) == 0
+    assert reloaded.lookup("Grab spending in March") is None
+
+    cache.ttl_seconds = 0
+    assert cache.lookup("Grab spending in March") is None
@@ -0,0 +1,55 @@
+from query_plans import docs_examined, input_docs_estimate, winning_plan_stages
+
+IXSCAN_PLAN = {"stage": "FETCH", "inputStage": {"stage": "IXSCAN", "indexName": "merchant_keys_1_date_1"}}
+COLLSCAN_PLAN = {"stage": "COLLSCAN", "direction": "forward"}
+
+
+def test_rejected_plans_are_ignored():
+    explain = {
+        "queryPlanner": {"winningPlan": IXSCAN_PLAN, "rejectedPlans": [COLLSCAN_PLAN]},
+        "executionStats": {"totalDocsExamined": 42},
+    }
+
+    assert winning_plan_stages(explain) == ["FETCH", "IXSCAN"]
+    assert docs_examined(explain) == 42
+
+
+def test_cursor_stage_explain():
+    explain = {
+        "stages": [
+            {"$cursor": {"queryPlanner": {"winningPlan": COLLSCAN_PLAN, "rejectedPlans": [IXSCAN_PLAN]}}},
+            {"$group": {"_id": "$currency"}},
+        ]
+    }
+
+    assert winning_plan_stages(explain) == ["COLLSCAN"]
+    assert docs_examined(explain) is None
+
+
+def test_sharded_explains_read_every_shard():
+    per_shard = {
+        "shards": {
+            "shard-a": {"queryPlanner": {"winningPlan": IXSCAN_PLAN}, "executionStats": {"totalDocsExamined": 10}},
+            "shard-b": {"stages": [{"$cursor": {
+                "queryPlanner": {"winningPlan": COLLSCAN_PLAN},
+                "executionStats": {"totalDocsExamined": 5},
+            }}]},
+        }
+    }
+    merged = {
+        "queryPlanner": {"winningPlan": {"stage": "SHARD_MERGE", "shards": [
+            {"shardName": "shard-a", "winningPlan": IXSCAN_PLAN, "rejectedPlans": [COLLSCAN_PLAN]},
+        ]}}
+    }
+
+    assert winning_plan_stages(per_shard) == ["FETCH", "IXSCAN", "COLLSCAN"]
+    assert docs_examined(per_shard) == 15
+    assert winning_plan_stages(merged) == ["FETCH", "IXSCAN"]
+
+
+def test_input_docs_without_execution_stats_is_the_collection_count():
+    indexed = {"queryPlanner": {"winningPlan": IXSCAN_PLAN}}
+    executed = {"queryPlanner": {"winningPlan": IXSCAN_PLAN}, "executionStats": {"totalDocsExamined": 0}}
+
+    assert input_docs_estimate(indexed, 80000) == 80000
+    assert input_docs_estimate(executed, 80000) == 0
@@ -0,0 +1,110 @@
+import pytest
+from bson import ObjectId
+
+mongomock = pytest.importorskip("mongomock")
+
+from query_results import display_document, fetch_results_page, paginate_pipeline
+
+
+def test_pipelines_without_sort_get_an_id_tiebreak():
+    assert paginate_pipeline([{"$match": {"currency": "SGD"}}], 2, 10) == [
+        {"$match": {"currency": "SGD"}},
+        {"$sort": {"_id": 1}},
+        {"$skip": 20},
+        {"$limit": 11},
+    ]
+
+
+def test_final_sort_gets_an_id_tiebreak():
+    assert paginate_pipeline([{"$sort": {"total_amount": -1}}], 0, 10) == [
+        {"$sort": {"total_amount": -1, "_id": 1}},
+        {"$skip": 0},
+        {"$limit": 11},
+    ]
+    by_id = [{"$sort": {"_id": -1}}]
+    assert paginate_pipeline(by_id, 0, 10)[:1] == by_id
+
+
+def test_sort_before_order_preserving_stages_gets_the_tiebreak():
+    pipeline = [
+        {"$sort": {"total_amount": 1}},
+        {"$project": {"total_amount": 1}},
+        {"$limit": 100},
+    ]
+
+    assert paginate_pipeline(pipeline, 0, 10) == [
+        {"$sort": {"total_amount": 1, "_id": 1}},
+        {"$project": {"total_amount": 1}},
+        {"$limit": 100},
+        {"$skip": 0},
+        {"$limit": 11},
+    ]
+
+    db = mongomock.MongoClient().db
+    db.documents.insert_many([{"_id": 1, "total_amount": 50}, {"_id": 2, "total_amount": 5}, {"_id": 3, "total_amount": 20}])
+    rows, _ = fetch_results_page(db, pipeline[:2], 0, 10)
+    assert [row["total_amount"] for row in rows] == [5, 20, 50]
+
+
+def test_sort_before_group_is_not_trusted():
+    pipeline = [
+        {"$sort": {"date": 1}},
+        {"$group": {"_id": "$currency", "total": {"$sum": "$total_amount"}}},
+    ]
+
+    assert paginate_pipeline(pipeline, 1, 5)[2:] == [
+        {"$sort": {"_id": 1}},
+        {"$skip": 5},
+        {"$limit": 6},
+    ]
+
+    db = mongomock.MongoClient().db
+    db.documents.insert_many([{"currency": f"C{i}", "total_amount": i, "date": -i} for i in range(5)])
+    seen, page, has_next = [], 0, True
+    while has_next:
+        rows, has_next = fetch_results_page(db, pipeline, page, 2)
+        seen.extend(row["_id"] for row in rows)
+        page += 1
+    assert seen == [f"C{i}" for i in range(5)]
+
+
+def test_pages_on_tied_sort_key_cover_every_row_once():
+    db = mongomock.MongoClient().db
+    db.documents.insert_many([{"_id": i, "total_amount": 10} for i in range(7)])
+
+    seen, page, has_next = [], 0, True
+    while has_next:
+        rows, has_next = fetch_results_page(db, [{"$sort": {"total_amount": -1}}], page, 3)
+        seen.extend(row["_id"] for row in rows)
+        page += 1
+
+    assert seen == list(range(7))
+
+
+def test_pages_cover_every_row_once():
+    db = mongomock.MongoClient().db
+    db.documents.insert_many([{"_id": i, "total_amount": i % 3} for i in range(7)])
+
+    seen, page, has_next = [], 0, True
+    while has_next:
+        rows, has_next = fetch_results_page(db, [{"$match": {}}], page, 3)
+        seen.extend(row["_id"] for row in rows)
+        page += 1
+
+    assert seen == list(range(7))
+    assert page == 3
+
+
+def test_display_document_converts_nested_object_ids():
+    merchant_id = ObjectId()
+    doc = {
+        "_id": merchant_id,
+        "merchant": {"_id": merchant_id, "name": "Grab"},
+        "matches": [{"merchant_id": merchant_id}, [merchant_id], 3],
+    }
+
+    assert display_document(doc) == {
+        "_id": str(merchant_id),
+        "merchant": {"_id": str(merchant_id), "name": "Grab"},
+        "matches": [{"merchant_id": str(merchant_id)}, [str(merchant_id)], 3],
+    }
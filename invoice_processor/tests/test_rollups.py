@@ -0,0 +1,98 @@
+from datetime import datetime
+
+import pytest
+
+mongomock = pytest.importorskip("mongomock")
+
+from rollups import ROLLUP_COLLECTION, rebuild_spend_rollups, update_spend_rollups
+
+
+class BulkWriteAdapter:
+    """
+    Applies bulk_write UpdateOnes one at a time: mongomock's bulk_write does
+    not accept the `sort` option newer pymongo versions pass to UpdateOne.
+    """
+
+    def __init__(self, collection):
+        self.collection = collection
+
+    def __getattr__(self, name):
+        return getattr(self.collection, name)
+
+    def bulk_write(self, requests, ordered=True):
+        modified = upserted = 0
+        for request in requests:
+            result = self.collection.update_one(request._filter, request._doc, upsert=request._upsert)
+            modified += result.modified_count
+            upserted += 1 if result.upserted_id is not None else 0
+        return type("BulkWriteResult", (), {"modified_count": modified, "upserted_count": upserted})()
+
+
+class Database:
+    def __init__(self, db):
+        self.db = db
+
+    def __getattr__(self, name):
+        return getattr(self.db, name)
+
+    def __getitem__(self, name):
+        return BulkWriteAdapter(self.db[name])
+
+
+def receipt(amount, currency="SGD", date=datetime(2025, 3, 1, 14, 30), merchant_id="grab", base=None):
+    doc = {
+        "merchant_id": merchant_id,
+        "merchant_name": "Grab",
+        "merchant_keys": ["grab"],
+        "date": date,
+        "currency": currency,
+        "total_amount": amount,
+    }
+    if base is not None:
+        doc["total_amount_base"] = base
+    return doc
+
+
+@pytest.fixture
+def db():
+    return Database(mongomock.MongoClient().db)
+
+
+def rows(db):
+    return sorted(
+        ({key: row.get(key) for key in ("merchant_id", "date", "month", "currency", "total_amount", "count")}
+         for row in db.db[ROLLUP_COLLECTION].find()),
+        key=lambda row: (row["currency"], row["date"])
+    )
+
+
+def test_documents_accumulate_per_merchant_day_and_currency(db):
+    update_spend_rollups(db, [receipt(10.0), receipt(5.5, date=datetime(2025, 3, 1, 9))])
+    update_spend_rollups(db, [receipt(20.0, currency="MYR"), receipt(3.0, date=datetime(2025, 3, 2))])
+
+    assert rows(db) == [
+        {"merchant_id": "grab", "date": datetime(2025, 3, 1), "month": "2025-03",
+         "currency": "MYR", "total_amount": 20.0, "count": 1},
+        {"merchant_id": "grab", "date": datetime(2025, 3, 1), "month": "2025-03",
+         "currency": "SGD", "total_amount": 15.5, "count": 2},
+        {"merchant_id": "grab", "date": datetime(2025, 3, 2), "month": "2025-03",
+         "currency": "SGD", "total_amount": 3.0, "count": 1},
+    ]
+
+
+def test_base_amounts_are_summed_and_amountless_documents_skipped(db):
+    assert update_spend_rollups(db, [{"merchant_id": "grab", "total_amount": None}]) == 0
+    update_spend_rollups(db, [receipt(10.0, base=10.0), receipt(31.0, currency="MYR", base=9.3)])
+
+    assert sorted(row["total_amount_base"] for row in db.db[ROLLUP_COLLECTION].find()) == [9.3, 10.0]
+
+
+def test_rebuild_matches_incremental_updates(db):
+    docs = [receipt(10.0), receipt(5.0, currency="MYR"), receipt(7.0, date=datetime(2025, 4, 1))]
+    update_spend_rollups(db, docs)
+    incremental = rows(db)
+    db.db.documents.insert_many(docs)
+
+    rebuild_spend_rollups(db)
+
+    assert rows(db) == incremental
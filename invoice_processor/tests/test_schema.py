@@ -0,0 +1,63 @@
+import pytest
+
+mongomock = pytest.importorskip("mongomock")
+
+import schema
+
+
+@pytest.fixture
+def db(monkeypatch):
+    monkeypatch.setattr(schema, "_checked", set())
+    return mongomock.MongoClient().db
+
+
+@pytest.fixture
+def bootstraps(monkeypatch):
+    calls = []
+    real = schema.bootstrap_schema
+
+    def counting(db, **kwargs):
+        calls.append(kwargs)
+        return real(db, **kwargs)
+
+    monkeypatch.setattr(schema, "bootstrap_schema", counting)
+    return calls
+
+
+def test_bootstrap_creates_indexes_and_records_version(db):
+    assert schema.bootstrap_schema(db, vector_search=False, verdict_ttl_seconds=3600)
+
+    assert db.merchants.index_information()["canonical_name_1"]["unique"]
+    assert "merchant_keys_1_date_1" in db.documents.index_information()
+    assert db.merchant_verdicts.index_information()["verdict_ttl"]["expireAfterSeconds"] == 3600
+    assert schema.get_schema_version(db) == schema.SCHEMA_VERSION
+
+
+def test_bootstrap_is_idempotent(db):
+    assert schema.bootstrap_schema(db, vector_search=False)
+    assert schema.bootstrap_schema(db, vector_search=False)
+
+
+def test_ensure_schema_bootstraps_once_per_process(db, bootstraps):
+    schema.ensure_schema(db, vector_search=False)
+    schema.ensure_schema(db, vector_search=False)
+
+    assert len(bootstraps) == 1
+
+
+def test_ensure_schema_skips_ddl_on_a_bootstrapped_database(db, bootstraps, monkeypatch):
+    schema.ensure_schema(db, vector_search=False)
+    monkeypatch.setattr(schema, "_checked", set())  # a new process
+
+    schema.ensure_schema(db, vector_search=False)
+
+    assert len(bootstraps) == 1
+
+
+def test_ensure_schema_rebootstraps_when_the_verdict_ttl_changes(db, bootstraps, monkeypatch):
+    schema.ensure_schema(db, vector_search=False, verdict_ttl_seconds=3600)
+    monkeypatch.setattr(schema, "_checked", set())
+
+    schema.ensure_schema(db, vector_search=False, verdict_ttl_seconds=7200)
+
+    assert [call["verdict_ttl_seconds"] for call in bootstraps] == [3600, 7200]
@@ -0,0 +1,45 @@
+import pytest
+
+mongomock = pytest.importorskip("mongomock")
+
+from conftest import wait_until
+from synonym_index import SynonymIndex
+
+
+def test_follows_change_stream(watched_merchants):
+    watched_merchants.insert_one({"canonical_name": "Grab", "synonyms": ["Grab", "GrabFood"]})
+    index = SynonymIndex(watched_merchants).start()
+    try:
+        assert index.mode == "change_stream"
+        assert index.lookup("GrabFood")["canonical_name"] == "Grab"
+
+        watched_merchants.insert_one({"canonical_name": "Gojek", "synonyms": ["Gojek"]})
+        assert wait_until(lambda: index.lookup("Gojek") is not None)
+    finally:
+        index.close()
+
+
+def test_keeps_following_after_the_collection_is_dropped(watched_merchants):
+    watched_merchants.insert_one({"canonical_name": "Grab", "synonyms": ["Grab"]})
+    index = SynonymIndex(watched_merchants).start()
+    try:
+        watched_merchants.drop()
+        assert wait_until(lambda: watched_merchants.watch_calls == 2)
+        assert wait_until(lambda: index.lookup("Grab") is None)
+
+        watched_merchants.insert_one({"canonical_name": "Gojek", "synonyms": ["Gojek"]})
+        assert wait_until(lambda: index.lookup("Gojek") is not None)
+        assert index.mode == "change_stream"
+    finally:
+        index.close()
+
+
+def test_polls_without_change_streams():
+    merchants = mongomock.MongoClient().db.merchants
+    index = SynonymIndex(merchants, poll_interval=0.01).start()
+    try:
+        assert index.mode == "polling"
+        merchants.insert_one({"canonical_name": "Grab", "synonyms": ["Grab"]})
+        assert wait_until(lambda: index.lookup("Grab") is not None)
+    finally:
+        index.close()
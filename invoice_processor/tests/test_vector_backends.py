@@ -0,0 +1,108 @@
+from datetime import datetime
+
+import numpy as np
+import pytest
+
+mongomock = pytest.importorskip("mongomock")
+
+from conftest import wait_until
+from embedding_codec import EmbeddingCodec
+from vector_backends import LocalVectorIndex, create_vector_backend
+
+DIMENSIONS = 8
+
+
+def unit(index):
+    vector = np.zeros(DIMENSIONS)
+    vector[index] = 1.0
+    return vector.tolist()
+
+
+def merchant(name, index, codec=EmbeddingCodec()):
+    return {
+        "canonical_name": name,
+        "synonyms": [],
+        **codec.stored_fields(unit(index)),
+        "metadata": {"last_updated": datetime.utcnow()}
+    }
+
+
+def best_name(index, vector):
+    results = index.search(vector, limit=1)
+    return results[0][0]["canonical_name"] if results else None
+
+
+def test_flat_search_ranks_by_cosine():
+    index = LocalVectorIndex(DIMENSIONS)
+    index.upsert("grab", "Grab", unit(0))
+    index.upsert("gojek", "Gojek", unit(1))
+
+    (top, score), (second, _) = index.search(unit(0), limit=2)
+    assert top["canonical_name"] == "Grab"
+    assert score == pytest.approx(1.0)
+    assert second["canonical_name"] == "Gojek"
+
+
+@pytest.mark.parametrize("embedding_format", ["float", "int8", "binary"])
+def test_load_decodes_stored_formats(embedding_format):
+    codec = EmbeddingCodec(embedding_format)
+    merchants = mongomock.MongoClient().db.merchants
+    merchants.insert_many([merchant("Grab", 0, codec), merchant("Gojek", 1, codec)])
+
+    index = LocalVectorIndex(DIMENSIONS, merchants=merchants, codec=codec)
+    index.load()
+
+    assert len(index) == 2
+    assert best_name(index, unit(1)) == "Gojek"
+
+
+def test_searches_during_a_reload_see_the_previous_index(monkeypatch):
+    merchants = mongomock.MongoClient().db.merchants
+    merchants.insert_many([merchant("Grab", 0), merchant("Gojek", 1)])
+    index = LocalVectorIndex(DIMENSIONS, merchants=merchants)
+    index.load()
+    merchants.insert_one(merchant("Foodpanda", 2))
+
+    seen = []
+    store_merchant = LocalVectorIndex._store_merchant
+
+    def searching_store_merchant(self, document):
+        seen.append((len(index), best_name(index, unit(1))))
+        store_merchant(self, document)
+
+    monkeypatch.setattr(LocalVectorIndex, "_store_merchant", searching_store_merchant)
+    index.load()
+
+    assert seen == [(2, "Gojek")] * 3
+    assert len(index) == 3
+    assert best_name(index, unit(2)) == "Foodpanda"
+
+
+def test_started_index_sees_other_writers_after_a_drop(watched_merchants):
+    watched_merchants.insert_one(merchant("Grab", 0))
+    index = create_vector_backend("local", watched_merchants, dimensions=DIMENSIONS)
+    try:
+        assert index.mode == "change_stream"
+        assert best_name(index, unit(0)) == "Grab"
+
+        watched_merchants.insert_one(merchant("Gojek", 1))
+        assert wait_until(lambda: best_name(index, unit(1)) == "Gojek")
+
+        watched_merchants.drop()
+        assert wait_until(lambda: len(index) == 0)
+        watched_merchants.insert_one(merchant("Foodpanda", 2))
+        assert wait_until(lambda: best_name(index, unit(2)) == "Foodpanda")
+    finally:
+        index.close()
+
+
+def test_polls_recently_updated_merchants_without_change_streams():
+    merchants = mongomock.MongoClient().db.merchants
+    merchants.insert_one(merchant("Grab", 0))
+    index = create_vector_backend("local", merchants, dimensions=DIMENSIONS, poll_interval=0.01)
+    try:
+        assert index.mode == "polling"
+        merchants.insert_one(merchant("Gojek", 1))
+        assert wait_until(lambda: best_name(index, unit(1)) == "Gojek")
+    finally:
+        index.close()
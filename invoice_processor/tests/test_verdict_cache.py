@@ -0,0 +1,94 @@
+import asyncio
+from datetime import datetime, timedelta
+
+import pytest
+
+mongomock = pytest.importorskip("mongomock")
+
+from verdict_cache import AsyncVerdictCache, VerdictCache, verdict_key
+
+VERDICT = {"is_new_merchant": False, "canonical_name": "Grab", "confidence": 0.9}
+
+
+class CommandRecorder:
+    """Collection wrapper that records database commands instead of running them."""
+
+    def __init__(self, collection):
+        self.collection = collection
+        self.name = collection.name
+        self.database = self
+        self.commands = []
+
+    def __getattr__(self, name):
+        return getattr(self.collection, name)
+
+    def command(self, *args, **kwargs):
+        self.commands.append((args, kwargs))
+
+
+class AsyncCollection:
+    """Awaitable facade over a mongomock collection."""
+
+    def __init__(self, collection):
+        self.collection = collection
+
+    async def find_one(self, *args, **kwargs):
+        return self.collection.find_one(*args, **kwargs)
+
+    async def replace_one(self, *args, **kwargs):
+        return self.collection.replace_one(*args, **kwargs)
+
+
+@pytest.fixture
+def verdicts():
+    return mongomock.MongoClient().db.merchant_verdicts
+
+
+def test_round_trip_uses_normalized_pair(verdicts):
+    cache = VerdictCache(verdicts)
+    assert cache.get("Grab SG", "Grab") is None
+
+    cache.put("Grab SG", "Grab", VERDICT)
+
+    assert cache.get("  grab sg ", "GRAB") == VERDICT
+    assert cache.get("Grab SG", "Gojek") is None
+    assert cache.stats() == {"hits": 1, "misses": 2}
+
+
+def test_entries_older_than_the_ttl_are_ignored(verdicts):
+    cache = VerdictCache(verdicts, ttl_seconds=60)
+    cache.put("Grab SG", "Grab", VERDICT)
+    verdicts.update_one(
+        {"_id": verdict_key("Grab SG", "Grab")},
+        {"$set": {"created_at": datetime.utcnow() - timedelta(seconds=120)}}
+    )
+
+    assert cache.get("Grab SG", "Grab") is None
+    assert VerdictCache(verdicts, ttl_seconds=600).get("Grab SG", "Grab") == VERDICT
+
+
+def test_ensure_indexes_updates_a_changed_ttl_in_place(verdicts):
+    collection = CommandRecorder(verdicts)
+    VerdictCache(collection, ttl_seconds=100).ensure_indexes()
+    assert verdicts.index_information()["verdict_ttl"]["expireAfterSeconds"] == 100
+
+    VerdictCache(collection, ttl_seconds=100).ensure_indexes()
+    assert collection.commands == []
+
+    VerdictCache(collection, ttl_seconds=200).ensure_indexes()
+    assert collection.commands == [
+        (("collMod", "merchant_verdicts"), {"index": {"name": "verdict_ttl", "expireAfterSeconds": 200}})
+    ]
+
+
+def test_async_cache_shares_entries_with_the_sync_cache(verdicts):
+    async_cache = AsyncVerdictCache(AsyncCollection(verdicts))
+
+    async def round_trip():
+        assert await async_cache.get("Grab SG", "Grab") is None
+        await async_cache.put("Grab SG", "Grab", VERDICT)
+        return await async_cache.get("grab sg", "Grab")
+
+    assert asyncio.run(round_trip()) == VERDICT
+    assert VerdictCache(verdicts).get("Grab SG", "Grab") == VERDICT
+    assert async_cache.stats() == {"hits": 1, "misses": 1}
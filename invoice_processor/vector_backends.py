@@ -0,0 +1,421 @@
+from typing import Dict, List, Optional, Tuple
+from datetime import datetime, timedelta
+import threading
+
+import numpy as np
+
+from collection_refresher import CollectionRefresher
+from embedding_codec import RESCORE_FIELD, EmbeddingCodec
+
+try:
+    import hnswlib
+except ImportError:  # Optional: only needed for LocalVectorIndex(index_type="hnsw")
+    hnswlib = None
+
+# Polling re-reads merchants updated this long before the previous poll, so
+# clock differences between the writing processes don't skip a write
+REFRESH_OVERLAP = timedelta(seconds=60)
+
+
+class VectorSearchBackend:
+    """
+    Nearest-neighbour backend used by MultilingualMerchantClassifier.
+
+    search() returns (merchant, score) pairs best-first, where merchant has at
+    least _id and canonical_name and score is on Atlas' cosine scale
+    ((1 + cosine) / 2, so 1.0 is identical). upsert() is called after the
+    classifier writes an embedding so in-process backends stay current.
+    Both take full model embeddings; backends apply their EmbeddingCodec.
+    """
+
+    name = "base"
+
+    def search(self, query_vector: List[float], limit: int = 1) -> List[Tuple[Dict, float]]:
+        raise NotImplementedError
+
+    def upsert(self, merchant_id, canonical_name: str, vector: List[float]) -> None:
+        pass
+
+    def close(self) -> None:
+        pass
+
+
+class AtlasVectorSearchBackend(VectorSearchBackend):
+    """
+    MongoDB Atlas $vectorSearch on merchant_vector_index.
+
+    mode="lean" (the default) returns only _id, canonical_name and the score
+    straight from $vectorSearch, which already yields hits best-first.
+    mode="full" runs the original pipeline, which also projects the stored
+    embedding and re-groups synonyms; it is kept for comparison benchmarks.
+    num_candidates and limit are passed through to $vectorSearch.
+
+    The query is encoded with codec to match the stored merchant_embedding
+    format. For quantized formats (int8, binary) lean mode also fetches the
+    stored vectors of rescore_candidates hits and re-ranks them by cosine
+    against the full-precision query, so scores keep the (1 + cosine) / 2
+    scale even where the index compares binary vectors by euclidean distance.
+    Binary hits are rescored against their int8 copy (RESCORE_FIELD).
+    """
+
+    name = "atlas"
+
+    def __init__(
+        self,
+        merchants,
+        index_name: str = "merchant_vector_index",
+        mode: str = "lean",
+        num_candidates: int = 100,
+        limit: Optional[int] = None,
+        codec: Optional[EmbeddingCodec] = None,
+        rescore_candidates: int = 10
+    ):
+        if mode not in ("lean", "full"):
+            raise ValueError(f"Unknown mode '{mode}', expected 'lean' or 'full'")
+        self.merchants = merchants
+        self.index_name = index_name
+        self.mode = mode
+        self.num_candidates = num_candidates
+        self.limit = limit
+        self.codec = codec or EmbeddingCodec()
+        self.rescore_candidates = rescore_candidates
+
+    def build_pipeline(self, query_vector: List[float], limit: int = 1) -> List[Dict]:
+        """Return the aggregation pipeline for a query in the configured mode."""
+        encoded_query = self.codec.encode(query_vector)
+        if self.mode == "lean":
+            projection = {
+                "_id": 1,
+                "canonical_name": 1,
+                "score": { "$meta": "vectorSearchScore" }
+            }
+            search_limit = self.limit or limit
+            if self.codec.rescores:
+                search_limit = max(search_limit, self.rescore_candidates)
+                projection["merchant_embedding"] = 1
+                projection[RESCORE_FIELD] = 1
+            return [
+                {
+                    "$vectorSearch": {
+                        "index": self.index_name,
+                        "path": "merchant_embedding",
+                        "queryVector": encoded_query,
+                        # Atlas rejects numCandidates < limit
+                        "numCandidates": max(self.num_candidates, search_limit),
+                        "limit": search_limit
+                    }
+                },
+                {
+                    "$project": projection
+                }
+            ]
+
+        search_limit = self.limit or max(limit, 5)  # Increased to check more candidates
+        return [
+            {
+                "$vectorSearch": {
+                    "index": self.index_name,
+                    "path": "merchant_embedding",
+                    "queryVector": encoded_query,
+                    "numCandidates": max(self.num_candidates, search_limit),
+                    "limit": search_limit
+                }
+            },
+            # Add a stage to unwind synonyms for vector comparison
+            {
+                "$project": {
+                    "_id": 1,
+                    "canonical_name": 1,
+                    "synonyms": 1,
+                    "merchant_embedding": 1,
+                    "score": { "$meta": "vectorSearchScore" }
+                }
+            },
+            {
+                "$unwind": {
+                    "path": "$synonyms",
+                    "preserveNullAndEmptyArrays": True  # Changed from true to True
+                }
+            },
+            # Group back to get best score whether from canonical or synonym
+            {
+                "$group": {
+                    "_id": "$_id",
+                    "canonical_name": { "$first": "$canonical_name" },
+                    "synonyms": { "$push": "$synonyms" },
+                    "score": { "$first": "$score" }
+                }
+            },
+            # Sort by similarity score
+            {
+                "$sort": {
+                    "score": -1
+                }
+            },
+            {
+                "$limit": limit
+            }
+        ]
+
+    def rank(self, query_vector: List[float], results: List[Dict], limit: int = 1) -> List[Tuple[Dict, float]]:
+        """Turn pipeline results into (merchant, score) pairs, rescoring quantized formats."""
+        if self.mode == "lean" and self.codec.rescores:
+            ranked = []
+            for result in results:
+                stored = self.codec.stored_vector(result)
+                result.pop("merchant_embedding", None)
+                result.pop(RESCORE_FIELD, None)
+                if stored is not None:
+                    result["score"] = (1.0 + self.codec.cosine(query_vector, stored)) / 2.0
+                ranked.append(result)
+            results = sorted(ranked, key=lambda result: result["score"], reverse=True)
+        return [(result, result["score"]) for result in results][:limit]
+
+    def search(self, query_vector: List[float], limit: int = 1) -> List[Tuple[Dict, float]]:
+        results = self.merchants.aggregate(self.build_pipeline(query_vector, limit))
+        return self.rank(query_vector, list(results), limit)
+
+
+class LocalVectorIndex(VectorSearchBackend):
+    """
+    In-process cosine top-k over merchant embeddings.
+
+    Embeddings are held L2-normalized in one contiguous float32 matrix, so a
+    flat query is a single matrix-vector product. With index_type="hnsw" an
+    hnswlib graph is built over the same vectors for sub-linear queries on
+    large merchant sets. Works against any MongoDB (or none: call upsert()
+    directly), which also makes it usable for local benchmarking.
+
+    dimensions is the stored (codec-reduced) dimension. Stored int8 vectors
+    are decoded to their scaled values; binary merchants are loaded from
+    their int8 rescore copy (or +/-1 per bit where it is missing).
+    capacity is the number of rows allocated up front; the matrix doubles
+    when it fills.
+
+    With a merchants collection, load() takes a one-off snapshot and start()
+    loads and then keeps the matrix fresh with merchants written by other
+    processes (e.g. the ingest CLI next to the app) through the same
+    CollectionRefresher as SynonymIndex. Without change streams it re-reads
+    merchants whose last_updated changed every poll_interval seconds.
+    Deleted merchants stay in the matrix until the next load().
+    """
+
+    name = "local"
+
+    def __init__(
+        self,
+        dimensions: int,
+        merchants=None,
+        index_type: str = "flat",
+        hnsw_m: int = 16,
+        hnsw_ef_construction: int = 200,
+        hnsw_ef: int = 64,
+        codec: Optional[EmbeddingCodec] = None,
+        poll_interval: float = 30.0,
+        capacity: int = 1024
+    ):
+        if index_type not in ("flat", "hnsw"):
+            raise ValueError(f"Unknown index_type '{index_type}', expected 'flat' or 'hnsw'")
+        if index_type == "hnsw" and hnswlib is None:
+            raise ImportError("hnswlib is required for index_type='hnsw'. Install with: pip install hnswlib")
+
+        self.dimensions = dimensions
+        self.merchants = merchants
+        self.index_type = index_type
+        self.hnsw_m = hnsw_m
+        self.hnsw_ef_construction = hnsw_ef_construction
+        self.hnsw_ef = hnsw_ef
+        self.codec = codec or EmbeddingCodec()
+        self.poll_interval = poll_interval
+        self._lock = threading.Lock()
+        self._since: Optional[datetime] = None
+        self._reset(capacity=capacity)
+        self._refresher = None
+        if merchants is not None:
+            self._refresher = CollectionRefresher(
+                merchants,
+                load=self.load,
+                apply=self._apply,
+                poll=self._poll_changes,
+                poll_interval=poll_interval,
+                name="local-vector-index"
+            )
+
+    @property
+    def mode(self) -> Optional[str]:
+        """"change_stream" or "polling" once started."""
+        return self._refresher.mode if self._refresher is not None else None
+
+    def load(self) -> None:
+        """
+        (Re)build the index from merchant_embedding in the merchants collection.
+
+        The new matrix (and HNSW graph) is built off to the side and swapped in
+        under the lock, so concurrent searches see the old index or the new one,
+        never an empty or half-filled one.
+        """
+        self._since = datetime.utcnow()
+        rows = [
+            merchant for merchant in self.merchants.find(
+                {"merchant_embedding": {"$exists": True}},
+                {"canonical_name": 1, "merchant_embedding": 1, RESCORE_FIELD: 1}
+            )
+        ]
+        staging = LocalVectorIndex(
+            self.dimensions,
+            index_type=self.index_type,
+            hnsw_m=self.hnsw_m,
+            hnsw_ef_construction=self.hnsw_ef_construction,
+            hnsw_ef=self.hnsw_ef,
+            codec=self.codec,
+            capacity=max(1024, len(rows))
+        )
+        for merchant in rows:
+            staging._store_merchant(merchant)
+        with self._lock:
+            self._matrix, self._rows, self._merchants, self._hnsw = (
+                staging._matrix, staging._rows, staging._merchants, staging._hnsw
+            )
+
+    def refresh(self, since: datetime) -> int:
+        """Re-read merchants created or updated since `since`. Returns how many were stored."""
+        refreshed = 0
+        for merchant in self.merchants.find(
+            {
+                "merchant_embedding": {"$exists": True},
+                "$or": [
+                    {"last_updated": {"$gte": since}},
+                    {"metadata.last_updated": {"$gte": since}}
+                ]
+            },
+            {"canonical_name": 1, "merchant_embedding": 1, RESCORE_FIELD: 1}
+        ):
+            self._store_merchant(merchant)
+            refreshed += 1
+        return refreshed
+
+    def start(self) -> "LocalVectorIndex":
+        """Load and start following writes from other processes."""
+        self._refresher.start()
+        return self
+
+    def close(self) -> None:
+        """Stop the background refresher."""
+        if self._refresher is not None:
+            self._refresher.close()
+
+    def upsert(self, merchant_id, canonical_name: str, vector: List[float]) -> None:
+        self._store(merchant_id, canonical_name, self.codec.reduce(vector))
+
+    def _store_merchant(self, merchant: Dict) -> None:
+        vector = self.codec.decode(self.codec.stored_vector(merchant))
+        if len(vector) != self.dimensions:
+            # Still stored at full model dimension (written before the codec changed)
+            vector = self.codec.reduce(vector)
+        self._store(merchant["_id"], merchant.get("canonical_name"), vector)
+
+    def _apply(self, merchant: Dict) -> None:
+        if "merchant_embedding" in merchant:
+            self._store_merchant(merchant)
+
+    def _poll_changes(self) -> None:
+        started = datetime.utcnow()
+        self.refresh(self._since - REFRESH_OVERLAP)
+        self._since = started
+
+    def _store(self, merchant_id, canonical_name: str, vector: np.ndarray) -> None:
+        vector = self._normalize(np.asarray(vector, dtype=np.float32))
+        with self._lock:
+            row = self._rows.get(merchant_id)
+            if row is None:
+                row = len(self._merchants)
+                if row == self._matrix.shape[0]:
+                    self._grow(2 * row)
+                self._rows[merchant_id] = row
+                self._merchants.append({"_id": merchant_id, "canonical_name": canonical_name})
+            else:
+                self._merchants[row]["canonical_name"] = canonical_name
+            self._matrix[row] = vector
+            if self._hnsw is not None:
+                self._hnsw.add_items(vector.reshape(1, -1), np.array([row]))
+
+    def search(self, query_vector: List[float], limit: int = 1) -> List[Tuple[Dict, float]]:
+        query = self.codec.reduce(query_vector)
+        with self._lock:
+            count = len(self._merchants)
+            if count == 0:
+                return []
+            k = min(limit, count)
+            if self._hnsw is not None:
+                labels, distances = self._hnsw.knn_query(query, k=k)
+                rows, cosines = labels[0], 1.0 - distances[0]
+            else:
+                cosines = self._matrix[:count] @ query
+                if k < count:
+                    rows = np.argpartition(-cosines, k - 1)[:k]
+                else:
+                    rows = np.arange(count)
+                rows = rows[np.argsort(-cosines[rows])]
+                cosines = cosines[rows]
+            return [
+                (dict(self._merchants[row]), float((1.0 + cosine) / 2.0))
+                for row, cosine in zip(rows, cosines)
+            ]
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._merchants)
+
+    def _reset(self, capacity: int) -> None:
+        self._matrix = np.zeros((capacity, self.dimensions), dtype=np.float32)
+        self._rows: Dict = {}
+        self._merchants: List[Dict] = []
+        self._hnsw = None
+        if self.index_type == "hnsw":
+            self._hnsw = hnswlib.Index(space="cosine", dim=self.dimensions)
+            self._hnsw.init_index(
+                max_elements=capacity,
+                M=self.hnsw_m,
+                ef_construction=self.hnsw_ef_construction
+            )
+            self._hnsw.set_ef(self.hnsw_ef)
+
+    def _grow(self, capacity: int) -> None:
+        matrix = np.zeros((capacity, self.dimensions), dtype=np.float32)
+        matrix[:self._matrix.shape[0]] = self._matrix
+        self._matrix = matrix
+        if self._hnsw is not None:
+            self._hnsw.resize_index(capacity)
+
+    @staticmethod
+    def _normalize(vector: np.ndarray) -> np.ndarray:
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm > 0 else vector
+
+
+def create_vector_backend(
+    backend: str,
+    merchants,
+    dimensions: Optional[int] = None,
+    codec: Optional[EmbeddingCodec] = None,
+    **kwargs
+) -> VectorSearchBackend:
+    """
+    Build a backend by name: "atlas", "local" (flat) or "local-hnsw".
+
+    dimensions is the model's embedding dimension; codec may reduce it.
+    """
+    codec = codec or EmbeddingCodec()
+    if backend == "atlas":
+        return AtlasVectorSearchBackend(merchants, codec=codec, **kwargs)
+    if backend in ("local", "local-hnsw"):
+        index_type = "hnsw" if backend == "local-hnsw" else "flat"
+        index = LocalVectorIndex(
+            codec.index_dimensions(dimensions),
+            merchants=merchants,
+            index_type=index_type,
+            codec=codec,
+            **kwargs
+        )
+        return index.start() if merchants is not None else index
+    raise ValueError(f"Unknown vector backend '{backend}', expected 'atlas', 'local' or 'local-hnsw'")
@@ -0,0 +1,127 @@
+from typing import Dict, Optional
+from datetime import datetime, timedelta
+import hashlib
+
+from embedding_cache import normalize_text
+
+
+def verdict_key(extracted_name: str, candidate_name: Optional[str]) -> str:
+    """Stable key for an (extracted name, candidate canonical name) pair."""
+    pair = f"{normalize_text(extracted_name).casefold()}\x1f{normalize_text(candidate_name or '').casefold()}"
+    return hashlib.sha256(pair.encode("utf-8")).hexdigest()
+
+
+def fresh_verdict_filter(extracted_name: str, candidate_name: Optional[str], ttl_seconds: float) -> Dict:
+    """find_one filter for the pair's verdict, ignoring entries older than ttl_seconds."""
+    return {
+        "_id": verdict_key(extracted_name, candidate_name),
+        "created_at": {"$gte": datetime.utcnow() - timedelta(seconds=ttl_seconds)}
+    }
+
+
+def verdict_entry(extracted_name: str, candidate_name: Optional[str], verdict: Dict) -> Dict:
+    """Replacement document stored for the pair."""
+    return {
+        "extracted_name": extracted_name,
+        "candidate_name": candidate_name,
+        "verdict": verdict,
+        "created_at": datetime.utcnow()
+    }
+
+
+class VerdictCache:
+    """
+    Persistent cache of LLM synonym verdicts in a MongoDB collection.
+
+    classify_merchant asks Claude whether an extracted name is a variation of
+    the closest canonical name; the parsed verdict is stored here keyed by the
+    normalized pair, so the same pair is not re-verified while the entry is
+    fresh. A TTL index on created_at lets MongoDB expire old entries, and reads
+    also ignore anything older than ttl_seconds since the TTL monitor only runs
+    about once a minute.
+    """
+
+    def __init__(self, collection, ttl_seconds: float = 30 * 24 * 3600):
+        self.collection = collection
+        self.ttl_seconds = ttl_seconds
+        self.hits = 0
+        self.misses = 0
+
+    def ensure_indexes(self) -> None:
+        """
+        Create the TTL index used to expire verdicts.
+
+        If it already exists with another TTL, change expireAfterSeconds in
+        place with collMod; create_index would fail with IndexOptionsConflict.
+        """
+        ttl = int(self.ttl_seconds)
+        existing = self.collection.index_information().get("verdict_ttl")
+        if existing is None:
+            self.collection.create_index("created_at", expireAfterSeconds=ttl, name="verdict_ttl")
+        elif existing.get("expireAfterSeconds") != ttl:
+            self.collection.database.command(
+                "collMod",
+                self.collection.name,
+                index={"name": "verdict_ttl", "expireAfterSeconds": ttl}
+            )
+
+    def get(self, extracted_name: str, candidate_name: Optional[str]) -> Optional[Dict]:
+        """Return the cached verdict for the pair, or None if missing or expired."""
+        entry = self.collection.find_one(fresh_verdict_filter(extracted_name, candidate_name, self.ttl_seconds))
+        if entry is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return entry["verdict"]
+
+    def put(self, extracted_name: str, candidate_name: Optional[str], verdict: Dict) -> None:
+        """Store a verdict for the pair, replacing any previous one."""
+        self.collection.replace_one(
+            {"_id": verdict_key(extracted_name, candidate_name)},
+            verdict_entry(extracted_name, candidate_name, verdict),
+            upsert=True
+        )
+
+    def stats(self) -> Dict[str, int]:
+        """Return hit/miss counters."""
+        return {"hits": self.hits, "misses": self.misses}
+
+
+class AsyncVerdictCache:
+    """
+    The merchant_verdicts cache read through an AsyncMongoClient collection.
+
+    Same keys, entries and expiry as VerdictCache, so the sync and async
+    classifiers share verdicts. It performs no DDL: the TTL index is created
+    by VerdictCache.ensure_indexes via bootstrap_schema (run by the
+    synchronous classifier or `python schema.py`).
+    """
+
+    def __init__(self, collection, ttl_seconds: float = 30 * 24 * 3600):
+        self.collection = collection
+        self.ttl_seconds = ttl_seconds
+        self.hits = 0
+        self.misses = 0
+
+    async def get(self, extracted_name: str, candidate_name: Optional[str]) -> Optional[Dict]:
+        """Return the cached verdict for the pair, or None if missing or expired."""
+        entry = await self.collection.find_one(
+            fresh_verdict_filter(extracted_name, candidate_name, self.ttl_seconds)
+        )
+        if entry is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return entry["verdict"]
+
+    async def put(self, extracted_name: str, candidate_name: Optional[str], verdict: Dict) -> None:
+        """Store a verdict for the pair, replacing any previous one."""
+        await self.collection.replace_one(
+            {"_id": verdict_key(extracted_name, candidate_name)},
+            verdict_entry(extracted_name, candidate_name, verdict),
+            upsert=True
+        )
+
+    def stats(self) -> Dict[str, int]:
+        """Return hit/miss counters."""
+        return {"hits": self.hits, "misses": self.misses}